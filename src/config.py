@@ -5,3 +5,5 @@ REPO_ROOT = Path(__file__).resolve().parent.parent
 RAW_DATA_DIR = (REPO_ROOT / "data" / "raw").resolve()
 INTERMEDIATE_DATA_DIR = (REPO_ROOT / "data" / "intermediate").resolve()
 PROCESSED_DATA_DIR = (REPO_ROOT / "data" / "processed").resolve()
+CACHE_DATA_DIR = (REPO_ROOT / "data" / "cache").resolve()
+CASSETTE_DATA_DIR = (REPO_ROOT / "data" / "cassettes").resolve()
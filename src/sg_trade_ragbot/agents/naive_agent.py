@@ -1,22 +1,195 @@
-from llama_index.core.agent.workflow import FunctionAgent
+from typing import Any, AsyncIterator, Optional, Sequence, Tuple, Union
 
-from sg_trade_ragbot.tools.RAGTool import rag_tool
-from sg_trade_ragbot.utils.models.models import get_remote_llm, get_local_llm, LLAMAINDEX, LANGCHAIN
-from sg_trade_ragbot.utils.prompts.prompts import NAIVE_AGENT_PROMPT
-from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+from llama_index.core.agent.workflow import AgentOutput, FunctionAgent, ToolCallResult
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.memory import BaseMemory
+from llama_index.core.tools import AsyncBaseTool, FunctionTool
+from llama_index.core.workflow import Context, Event
 
+from sg_trade_ragbot.tools.RAGTool import arag_tool, astream_rag_tool, rag_tool
+from sg_trade_ragbot.tools.retrievers import HYBRID
+from sg_trade_ragbot.tools.tariff_query import tariff_query
+from sg_trade_ragbot.utils.metrics.metrics import REGISTRY, count_tokens, record_tokens, span
+from sg_trade_ragbot.utils.models.models import get_remote_llm, get_local_llm, get_context_budget, LLAMAINDEX, LANGCHAIN
+from sg_trade_ragbot.utils.prompts.prompts import NAIVE_AGENT_PROMPT, NAIVE_AGENT_RETRIEVAL_ONLY_PROMPT, TARIFF_QUERY_PROMPT
+from sg_trade_ragbot.utils.pydantic_models.models import AgentAnswer, RAGToolError, RAGToolOutput
 
-def get_naive_agent(model_name: str, local: bool = True):
-    if local:
-        llm = get_local_llm(model_name, LLAMAINDEX)
+
+def _reported_usage(raw: Any) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens from a raw OpenAI/Groq or Ollama response, if it reports them."""
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is not None:
+        get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+        if get("prompt_tokens") is not None:
+            return get("prompt_tokens") or 0, get("completion_tokens") or 0
+    if isinstance(raw, dict) and raw.get("prompt_eval_count") is not None:
+        return raw.get("prompt_eval_count") or 0, raw.get("eval_count") or 0
+    return None
+
+
+class AgentStepUsage(Event):
+    """Tokens of one agent LLM step, as counted by TracedFunctionAgent."""
+
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class TracedFunctionAgent(FunctionAgent):
+    """
+    FunctionAgent that runs every LLM step in an agent_step span and counts its
+    tokens (as reported by the provider, else estimated with the tokenizer) and
+    the tools it asks for. Step tokens are also written to the event stream as
+    AgentStepUsage events.
+    """
+
+    async def take_step(
+        self,
+        ctx: Context,
+        llm_input: list[ChatMessage],
+        tools: Sequence[AsyncBaseTool],
+        memory: BaseMemory,
+    ) -> AgentOutput:
+        with span("agent_step", agent=self.name) as current:
+            output = await super().take_step(ctx, llm_input, tools, memory)
+            current.set(tool_calls=[call.tool_name for call in output.tool_calls])
+
+        usage = _reported_usage(output.raw)
+        if usage is None:
+            usage = (sum(count_tokens(message.content or "") for message in llm_input),
+                     count_tokens(output.response.content or ""))
+        record_tokens("agent_step", "prompt", usage[0])
+        record_tokens("agent_step", "completion", usage[1])
+        ctx.write_event_to_stream(AgentStepUsage(prompt_tokens=usage[0], completion_tokens=usage[1]))
+
+        tool_calls = REGISTRY.counter("ragbot_agent_tool_calls_total", "Tool calls requested by agent steps", ("tool",))
+        for call in output.tool_calls:
+            tool_calls.inc(tool=call.tool_name)
+        return output
+
+
+class RAGToolStream(Event):
+    """Answer text produced by rag_tool's synthesizer while the tool call is still running."""
+
+    delta: str
+
+
+async def _streaming_rag_tool(ctx: Context, question: str, top_k: int = 5, retrieval_mode: str = HYBRID) -> str:
+    """
+    rag_tool for streaming agents: forwards the synthesizer's deltas to the
+    workflow event stream as RAGToolStream events and returns the same JSON (or
+    "RAG tool error: ..." message) as rag_tool once synthesis is done.
+    """
+    output = None
+    try:
+        async for item in astream_rag_tool(question, top_k=top_k, retrieval_mode=retrieval_mode):
+            if isinstance(item, RAGToolOutput):
+                output = item
+            else:
+                ctx.write_event_to_stream(RAGToolStream(delta=item))
+    except RAGToolError as e:
+        return f"RAG tool error: {e}"
+    return output.model_dump_json(exclude_none=True)
+
+
+def build_naive_agent(llm, retrieval_only: bool = False, context_budget: Optional[int] = None,
+                      streaming: bool = False, with_tariff_query: bool = False) -> FunctionAgent:
+    """
+    FunctionAgent over rag_tool driven by an already constructed llm. With
+    retrieval_only the tool skips its own LLM synthesis and returns ranked
+    retrievals packed to context_budget; the agent's LLM writes the answer.
+    With streaming (ignored for retrieval_only, which has nothing to stream)
+    the tool emits RAGToolStream events, see stream_naive_agent.
+    with_tariff_query adds the tariff_query tool for listing and filtering
+    questions over the tariff table. Agent steps are traced, see
+    TracedFunctionAgent.
+    """
+    if streaming and not retrieval_only:
+        # the ctx parameter is filled in by the agent and hidden from the tool schema
+        rag = FunctionTool.from_defaults(async_fn=_streaming_rag_tool, name="rag_tool", description=rag_tool.__doc__)
     else:
-        llm = get_remote_llm(model_name, LLAMAINDEX)
+        # async_fn lets the agent await the tool instead of blocking its event loop
+        # fixed per agent and hidden from the tool schema
+        partial_params = {"retrieval_only": retrieval_only}
+        if retrieval_only and context_budget is not None:
+            partial_params["context_budget"] = context_budget
+        rag = FunctionTool.from_defaults(fn=rag_tool, async_fn=arag_tool, name="rag_tool",
+                                         partial_params=partial_params)
+
+    tools = [rag]
+    system_prompt = NAIVE_AGENT_RETRIEVAL_ONLY_PROMPT if retrieval_only else NAIVE_AGENT_PROMPT
+    if with_tariff_query:
+        tools.append(FunctionTool.from_defaults(fn=tariff_query, name="tariff_query"))
+        system_prompt += TARIFF_QUERY_PROMPT
 
-    naive_agent = FunctionAgent(
-        tools=[rag_tool],
+    return TracedFunctionAgent(
+        tools=tools,
         llm=llm,
-        system_prompt=NAIVE_AGENT_PROMPT,
+        system_prompt=system_prompt,
         is_function_calling_model=True,
     )
 
-    return naive_agent
+
+def get_naive_agent(model_name: str, local: bool = True, retrieval_only: bool = False, streaming: bool = False,
+                    with_tariff_query: bool = False):
+    """
+    FunctionAgent over rag_tool. With retrieval_only the tool skips its own LLM
+    synthesis and returns ranked retrievals; the agent's LLM writes the answer.
+    streaming agents are meant to be run through stream_naive_agent.
+    """
+    if local:
+        llm = get_local_llm(model_name, LLAMAINDEX)
+    else:
+        llm = get_remote_llm(model_name, LLAMAINDEX)
+
+    # retrieval-only results are read by this agent's llm, so they are packed to its context budget
+    context_budget = get_context_budget(model_name) if retrieval_only else None
+    return build_naive_agent(llm, retrieval_only=retrieval_only, context_budget=context_budget, streaming=streaming,
+                             with_tariff_query=with_tariff_query)
+
+
+def _captured_tool_output(event: ToolCallResult) -> Optional[RAGToolOutput]:
+    """The RAGToolOutput behind a rag_tool result event, None for other tools and error results."""
+    if event.tool_name != "rag_tool" or event.tool_output.is_error:
+        return None
+    raw = event.tool_output.raw_output
+    if isinstance(raw, RAGToolOutput):
+        return raw
+    try:
+        return RAGToolOutput.from_tool_response(raw)
+    except ValueError:
+        # "RAG tool error: ..." strings
+        return None
+
+
+async def stream_naive_agent(agent: FunctionAgent, prompt: str) -> AsyncIterator[Union[str, AgentAnswer]]:
+    """
+    Run agent on prompt, yielding the rag_tool answer text as the synthesizer
+    produces it (agents built with streaming=True only) and an AgentAnswer as
+    the last item. The AgentAnswer pairs the agent's final message with the
+    rag_tool outputs captured from the workflow's tool call events, so the
+    model never has to repeat the tool JSON, and totals the agent's tokens.
+    """
+    tool_outputs = []
+    prompt_tokens = completion_tokens = 0
+    handler = agent.run(prompt)
+    async for event in handler.stream_events():
+        if isinstance(event, RAGToolStream):
+            yield event.delta
+        elif isinstance(event, AgentStepUsage):
+            prompt_tokens += event.prompt_tokens
+            completion_tokens += event.completion_tokens
+        elif isinstance(event, ToolCallResult):
+            output = _captured_tool_output(event)
+            if output is not None:
+                tool_outputs.append(output)
+    response = await handler
+    yield AgentAnswer(answer=str(response), tool_outputs=tool_outputs,
+                      prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+async def run_naive_agent(agent: FunctionAgent, prompt: str) -> AgentAnswer:
+    """Run agent on prompt, see stream_naive_agent."""
+    result = None
+    async for item in stream_naive_agent(agent, prompt):
+        result = item
+    return result
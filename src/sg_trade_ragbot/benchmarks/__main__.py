@@ -0,0 +1,5 @@
+import sys
+
+from sg_trade_ragbot.benchmarks.suite import main
+
+sys.exit(main())
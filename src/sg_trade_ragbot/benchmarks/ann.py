@@ -0,0 +1,153 @@
+import argparse
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import platform
+import sys
+import time
+from typing import List, Optional
+
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from pydantic import BaseModel, Field
+
+from sg_trade_ragbot.benchmarks.stubs import DEFAULT_EMBED_DIM
+from sg_trade_ragbot.benchmarks.suite import LatencySummary, git_commit, latency_summary
+from sg_trade_ragbot.benchmarks.synthetic import synthetic_embeddings
+from sg_trade_ragbot.parser.ann_index import default_n_lists
+from sg_trade_ragbot.parser.numpy_vector_store import NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class AnnBenchmarkConfig(BaseModel):
+    rows: List[int] = Field(default_factory=lambda: [10_000, 100_000],
+                            description="Corpus sizes to index, one result each")
+    dim: int = Field(default=DEFAULT_EMBED_DIM, gt=0)
+    queries: int = Field(default=200, gt=0, description="Queries timed per corpus size and setting")
+    top_k: int = Field(default=10, gt=0)
+    n_lists: Optional[int] = Field(default=None, gt=0, description="IVF lists, default ~4 * sqrt(rows)")
+    n_probes: List[int] = Field(default_factory=lambda: [1, 2, 4, 8, 16, 32])
+    spread: float = Field(default=2.0, gt=0.0, description="Noise around each synthetic topic")
+    dtype: str = "float32"
+    seed: int = 0
+
+
+class AnnProbeResult(BaseModel):
+    n_probe: int
+    recall_at_k: float = Field(..., description="Mean share of the exact top_k found by the ANN search")
+    latency: LatencySummary
+
+
+class AnnCorpusResult(BaseModel):
+    rows: int
+    n_lists: int
+    build_seconds: float
+    exact: LatencySummary
+    probes: List[AnnProbeResult]
+
+
+class AnnBenchmarkReport(BaseModel):
+    created_at: str
+    git_commit: Optional[str] = None
+    python_version: str
+    platform: str
+    config: AnnBenchmarkConfig
+    results: List[AnnCorpusResult] = Field(default_factory=list)
+
+
+def _bench_corpus(config: AnnBenchmarkConfig, rows: int) -> AnnCorpusResult:
+    matrix, queries = synthetic_embeddings(rows, config.dim, queries=config.queries, spread=config.spread,
+                                           seed=config.seed)
+    node_ids = [str(i) for i in range(rows)]
+    store = NumpyVectorStore(dtype=config.dtype, matrix=matrix.astype(config.dtype),
+                             node_ids=node_ids, ref_doc_ids=node_ids)
+    queries = queries.tolist()
+
+    latencies, exact_ids = [], []
+    for embedding in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=config.top_k), exact=True)
+        latencies.append(time.perf_counter() - start)
+        exact_ids.append(set(result.ids))
+    exact = latency_summary(latencies)
+
+    start = time.perf_counter()
+    ivf = store.build_ann(n_lists=config.n_lists or default_n_lists(rows))
+    build_seconds = time.perf_counter() - start
+
+    probes = []
+    for n_probe in config.n_probes:
+        latencies, found = [], 0
+        for embedding, expected in zip(queries, exact_ids):
+            start = time.perf_counter()
+            result = store.ann_query(embedding, config.top_k, n_probe=n_probe)
+            latencies.append(time.perf_counter() - start)
+            found += len(expected.intersection(result.ids))
+        probes.append(AnnProbeResult(n_probe=n_probe,
+                                     recall_at_k=found / sum(len(expected) for expected in exact_ids),
+                                     latency=latency_summary(latencies)))
+        logger.info("%d rows, %d/%d lists: recall@%d %.3f, p50 %.2fms", rows, n_probe, ivf.n_lists,
+                    config.top_k, probes[-1].recall_at_k, probes[-1].latency.p50_ms)
+
+    return AnnCorpusResult(rows=rows, n_lists=ivf.n_lists, build_seconds=build_seconds, exact=exact, probes=probes)
+
+
+def run_ann_benchmark(config: Optional[AnnBenchmarkConfig] = None) -> AnnBenchmarkReport:
+    """
+    Recall@k and query latency of the IVF index of NumpyVectorStore against
+    exact search, for each corpus size and number of probed lists. Corpora
+    and queries are synthetic clustered embeddings (see synthetic_embeddings),
+    so runs are reproducible and need no models; latency is that of the store
+    query the retriever makes, without embedding the question.
+    """
+    config = config or AnnBenchmarkConfig()
+    if config.dtype not in ("float32", "float16"):
+        raise ValueError(f"dtype must be 'float32' or 'float16', got {config.dtype!r}")
+
+    report = AnnBenchmarkReport(
+        created_at=datetime.now(timezone.utc).isoformat(),
+        git_commit=git_commit(),
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+        config=config,
+    )
+    for rows in config.rows:
+        report.results.append(_bench_corpus(config, rows))
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sg_trade_ragbot.benchmarks.ann",
+        description="Recall@k and latency of the IVF vector index against exact search; prints a JSON report.",
+    )
+    defaults = AnnBenchmarkConfig()
+    parser.add_argument("--rows", type=int, nargs="+", default=defaults.rows)
+    parser.add_argument("--dim", type=int, default=defaults.dim)
+    parser.add_argument("--queries", type=int, default=defaults.queries)
+    parser.add_argument("--top-k", type=int, default=defaults.top_k)
+    parser.add_argument("--n-lists", type=int, default=defaults.n_lists)
+    parser.add_argument("--n-probes", type=int, nargs="+", default=defaults.n_probes)
+    parser.add_argument("--spread", type=float, default=defaults.spread)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default=defaults.dtype)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    config = AnnBenchmarkConfig(**{name: value for name, value in vars(args).items()
+                                   if name in AnnBenchmarkConfig.model_fields})
+    report = run_ann_benchmark(config)
+
+    payload = report.model_dump_json(indent=2)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(payload, encoding="utf-8")
+        logger.info("Wrote ANN benchmark report to %s", args.output)
+    else:
+        sys.stdout.write(payload + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import hashlib
+import time
+from typing import Any, List, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import ChatMessage, CompletionResponse, MessageRole, ToolCallBlock
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.llms import MockFunctionCallingLLM, MockLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from sg_trade_ragbot.parser.bm25 import tokenize
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+
+# long enough for hashed token features to rarely collide on tariff vocabulary
+DEFAULT_EMBED_DIM = 256
+# words in every stub synthesizer answer
+DEFAULT_ANSWER_TOKENS = 32
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Deterministic offline embedding: the BM25 tokens of a text are hashed into
+    a signed bag-of-words vector and L2 normalised. Texts sharing product terms
+    or codes end up close, so retrieval over it behaves roughly like a real
+    model without any network calls. latency_seconds is slept once per call
+    (once per batch for get_text_embedding_batch) to simulate a remote API.
+    """
+
+    embed_dim: int = Field(default=DEFAULT_EMBED_DIM, gt=0)
+    latency_seconds: float = Field(default=0.0, ge=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashingEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.embed_dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # empty or stopword-only text, keep it a valid unit vector
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _sleep(self) -> None:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._sleep()
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._sleep()
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._sleep()
+        return [self._vector(text) for text in texts]
+
+
+class StubLLM(MockLLM):
+    """
+    MockLLM answering every completion with max_tokens filler words after
+    sleeping latency_seconds, standing in for the synthesizer's LLM.
+    """
+
+    latency_seconds: float = Field(default=0.0, ge=0.0)
+
+    def __init__(self, max_tokens: int = DEFAULT_ANSWER_TOKENS, latency_seconds: float = 0.0, **kwargs: Any) -> None:
+        super().__init__(max_tokens=max_tokens, **kwargs)
+        self.latency_seconds = latency_seconds
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubLLM"
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return CompletionResponse(text=self._generate_text(self.max_tokens) if self.max_tokens else prompt)
+
+
+def _last_content(messages: Sequence[ChatMessage], role: MessageRole) -> str:
+    for message in reversed(messages):
+        if message.role == role:
+            return message.content or ""
+    return ""
+
+
+def stub_agent_llm(tool_name: str = "rag_tool", latency_seconds: float = 0.0) -> MockFunctionCallingLLM:
+    """
+    Function-calling stub for FunctionAgent runs: the first turn calls tool_name
+    with the user message as question, the turn after a tool result replies with
+    the answer field of that result, or the result itself if it is not
+    RAGToolOutput JSON (the short final answer NAIVE_AGENT_PROMPT asks for).
+    """
+
+    def respond(messages: Sequence[ChatMessage], **kwargs: Any) -> ChatMessage:
+        if latency_seconds:
+            time.sleep(latency_seconds)
+
+        if messages and messages[-1].role == MessageRole.TOOL:
+            try:
+                answer = RAGToolOutput.from_tool_response(messages[-1].content).answer
+            except ValueError:
+                answer = messages[-1].content
+            return ChatMessage(role=MessageRole.ASSISTANT, content=answer)
+
+        question = _last_content(messages, MessageRole.USER)
+        call = ToolCallBlock(tool_call_id=f"call_{len(messages)}", tool_name=tool_name,
+                             tool_kwargs={"question": question})
+        return ChatMessage(role=MessageRole.ASSISTANT, blocks=[call])
+
+    return MockFunctionCallingLLM(response_generator=respond, is_chat_model=True)
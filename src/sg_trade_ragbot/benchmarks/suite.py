@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from pydantic import BaseModel, Field
+
+from sg_trade_ragbot.agents.naive_agent import build_naive_agent, run_naive_agent
+from sg_trade_ragbot.benchmarks.stubs import DEFAULT_EMBED_DIM, HashingEmbedding, StubLLM, stub_agent_llm
+from sg_trade_ragbot.benchmarks.synthetic import synthetic_questions, synthetic_tariff_markdown, write_synthetic_pdf
+from sg_trade_ragbot.parser import ingestion
+from sg_trade_ragbot.parser.hs_hierarchy import FLAT, HS_HIERARCHY
+from sg_trade_ragbot.parser.stage_stats import current_rss_bytes
+from sg_trade_ragbot.tools import RAGTool
+from sg_trade_ragbot.tools.retrievers import HYBRID, VECTOR
+
+logger = logging.getLogger(__name__)
+
+# how often the background thread samples RSS while a stage runs
+RSS_SAMPLE_INTERVAL_SECONDS = 0.01
+
+# stage names in the report, after the function they time
+PDF_TO_MARKDOWN = "pdf_to_markdown"
+BUILD_INDEX = "build_and_persist_index"
+LOAD_INDEX = "_load_index"
+RAG_TOOL = "_rag_tool_helper"
+AGENT_RUN = "agent_run"
+STAGES = (PDF_TO_MARKDOWN, BUILD_INDEX, LOAD_INDEX, RAG_TOOL, AGENT_RUN)
+
+
+class BenchmarkConfig(BaseModel):
+    chapters: int = Field(default=10, gt=0, description="Chapters in the synthetic tariff markdown")
+    headings_per_chapter: int = Field(default=8, gt=0, lt=100)
+    lines_per_heading: int = Field(default=6, gt=0)
+    pdf_pages: int = Field(default=10, gt=0, description="Pages of the synthetic PDF converted by pdf_to_markdown")
+    queries: int = Field(default=20, gt=0, description="Questions timed by the query and agent stages")
+    repeats: int = Field(default=3, gt=0, description="Cold runs of the conversion, build and load stages")
+    top_k: int = Field(default=3, gt=0)
+    retrieval_mode: str = HYBRID
+    chunking: str = HS_HIERARCHY
+    embed_dim: int = Field(default=DEFAULT_EMBED_DIM, gt=0)
+    embed_latency_ms: float = Field(default=0.0, ge=0.0, description="Simulated latency per embedding call")
+    llm_latency_ms: float = Field(default=0.0, ge=0.0, description="Simulated latency per LLM call")
+    workers: int = Field(default=1, gt=0, description="PDF conversion processes")
+    seed: int = 0
+    stages: List[str] = Field(default_factory=lambda: list(STAGES))
+
+
+class LatencySummary(BaseModel):
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class StageResult(BaseModel):
+    name: str
+    runs: int
+    items: int = Field(..., description="Work units processed over all runs (pages, nodes, questions)")
+    seconds: float
+    items_per_second: float
+    latency: LatencySummary
+    peak_rss_mb: float
+
+
+class BenchmarkReport(BaseModel):
+    created_at: str
+    git_commit: Optional[str] = None
+    python_version: str
+    platform: str
+    config: BenchmarkConfig
+    stages: Dict[str, StageResult] = Field(default_factory=dict)
+
+
+def latency_summary(latencies: List[float]) -> LatencySummary:
+    """Summary in milliseconds of latencies given in seconds."""
+    latencies_ms = np.asarray(latencies or [0.0]) * 1000
+    return LatencySummary(
+        mean_ms=float(latencies_ms.mean()),
+        p50_ms=float(np.percentile(latencies_ms, 50)),
+        p90_ms=float(np.percentile(latencies_ms, 90)),
+        p99_ms=float(np.percentile(latencies_ms, 99)),
+        max_ms=float(latencies_ms.max()),
+    )
+
+
+class _PeakRss:
+    """Samples this process' RSS on a background thread until closed."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.peak = current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def close(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+        return self.peak
+
+
+class _StageRecorder:
+    """Wall time of each timed run of one stage, plus the peak RSS seen during them."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.items = 0
+        self.peak_rss = 0
+
+    @contextmanager
+    def run(self, items: int = 1) -> Iterator[None]:
+        rss = _PeakRss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+            self.items += items
+            self.peak_rss = max(self.peak_rss, rss.close())
+
+    def result(self) -> StageResult:
+        seconds = float(sum(self.latencies))
+        return StageResult(
+            name=self.name,
+            runs=len(self.latencies),
+            items=self.items,
+            seconds=seconds,
+            items_per_second=self.items / seconds if seconds else 0.0,
+            latency=latency_summary(self.latencies),
+            peak_rss_mb=self.peak_rss / (1024 * 1024),
+        )
+
+
+def _reset_rag_tool() -> None:
+    with RAGTool._LOAD_LOCK:
+        RAGTool._INDEX = None
+        RAGTool._INDEX_VERSION = None
+        RAGTool._BM25 = None
+        RAGTool._HS_INDEX = None
+        RAGTool._HS_INDEX_VERSION = None
+        RAGTool._RETRIEVERS.clear()
+        RAGTool._QUERY_ENGINES.clear()
+        RAGTool._CONTEXT_BUDGETS.clear()
+    RAGTool._ANSWER_CACHE.clear()
+
+
+@contextmanager
+def offline_settings(embed_model, llm, processed_dir: Path) -> Iterator[None]:
+    """
+    Point Settings and the RAG tool at the stub models and processed_dir for
+    the duration of the block, restoring the previous state afterwards.
+    """
+    saved = (Settings._embed_model, Settings._llm, RAGTool.PROCESSED_DATA_DIR)
+    Settings.embed_model = embed_model
+    Settings.llm = llm
+    RAGTool.PROCESSED_DATA_DIR = str(processed_dir)
+    _reset_rag_tool()
+    try:
+        yield
+    finally:
+        Settings._embed_model, Settings._llm, RAGTool.PROCESSED_DATA_DIR = saved
+        _reset_rag_tool()
+
+
+def git_commit() -> Optional[str]:
+    """Commit the benchmarks run from, recorded in their reports; None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _bench_pdf_to_markdown(config: BenchmarkConfig, workdir: Path) -> StageResult:
+    pdf_path = write_synthetic_pdf(workdir / "pdf" / "synthetic.pdf", pages=config.pdf_pages, seed=config.seed)
+    recorder = _StageRecorder(PDF_TO_MARKDOWN)
+    for i in range(config.repeats):
+        # a fresh output directory each run, so the manifest never skips the conversion
+        out_dir = workdir / "pdf" / f"md_{i}"
+        with recorder.run(items=config.pdf_pages):
+            ingestion.pdf_to_markdown(pdf_path, out_dir, workers=config.workers)
+    return recorder.result()
+
+
+def _bench_build_index(config: BenchmarkConfig, md_dir: Path, workdir: Path) -> tuple[StageResult, Path]:
+    recorder = _StageRecorder(BUILD_INDEX)
+    index_dir = None
+    for i in range(config.repeats):
+        # cold builds: fresh index and embedding cache directories
+        index_dir = workdir / "processed" / f"run_{i}"
+        with recorder.run(items=0):
+            ingestion.build_and_persist_index(md_dir, index_dir, cache_dir=workdir / "cache" / f"run_{i}",
+                                              chunking=config.chunking)
+
+    # items are the nodes written to the docstore by each build
+    recorder.items = len(SimpleDocumentStore.from_persist_dir(str(index_dir)).docs) * config.repeats
+    return recorder.result(), index_dir
+
+
+def _bench_load_index(config: BenchmarkConfig) -> StageResult:
+    recorder = _StageRecorder(LOAD_INDEX)
+    for _ in range(config.repeats):
+        _reset_rag_tool()
+        with recorder.run():
+            RAGTool._load_index()
+    return recorder.result()
+
+
+def _bench_rag_tool(config: BenchmarkConfig, questions: List[str]) -> StageResult:
+    RAGTool.warmup(top_ks=(config.top_k * RAGTool.CONTEXT_CANDIDATES_PER_RESULT,),
+                   retrieval_modes=(config.retrieval_mode,))
+    recorder = _StageRecorder(RAG_TOOL)
+    for question in questions:
+        with recorder.run():
+            RAGTool._rag_tool_helper(question, top_k=config.top_k, retrieval_mode=config.retrieval_mode,
+                                     use_cache=False)
+    return recorder.result()
+
+
+def _bench_agent(config: BenchmarkConfig, questions: List[str]) -> StageResult:
+    agent = build_naive_agent(stub_agent_llm(latency_seconds=config.llm_latency_ms / 1000))
+    recorder = _StageRecorder(AGENT_RUN)
+
+    async def run_all() -> None:
+        for question in questions:
+            # rag_tool always goes through the answer cache, keep every run a miss
+            RAGTool._ANSWER_CACHE.clear()
+            with recorder.run():
+                await run_naive_agent(agent, question)
+
+    asyncio.run(run_all())
+    return recorder.result()
+
+
+def run_benchmarks(config: Optional[BenchmarkConfig] = None, workdir: Optional[Path] = None) -> BenchmarkReport:
+    """
+    Run the selected stages of the offline benchmark and return the report.
+
+    A synthetic tariff markdown (and PDF) of the configured size is written to
+    workdir (a temporary directory by default) and indexed with HashingEmbedding;
+    queries are answered by StubLLM and the agent run uses stub_agent_llm, so
+    nothing leaves the machine and results are comparable across commits.
+    Conversion, build and load stages run config.repeats cold times; the
+    query stages time config.queries questions each, without the answer cache.
+    """
+    config = config or BenchmarkConfig()
+    unknown = set(config.stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark stages {sorted(unknown)}, expected some of {list(STAGES)}")
+    if config.chunking not in (FLAT, HS_HIERARCHY):
+        raise ValueError(f"Unknown chunking {config.chunking!r}, expected {FLAT!r} or {HS_HIERARCHY!r}")
+    if config.retrieval_mode not in (HYBRID, VECTOR):
+        raise ValueError(f"Unknown retrieval_mode {config.retrieval_mode!r}, expected {HYBRID!r} or {VECTOR!r}")
+
+    report = BenchmarkReport(
+        created_at=datetime.now(timezone.utc).isoformat(),
+        git_commit=git_commit(),
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+        config=config,
+    )
+
+    with tempfile.TemporaryDirectory(prefix="sg_trade_bench_") as tmp:
+        workdir = Path(workdir or tmp).resolve()
+
+        markdown = synthetic_tariff_markdown(config.chapters, config.headings_per_chapter,
+                                             config.lines_per_heading, seed=config.seed)
+        md_dir = workdir / "markdown"
+        md_dir.mkdir(parents=True, exist_ok=True)
+        (md_dir / "synthetic.md").write_text(markdown, encoding="utf-8")
+        questions = synthetic_questions(markdown, config.queries, seed=config.seed)
+
+        if PDF_TO_MARKDOWN in config.stages:
+            report.stages[PDF_TO_MARKDOWN] = _bench_pdf_to_markdown(config, workdir)
+
+        embed_model = HashingEmbedding(embed_dim=config.embed_dim, latency_seconds=config.embed_latency_ms / 1000)
+        llm = StubLLM(latency_seconds=config.llm_latency_ms / 1000)
+        query_stages = {LOAD_INDEX, RAG_TOOL, AGENT_RUN} & set(config.stages)
+
+        with offline_settings(embed_model, llm, workdir / "processed"):
+            if BUILD_INDEX in config.stages or query_stages:
+                build, index_dir = _bench_build_index(config if BUILD_INDEX in config.stages
+                                                      else config.model_copy(update={"repeats": 1}),
+                                                      md_dir, workdir)
+                if BUILD_INDEX in config.stages:
+                    report.stages[BUILD_INDEX] = build
+                RAGTool.PROCESSED_DATA_DIR = str(index_dir)
+
+            if LOAD_INDEX in config.stages:
+                report.stages[LOAD_INDEX] = _bench_load_index(config)
+            if RAG_TOOL in config.stages:
+                report.stages[RAG_TOOL] = _bench_rag_tool(config, questions)
+            if AGENT_RUN in config.stages:
+                report.stages[AGENT_RUN] = _bench_agent(config, questions)
+
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sg_trade_ragbot.benchmarks",
+        description="Offline ingestion/query benchmark with stub embeddings and LLMs; prints a JSON report.",
+    )
+    defaults = BenchmarkConfig()
+    parser.add_argument("--chapters", type=int, default=defaults.chapters)
+    parser.add_argument("--headings-per-chapter", type=int, default=defaults.headings_per_chapter)
+    parser.add_argument("--lines-per-heading", type=int, default=defaults.lines_per_heading)
+    parser.add_argument("--pdf-pages", type=int, default=defaults.pdf_pages)
+    parser.add_argument("--queries", type=int, default=defaults.queries)
+    parser.add_argument("--repeats", type=int, default=defaults.repeats)
+    parser.add_argument("--top-k", type=int, default=defaults.top_k)
+    parser.add_argument("--retrieval-mode", choices=(HYBRID, VECTOR), default=defaults.retrieval_mode)
+    parser.add_argument("--chunking", choices=(FLAT, HS_HIERARCHY), default=defaults.chunking)
+    parser.add_argument("--embed-dim", type=int, default=defaults.embed_dim)
+    parser.add_argument("--embed-latency-ms", type=float, default=defaults.embed_latency_ms)
+    parser.add_argument("--llm-latency-ms", type=float, default=defaults.llm_latency_ms)
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--workdir", type=Path, help="Keep generated data here instead of a temporary directory")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(**{name: value for name, value in vars(args).items() if name in BenchmarkConfig.model_fields})
+    report = run_benchmarks(config, workdir=args.workdir)
+
+    payload = report.model_dump_json(indent=2)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(payload, encoding="utf-8")
+        logger.info("Wrote benchmark report to %s", args.output)
+    else:
+        sys.stdout.write(payload + "\n")
+    return 0
@@ -0,0 +1,123 @@
+from pathlib import Path
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pymupdf
+
+from sg_trade_ragbot.parser.hs_codes import extract_tariff_lines
+
+_ROMAN = ("I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X",
+          "XI", "XII", "XIII", "XIV", "XV", "XVI", "XVII", "XVIII", "XIX", "XX", "XXI")
+
+_MATERIALS = ("cotton", "wool", "steel", "copper", "aluminium", "rubber", "plastic", "glass", "leather",
+              "paper", "silk", "ceramic", "timber", "bamboo", "nickel", "zinc", "polyester", "nylon")
+_GOODS = ("yarn", "fabric", "sheets", "tubes", "wire", "fittings", "containers", "panels", "footwear",
+          "garments", "tools", "valves", "pumps", "filters", "bottles", "cables", "screws", "gloves")
+_QUALIFIERS = ("pure-bred breeding", "frozen", "fresh or chilled", "bleached", "unbleached", "coated",
+               "printed", "dyed", "seamless", "welded", "knitted", "woven", "refined", "crude", "insulated")
+_UNITS = ("kg", "u", "l", "m", "m2", "tne")
+_DUTIES = ("Free", "Free", "Free", "5%", "$0.30/kg", "$88.00/l")
+
+# text lines written per PDF page by write_synthetic_pdf
+LINES_PER_PAGE = 60
+
+
+def _description(rng: random.Random) -> str:
+    return f"{rng.choice(_QUALIFIERS)} {rng.choice(_MATERIALS)} {rng.choice(_GOODS)}"
+
+
+def synthetic_tariff_markdown(
+    chapters: int = 10,
+    headings_per_chapter: int = 8,
+    lines_per_heading: int = 6,
+    seed: int = 0,
+) -> str:
+    """
+    Markdown shaped like pdf_to_markdown output for the STCCED: Section and
+    Chapter headers followed by tariff tables with one heading row (01.04) and
+    lines_per_heading tariff lines (0104.10.10) per heading. The same seed
+    always yields the same text.
+    """
+    rng = random.Random(seed)
+    out: List[str] = []
+
+    for chapter in range(1, chapters + 1):
+        if chapter % 4 == 1:
+            section = _ROMAN[(chapter // 4) % len(_ROMAN)]
+            out += [f"## SECTION {section}", f"{rng.choice(_MATERIALS).upper()} AND ARTICLES THEREOF", ""]
+
+        out += [f"### Chapter {chapter}", f"{rng.choice(_GOODS).capitalize()} of {rng.choice(_MATERIALS)}", ""]
+        out += ["| HS Code | Description | Unit | Customs Duty | Excise Duty |",
+                "|---|---|---|---|---|"]
+
+        for heading in range(1, headings_per_chapter + 1):
+            out.append(f"| {chapter:02d}.{heading:02d} | {_description(rng).capitalize()}. | | | |")
+            for line in range(1, lines_per_heading + 1):
+                code = f"{chapter:02d}{heading:02d}.{(line + 1) // 2 * 10:02d}.{(2 - line % 2) * 10:02d}"
+                out.append(f"|{code}|- - {_description(rng).capitalize()}|{rng.choice(_UNITS)}|"
+                           f"{rng.choice(_DUTIES)}|{rng.choice(_DUTIES)}|")
+        out.append("")
+
+    return "\n".join(out)
+
+
+def synthetic_questions(markdown: str, count: int, seed: int = 0) -> List[str]:
+    """Natural-language questions about tariff lines picked from markdown."""
+    rng = random.Random(seed)
+    lines = [line for line in extract_tariff_lines(markdown) if len(line.hs_code) == 8]
+    if not lines:
+        return []
+    return [f"What is the HS code and duty for {rng.choice(lines).description.lstrip('- ').lower()}?"
+            for _ in range(count)]
+
+
+def write_synthetic_pdf(path: Path, pages: int = 10, seed: int = 0) -> Path:
+    """
+    Write a pages-page PDF of plain-text tariff rows for benchmarking the PDF
+    conversion. Returns path.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    headings = max(1, pages * LINES_PER_PAGE // 7)
+    rows = [row.replace("|", "  ").strip()
+            for row in synthetic_tariff_markdown(chapters=1 + headings // 99, headings_per_chapter=min(headings, 99),
+                                                 lines_per_heading=6, seed=seed).splitlines()]
+
+    with pymupdf.open() as doc:
+        for page_number in range(pages):
+            page = doc.new_page()
+            text = "\n".join(rows[page_number * LINES_PER_PAGE:(page_number + 1) * LINES_PER_PAGE])
+            page.insert_text((36, 36), text or " ", fontsize=8)
+        doc.save(str(path))
+
+    return path
+
+
+def synthetic_embeddings(
+    rows: int,
+    dim: int,
+    queries: int = 0,
+    clusters: Optional[int] = None,
+    spread: float = 2.0,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (rows x dim corpus, queries x dim queries) of L2-normalised float32 vectors
+    drawn from one mixture of clusters Gaussian topics (default one per 100
+    rows); spread is the standard deviation of the noise around a topic
+    relative to that of the topic centres.
+    Real chunk embeddings cluster by topic in the same way, which is what an
+    IVF index relies on; uniform random vectors would understate its recall.
+    """
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, rows // 100)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        noise = rng.standard_normal((count, dim), dtype=np.float32) * spread
+        vectors = centers[rng.integers(clusters, size=count)] + noise
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return sample(rows), sample(queries)
@@ -0,0 +1,167 @@
+import logging
+import math
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# lists scanned per query, see IVFIndex.candidate_rows
+DEFAULT_N_PROBE = 16
+# below this many rows an exact scan is already well under a millisecond, so no
+# index is built unless the number of lists is given explicitly
+ANN_MIN_ROWS = 20_000
+
+# k-means trains on at most this many rows per list, and stops early once fewer
+# than KMEANS_TOLERANCE of the rows change list in an iteration
+KMEANS_ROWS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+KMEANS_TOLERANCE = 0.001
+# rows x lists scored per matrix product while assigning, bounds that scratch space (64MB of float32)
+ASSIGN_BLOCK_CELLS = 1 << 24
+
+
+def default_n_lists(n_rows: int) -> int:
+    """4 * sqrt(n_rows) lists, the usual IVF rule of thumb (~200 for 2.5k rows, ~2800 for 500k)."""
+    return max(1, min(n_rows, int(round(4 * math.sqrt(n_rows)))))
+
+
+def _as_float32(rows: np.ndarray) -> np.ndarray:
+    return np.asarray(rows, dtype=np.float32)
+
+
+def assign_lists(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (highest cosine similarity) of every row of matrix."""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    block_rows = max(1, ASSIGN_BLOCK_CELLS // max(1, len(centroids)))
+    for start in range(0, len(matrix), block_rows):
+        block = _as_float32(matrix[start:start + block_rows])
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(matrix: np.ndarray, n_lists: int, seed: int = 0,
+                    iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """
+    Spherical k-means over a sample of the (L2-normalised) rows of matrix:
+    n_lists unit-length centroids. Lists that end up empty are reseeded from
+    random rows, so every centroid stays inside the data.
+    """
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(matrix)))
+
+    sample_size = min(len(matrix), n_lists * KMEANS_ROWS_PER_LIST)
+    sample_ids = np.sort(rng.choice(len(matrix), size=sample_size, replace=False))
+    sample = _as_float32(matrix[sample_ids])
+
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    labels = np.full(len(sample), -1, dtype=np.int32)
+    for _ in range(iterations):
+        new_labels = assign_lists(sample, centroids)
+        changed = int((new_labels != labels).sum())
+        labels = new_labels
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.flatnonzero(np.bincount(labels, minlength=n_lists) == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+
+        if changed <= KMEANS_TOLERANCE * len(sample):
+            break
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a NumpyVectorStore matrix.
+
+    The rows are clustered into lists around k-means centroids and the store
+    keeps its matrix sorted by list, so list i is the contiguous slice
+    rows[offsets[i]:offsets[i + 1]]. A query scores the centroids, then only the
+    rows of the n_probe closest lists: roughly n_probe / n_lists of the matrix
+    instead of all of it. More probes trade latency for recall (see
+    benchmarks/ann.py). Rows past offsets[-1] were added after the index was
+    built and are always scanned.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, trained_rows: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.trained_rows = int(trained_rows)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.offsets[-1])
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        n_lists: Optional[int] = None,
+        previous: Optional["IVFIndex"] = None,
+        seed: int = 0,
+    ) -> Tuple["IVFIndex", np.ndarray]:
+        """
+        Index over matrix, plus the row order that groups its rows by list; the
+        caller must reorder the matrix (and anything aligned with it) by that
+        order before searching. The centroids of previous are reused instead of
+        training new ones, which is how an updated store keeps its lists.
+        """
+        if previous is not None:
+            centroids, trained_rows = previous.centroids, previous.trained_rows
+        else:
+            centroids = train_centroids(matrix, n_lists or default_n_lists(len(matrix)), seed=seed)
+            trained_rows = len(matrix)
+            logger.info("Trained %d IVF lists on %d rows", len(centroids), trained_rows)
+        labels = assign_lists(matrix, centroids)
+
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, offsets, trained_rows), order
+
+    def candidate_rows(self, query: np.ndarray, k: int, n_probe: int = DEFAULT_N_PROBE,
+                       n_rows: Optional[int] = None) -> np.ndarray:
+        """
+        Rows in the n_probe lists whose centroids are closest to query (more
+        lists if those hold fewer than k rows), plus any rows of an n_rows-long
+        matrix added after the index was built.
+        """
+        n_probe = max(1, min(n_probe, self.n_lists))
+        sizes = np.diff(self.offsets)
+
+        scores = self.centroids @ query
+        probes = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        if sizes[probes].sum() < k:
+            ranked = np.argsort(-scores)
+            enough = int(np.searchsorted(np.cumsum(sizes[ranked]), k)) + 1
+            probes = ranked[:max(n_probe, min(enough, self.n_lists))]
+
+        parts = [np.arange(self.offsets[i], self.offsets[i + 1]) for i in np.sort(probes) if sizes[i]]
+        if n_rows is not None and n_rows > self.n_rows:
+            parts.append(np.arange(self.n_rows, n_rows))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        # np.savez appends .npz to names without it, so the temporary name keeps that suffix
+        tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(tmp_path, centroids=self.centroids, offsets=self.offsets,
+                 trained_rows=np.int64(self.trained_rows))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], int(data["trained_rows"]))
@@ -0,0 +1,127 @@
+from collections import Counter
+import heapq
+import json
+import logging
+import math
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from sg_trade_ragbot.parser.hs_hierarchy import is_leaf
+
+logger = logging.getLogger(__name__)
+
+
+BM25_INDEX_FILENAME = "bm25.json"
+
+# dotted HS codes are kept whole (as digits) so "0104.10.10" and "01041010" match
+_TOKEN_RE = re.compile(r"\d{2,4}(?:\.\d{2})+|\d+|[a-z]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or other than that the this to with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token[0].isdigit():
+            tokens.append(token.replace(".", ""))
+        elif token not in _STOPWORDS and len(token) > 1:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over node texts, stored as an inverted index of
+    term -> [(doc position, term frequency)]. Complements embedding retrieval on
+    exact product terms and numeric codes.
+    """
+
+    def __init__(
+        self,
+        node_ids: List[str],
+        doc_lens: List[int],
+        postings: Dict[str, List[Tuple[int, int]]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.node_ids = node_ids
+        self.doc_lens = doc_lens
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+
+        self._avg_len = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+        n_docs = len(node_ids)
+        self._idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def from_texts(cls, items: Iterable[Tuple[str, str]], **kwargs) -> "BM25Index":
+        """Build from (node_id, text) pairs."""
+        node_ids: List[str] = []
+        doc_lens: List[int] = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+
+        for position, (node_id, text) in enumerate(items):
+            tokens = tokenize(text)
+            node_ids.append(node_id)
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((position, tf))
+
+        return cls(node_ids, doc_lens, postings, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def query(self, text: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (node_id, score) pairs, best first."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(text)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self._idf[term]
+            for position, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[position] / (self._avg_len or 1.0))
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.node_ids[position], score) for position, score in best]
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "node_ids": self.node_ids,
+            "doc_lens": self.doc_lens,
+            "postings": self.postings,
+        }
+        Path(path).write_text(json.dumps(payload), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        postings = {term: [tuple(p) for p in plist] for term, plist in payload["postings"].items()}
+        return cls(payload["node_ids"], payload["doc_lens"], postings, k1=payload["k1"], b=payload["b"])
+
+
+def build_bm25_index(docstore, index_out_dir: Path) -> Path:
+    """
+    Build a BM25 index over every leaf node in the index docstore and persist it as
+    index_out_dir/bm25.json, next to the storage context. Returns the written path.
+    """
+    # parent nodes of the HS hierarchy repeat their leaves' text, only leaves are ranked
+    items = ((node_id, node.get_content()) for node_id, node in docstore.docs.items() if is_leaf(node))
+    bm25 = BM25Index.from_texts(items)
+
+    out_path = Path(index_out_dir) / BM25_INDEX_FILENAME
+    bm25.save(out_path)
+    logger.info("Wrote BM25 index over %d nodes (%d terms) to %s", len(bm25), len(bm25.postings), out_path)
+
+    return out_path
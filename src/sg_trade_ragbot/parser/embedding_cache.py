@@ -0,0 +1,132 @@
+from array import array
+import hashlib
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite"
+
+# roughly 100k chunks of a 1536-dim embedding is ~1.2GB on disk, plenty for
+# several editions of the tariff book
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of node embeddings.
+
+    Entries are keyed by a hash of (embedded text, embedding model name,
+    chunking parameters) so that an unchanged chunk reuses its stored vector
+    across index rebuilds. The store is a single sqlite file; when it grows past
+    max_entries the least recently used vectors are evicted.
+    """
+
+    def __init__(self, path: Path, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text: str, model_name: str, chunk_params: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name, chunk_params, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Return the cached vectors for the given keys. Missing keys are absent from
+        the result; hit/miss counters are updated per requested key.
+        """
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # stay well below sqlite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("d")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+            for key in keys:
+                if key in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors for the given keys and evict down to max_entries."""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("d", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._conn.commit()
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        if self.max_entries is None:
+            return
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used ASC, rowid ASC LIMIT ?)",
+            (overflow,),
+        )
+        self._conn.commit()
+        logger.info("Evicted %d entries from embedding cache %s", overflow, self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,223 @@
+from bisect import bisect_left
+import json
+import logging
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Optional
+
+from sg_trade_ragbot.utils.pydantic_models.models import TariffLine
+
+logger = logging.getLogger(__name__)
+
+
+HS_CODE_INDEX_FILENAME = "hs_codes.json"
+
+# 01.04 (heading), 0104.10 (subheading), 0104.10.10 (tariff line), or undotted
+_CELL_CODE_RE = re.compile(r"^(\d{2}\.\d{2}|\d{4}\.\d{2}(?:\.\d{2})?|\d{4}|\d{6}|\d{8})$")
+# outside of tables only dotted codes are trusted, bare digits are too often years or amounts
+_LINE_CODE_RE = re.compile(r"^(\d{2}\.\d{2}|\d{4}\.\d{2}(?:\.\d{2})?)\s+(.+)$")
+
+_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{2,}")
+_MARKUP_RE = re.compile(r"<br\s*/?>|\*\*|__|`")
+
+# header keyword -> TariffLine field
+_HEADER_FIELDS = (
+    ("description", "description"),
+    ("unit", "unit"),
+    ("customs", "customs_duty"),
+    ("excise", "excise_duty"),
+    ("hs", "hs_code"),
+    ("code", "hs_code"),
+)
+_POSITIONAL_FIELDS = ("hs_code", "description", "unit", "customs_duty", "excise_duty")
+
+
+def normalize_code(code: str) -> str:
+    """Digits-only form of an HS code: '0104.10.10' -> '01041010'."""
+    return re.sub(r"\D", "", code)
+
+
+def format_code(digits: str) -> str:
+    """Dotted display form of a digits-only HS code: '01041010' -> '0104.10.10'."""
+    if len(digits) <= 2:
+        return digits
+    if len(digits) == 4:
+        return f"{digits[:2]}.{digits[2:]}"
+    return ".".join([digits[:4]] + [digits[i:i + 2] for i in range(4, len(digits), 2)])
+
+
+def normalize_description(text: str) -> str:
+    """Lowercase, drop the leading '- -' indentation dashes and punctuation, collapse whitespace."""
+    text = _MARKUP_RE.sub(" ", text).lower()
+    text = re.sub(r"^[\s\-–—:]+", "", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _clean_cell(cell: str) -> str:
+    return " ".join(_MARKUP_RE.sub(" ", cell).split())
+
+
+def _split_row(line: str) -> List[str]:
+    return [_clean_cell(cell) for cell in line.strip().strip("|").split("|")]
+
+
+def _header_mapping(cells: List[str]) -> Optional[Dict[int, str]]:
+    lowered = [cell.lower() for cell in cells]
+    if not any("description" in cell for cell in lowered):
+        return None
+
+    mapping = {}
+    for i, cell in enumerate(lowered):
+        for keyword, field in _HEADER_FIELDS:
+            if keyword in cell and field not in mapping.values():
+                mapping[i] = field
+                break
+    return mapping
+
+
+def _row_to_line(cells: List[str], mapping: Optional[Dict[int, str]], source: str) -> Optional[TariffLine]:
+    code_index = next((i for i, cell in enumerate(cells) if _CELL_CODE_RE.match(cell)), None)
+    if code_index is None:
+        return None
+
+    fields: Dict[str, str] = {}
+    if mapping and mapping.get(code_index) == "hs_code":
+        for i, cell in enumerate(cells):
+            field = mapping.get(i)
+            if field and field != "hs_code" and cell:
+                fields[field] = cell
+    else:
+        # no usable header, read the columns after the code positionally
+        values = [cell for cell in cells[code_index + 1:] if cell]
+        fields = dict(zip(_POSITIONAL_FIELDS[1:], values))
+
+    description = fields.pop("description", "")
+    if not description:
+        return None
+
+    return TariffLine(hs_code=normalize_code(cells[code_index]), description=description, source=source, **fields)
+
+
+def extract_tariff_lines(md_text: str, source: str = "") -> List[TariffLine]:
+    """
+    Pull tariff rows out of the markdown produced by pdf_to_markdown. Table rows
+    are read through their header when one names a description column, and
+    positionally (code, description, unit, customs, excise) otherwise. Plain
+    text lines that start with a dotted code are picked up as well.
+    """
+    lines: List[TariffLine] = []
+    mapping: Optional[Dict[int, str]] = None
+
+    for raw in md_text.splitlines():
+        stripped = raw.strip()
+
+        if not stripped.startswith("|"):
+            mapping = None
+            match = _LINE_CODE_RE.match(_clean_cell(stripped).lstrip("#").strip())
+            if match:
+                lines.append(TariffLine(hs_code=normalize_code(match.group(1)),
+                                        description=match.group(2).strip(),
+                                        source=source))
+            continue
+
+        if _SEPARATOR_RE.match(stripped):
+            continue
+
+        cells = _split_row(stripped)
+        header = _header_mapping(cells)
+        if header is not None:
+            mapping = header
+            continue
+
+        line = _row_to_line(cells, mapping, source)
+        if line is not None:
+            lines.append(line)
+
+    return lines
+
+
+class HSCodeIndex:
+    """
+    In-memory code -> TariffLine lookup. Codes are kept sorted as digit strings
+    so any chapter/heading/subheading prefix is a contiguous slice found with
+    bisect. Normalised descriptions map back to their codes for near-verbatim
+    heading queries.
+    """
+
+    def __init__(self, lines: Iterable[TariffLine]):
+        self._by_code: Dict[str, TariffLine] = {}
+        for line in lines:
+            existing = self._by_code.get(line.hs_code)
+            if existing is None:
+                self._by_code[line.hs_code] = line
+            else:
+                # the same code can appear on several pages; fill in missing columns
+                updates = {field: value for field, value in line.model_dump().items()
+                           if value and not getattr(existing, field)}
+                if updates:
+                    self._by_code[line.hs_code] = existing.model_copy(update=updates)
+
+        self._codes = sorted(self._by_code)
+
+        self._by_description: Dict[str, List[str]] = {}
+        for code in self._codes:
+            key = normalize_description(self._by_code[code].description)
+            if key:
+                self._by_description.setdefault(key, []).append(code)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def lines(self) -> List[TariffLine]:
+        """Every line, in code order."""
+        return [self._by_code[code] for code in self._codes]
+
+    def exact(self, code: str) -> Optional[TariffLine]:
+        return self._by_code.get(normalize_code(code))
+
+    def prefix(self, code: str, limit: Optional[int] = None) -> List[TariffLine]:
+        """All lines under a chapter/heading/subheading, in code order."""
+        prefix = normalize_code(code)
+        if not prefix:
+            return []
+
+        results = []
+        for i in range(bisect_left(self._codes, prefix), len(self._codes)):
+            if not self._codes[i].startswith(prefix) or (limit is not None and len(results) >= limit):
+                break
+            results.append(self._by_code[self._codes[i]])
+        return results
+
+    def by_description(self, text: str) -> List[TariffLine]:
+        return [self._by_code[code] for code in self._by_description.get(normalize_description(text), [])]
+
+    def save(self, path: Path) -> None:
+        payload = [self._by_code[code].model_dump(exclude_none=True) for code in self._codes]
+        Path(path).write_text(json.dumps(payload), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "HSCodeIndex":
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(TariffLine.model_validate(item) for item in payload)
+
+
+def build_hs_code_index(md_dir: Path, index_out_dir: Path) -> Path:
+    """
+    Extract tariff lines from every markdown file in md_dir and persist them as
+    index_out_dir/hs_codes.json, next to the vector index. Returns the written path.
+    """
+    md_dir = Path(md_dir).resolve()
+    index_out_dir = Path(index_out_dir).resolve()
+    index_out_dir.mkdir(parents=True, exist_ok=True)
+
+    lines: List[TariffLine] = []
+    for md_path in sorted(md_dir.glob("*.md")):
+        lines.extend(extract_tariff_lines(md_path.read_text(encoding="utf-8"), source=md_path.name))
+
+    index = HSCodeIndex(lines)
+    out_path = index_out_dir / HS_CODE_INDEX_FILENAME
+    index.save(out_path)
+    logger.info("Wrote %d HS codes (%d rows) to %s", len(index), len(lines), out_path)
+
+    return out_path
@@ -0,0 +1,211 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser, TokenTextSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, NodeRelationship, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from sg_trade_ragbot.parser.hs_codes import normalize_code
+
+# chunking strategies accepted by build_and_persist_index / stream_ingest
+FLAT = "flat"
+HS_HIERARCHY = "hs_hierarchy"
+
+# leaves are embedded and retrieved; parents are only stored for expansion
+LEAF_CHUNK_SIZE = 256
+PARENT_CHUNK_SIZE = 1024
+
+# structural markers in the STCCED markdown, with optional markdown/table decoration
+_PREFIX = r"^[\s#*|_>]*"
+_SECTION_RE = re.compile(_PREFIX + r"section\s+([ivxlc]+)\b", re.IGNORECASE)
+_CHAPTER_RE = re.compile(_PREFIX + r"chapter\s+(\d{1,2})\b", re.IGNORECASE)
+# 01.04 or a bare 4-digit table cell, but not 0104.10 subheadings
+_HEADING_RE = re.compile(_PREFIX + r"(\d{2}\.\d{2}(?![.\d])|\d{4}(?=\s*\|))")
+_SUBHEADING_RE = re.compile(r"\b(\d{4}\.\d{2}(?:\.\d{2})?)\b")
+_TITLE_STRIP_RE = re.compile(r"[|*_#]+")
+
+
+class _Block:
+    """Consecutive lines sharing one position in the Section/Chapter/Heading tree."""
+
+    def __init__(self, metadata: Dict[str, str]):
+        self.metadata = metadata
+        self.lines: List[str] = []
+
+
+def _open_block(context: Dict[str, str], line: str) -> Optional[Dict[str, str]]:
+    """
+    The hs_* metadata of the block line opens given the context before it, or
+    None if line is not a Section, Chapter or Heading marker. A new chapter
+    clears the heading, a new section clears both.
+    """
+    section = _SECTION_RE.match(line)
+    if section:
+        return {"hs_section": section.group(1).upper()}
+
+    chapter = _CHAPTER_RE.match(line)
+    if chapter:
+        context = {k: v for k, v in context.items() if k == "hs_section"}
+        context["hs_chapter"] = chapter.group(1).zfill(2)
+        return context
+
+    heading = _HEADING_RE.match(line)
+    if heading:
+        code = normalize_code(heading.group(1))
+        context = {k: v for k, v in context.items() if k in ("hs_section", "hs_chapter")}
+        context.setdefault("hs_chapter", code[:2])
+        context["hs_heading"] = code
+        title = " ".join(_TITLE_STRIP_RE.sub(" ", line[heading.end():]).split())
+        if title:
+            context["hs_heading_title"] = title
+        return context
+
+    return None
+
+
+def split_hs_blocks(text: str, context: Optional[Dict[str, str]] = None) -> List[_Block]:
+    """
+    Split STCCED markdown into blocks at every Section, Chapter and Heading
+    marker. Each block carries the hs_* metadata of the innermost levels seen
+    so far, starting from context for text that continues an earlier one.
+    """
+    context = dict(context or {})
+    blocks = [_Block(dict(context))]
+
+    for line in text.splitlines():
+        opened = _open_block(context, line)
+        if opened is not None:
+            context = opened
+            blocks.append(_Block(dict(context)))
+        blocks[-1].lines.append(line)
+
+    return [block for block in blocks if any(line.strip() for line in block.lines)]
+
+
+def last_block_start(text: str, context: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str]]:
+    """
+    Offset of the last Section, Chapter or Heading line in text (0 without
+    one) and the hs_* context in effect just before it, starting from context
+    as in split_hs_blocks. Splitting text there and passing that context for
+    the rest yields the same blocks as splitting it whole.
+    """
+    context = dict(context or {})
+    start, start_context = 0, dict(context)
+    position = 0
+
+    for line in text.splitlines(keepends=True):
+        opened = _open_block(context, line)
+        if opened is not None:
+            start, start_context = position, context
+            context = opened
+        position += len(line)
+
+    return start, start_context
+
+
+def _pack_lines(lines: Sequence[str], chunk_size: int, tokenizer: Callable) -> List[str]:
+    """
+    Group whole lines (table rows) into chunks of at most chunk_size tokens. A
+    single line longer than chunk_size is split on tokens.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for line in lines:
+        tokens = len(tokenizer(line)) + 1
+        if tokens > chunk_size:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=0).split_text(line))
+            continue
+        if current and current_tokens + tokens > chunk_size:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _link(parent: BaseNode, child: BaseNode) -> None:
+    child.relationships[NodeRelationship.PARENT] = parent.as_related_node_info()
+    parent.relationships.setdefault(NodeRelationship.CHILD, []).append(child.as_related_node_info())
+
+
+def is_leaf(node: BaseNode) -> bool:
+    return NodeRelationship.CHILD not in node.relationships
+
+
+class HSHierarchyNodeParser(NodeParser):
+    """
+    Node parser for the STCCED tariff markdown that follows its Section ->
+    Chapter -> Heading structure instead of cutting at fixed token counts.
+
+    Every heading block becomes one or more parent nodes of up to
+    parent_chunk_size tokens, each split line-wise into leaf nodes of up to
+    leaf_chunk_size tokens linked to it with PARENT/CHILD relationships. A
+    parent that already fits in one leaf is emitted as the leaf itself. All
+    nodes carry hs_section/hs_chapter/hs_heading metadata; leaves also carry the
+    first subheading code they contain as hs_subheading.
+
+    Only leaves (nodes without children, see is_leaf) are meant to be embedded;
+    parents are kept in the docstore for SmallToBigRetriever to expand into.
+
+    Documents that continue an earlier text (stream_ingest parses a PDF in
+    block-aligned pieces) pass the hs_* context they start in as hs_context.
+    """
+
+    leaf_chunk_size: int = Field(default=LEAF_CHUNK_SIZE, gt=0)
+    parent_chunk_size: int = Field(default=PARENT_CHUNK_SIZE, gt=0)
+    # parents and leaves are interleaved, PARENT/CHILD is the meaningful link
+    include_prev_next_rel: bool = Field(default=False)
+
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, tokenizer: Optional[Callable] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HSHierarchyNodeParser"
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False,
+                     hs_context: Optional[Dict[str, str]] = None, **kwargs: Any) -> List[BaseNode]:
+        parsed: List[BaseNode] = []
+        for document in nodes:
+            for block in split_hs_blocks(document.get_content(), hs_context):
+                parsed.extend(self._parse_block(document, block))
+        return parsed
+
+    def _parse_block(self, document: BaseNode, block: _Block) -> List[BaseNode]:
+        out: List[BaseNode] = []
+        for parent_text in _pack_lines(block.lines, self.parent_chunk_size, self._tokenizer):
+            leaf_texts = _pack_lines(parent_text.splitlines(), self.leaf_chunk_size, self._tokenizer)
+            if len(leaf_texts) <= 1:
+                out.extend(self._build(document, [parent_text], block.metadata, leaves=True))
+                continue
+
+            parent = self._build(document, [parent_text], block.metadata, leaves=False)[0]
+            leaves = self._build(document, leaf_texts, block.metadata, leaves=True)
+            for leaf in leaves:
+                _link(parent, leaf)
+            out.append(parent)
+            out.extend(leaves)
+        return out
+
+    def _build(self, document: BaseNode, texts: List[str], metadata: Dict[str, str], leaves: bool) -> List[TextNode]:
+        nodes = build_nodes_from_splits(texts, document, id_func=self.id_func)
+        for node in nodes:
+            node.metadata.update(metadata)
+            if leaves:
+                match = _SUBHEADING_RE.search(node.get_content())
+                if match:
+                    node.metadata["hs_subheading"] = normalize_code(match.group(1))[:6]
+        return nodes
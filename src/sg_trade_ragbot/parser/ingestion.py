@@ -1,16 +1,52 @@
-from config import RAW_DATA_DIR, INTERMEDIATE_DATA_DIR, PROCESSED_DATA_DIR
+from config import RAW_DATA_DIR, INTERMEDIATE_DATA_DIR, PROCESSED_DATA_DIR, CACHE_DATA_DIR
 
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
+import json
 import logging
+import os
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Optional
-
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
+from typing import Iterable, Iterator, Optional
+
+from llama_index.core import (
+    Settings,
+    SimpleDirectoryReader,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
 from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.node_parser import MarkdownNodeParser, TokenTextSplitter
-
-from pymupdf4llm import to_markdown
+from llama_index.core.schema import BaseNode, Document, MetadataMode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+import pymupdf
+
+from sg_trade_ragbot.parser.bm25 import BM25_INDEX_FILENAME, build_bm25_index
+from sg_trade_ragbot.parser.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_FILENAME
+from sg_trade_ragbot.parser.hs_codes import HS_CODE_INDEX_FILENAME, build_hs_code_index
+from sg_trade_ragbot.parser.tariff_store import TARIFF_STORE_FILENAME, build_tariff_store
+from sg_trade_ragbot.parser.hs_hierarchy import (
+    FLAT,
+    HS_HIERARCHY,
+    LEAF_CHUNK_SIZE,
+    PARENT_CHUNK_SIZE,
+    HSHierarchyNodeParser,
+    is_leaf,
+    last_block_start,
+)
+from sg_trade_ragbot.parser.manifest import Manifest
+from sg_trade_ragbot.parser.ann_index import DEFAULT_N_PROBE
+from sg_trade_ragbot.parser.numpy_vector_store import (
+    NUMPY,
+    NumpyVectorStore,
+    new_storage_context,
+    storage_context_from_persist_dir,
+)
+from sg_trade_ragbot.parser.stage_stats import PipelineMeter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,53 +54,433 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# flat chunking parameters, also part of the embedding cache key
+CHUNK_SIZE = 1024
+CHUNK_OVERLAP = 128
+
+# pages converted per process-pool task when sharding a PDF
+PAGES_PER_SHARD = 50
+
+# nodes embedded and inserted per step of the streaming pipeline
+EMBED_BATCH_SIZE = 64
+
 
-def pdf_to_markdown(pdf_path: Path, out_dir: Path) -> Path:
+def _convert_page_range(pdf_path: str, pages: list[int]) -> list[tuple[int, str]]:
     """
-    Convert a PDF to markdown and write the result to out_dir/<stem>.md.
-    Returns the path to the written markdown file.
+    Convert a contiguous range of 0-based pages to markdown. Returns
+    (1-based page number, markdown) pairs. Runs inside pool workers, so it has
+    to stay a picklable module-level function.
+    """
+    # imported here, pymupdf4llm is slow to import and only needed for conversion
+    from pymupdf4llm import to_markdown
+
+    chunks = to_markdown(pdf_path, pages=pages, page_chunks=True)
+    return [(chunk["metadata"]["page_number"], chunk["text"]) for chunk in chunks]
+
+
+def _convert_pdfs(
+    pdf_paths: list[Path],
+    workers: int,
+    pages_per_shard: int,
+) -> dict[Path, list[tuple[int, str]]]:
+    """
+    Split every PDF into page-range shards and convert all shards of all PDFs
+    in a single process pool. Returns the pages of each PDF in page order.
+    """
+    shards = []
+    for pdf_path in pdf_paths:
+        with pymupdf.open(str(pdf_path)) as doc:
+            page_count = doc.page_count
+        for start in range(0, page_count, pages_per_shard):
+            shards.append((pdf_path, list(range(start, min(start + pages_per_shard, page_count)))))
+
+    pages: dict[Path, list[tuple[int, str]]] = {pdf_path: [] for pdf_path in pdf_paths}
+
+    if workers <= 1 or len(shards) <= 1:
+        for pdf_path, page_range in shards:
+            pages[pdf_path].extend(_convert_page_range(str(pdf_path), page_range))
+    else:
+        logger.info("Converting %d page shards of %d PDFs with %d workers", len(shards), len(pdf_paths), workers)
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            futures = [(pdf_path, pool.submit(_convert_page_range, str(pdf_path), page_range))
+                       for pdf_path, page_range in shards]
+            for pdf_path, future in futures:
+                pages[pdf_path].extend(future.result())
+
+    for pdf_pages in pages.values():
+        pdf_pages.sort(key=lambda page: page[0])
+
+    return pages
+
+
+def _write_markdown(md_path: Path, pages: list[tuple[int, str]]) -> Path:
+    """
+    Stitch converted pages into md_path and record where each page starts in a
+    <stem>.pages.json sidecar, so page numbers survive the flattening to text.
+    Returns the sidecar path.
     """
-    pdf_path = pdf_path.resolve()
+    offsets = []
+    parts = []
+    position = 0
+    for page_number, text in pages:
+        offsets.append({"page": page_number, "offset": position})
+        parts.append(text)
+        position += len(text)
+
+    md_path.write_text("".join(parts), encoding="utf-8")
+
+    pages_path = md_path.with_suffix(".pages.json")
+    pages_path.write_text(json.dumps(offsets), encoding="utf-8")
+
+    return pages_path
+
+
+def pdfs_to_markdown(
+    pdf_paths: list[Path],
+    out_dir: Path,
+    *,
+    workers: Optional[int] = None,
+    pages_per_shard: int = PAGES_PER_SHARD,
+) -> list[Path]:
+    """
+    Convert several PDFs to markdown, writing out_dir/<stem>.md for each.
+    Returns the markdown paths in the order of pdf_paths.
+
+    Conversions are tracked per PDF in out_dir/<out_dir.stem>_md.manifest.json, so
+    only PDFs whose fingerprint changed (or whose markdown went missing) are
+    converted again. Those are split into shards of pages_per_shard pages and
+    converted across a pool of workers processes (defaults to the core count).
+    """
+    pdf_paths = [Path(p).resolve() for p in pdf_paths]
     out_dir = out_dir.resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+    for pdf_path in pdf_paths:
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
-    md_path = out_dir / f"{pdf_path.stem}.md"
+    md_paths = [out_dir / f"{pdf_path.stem}.md" for pdf_path in pdf_paths]
 
-    # Check for marker file to skip repeated work if index already built
     md_id = f"{out_dir.stem}_md"
     marker_file = out_dir / f"{md_id}.ingested"
-    if marker_file.exists():
-        if md_path.exists():
-            logger.info("Markdown marker %s found — skipping PDF -> markdown conversion", marker_file)
+    manifest_file = out_dir / f"{md_id}.manifest.json"
+    manifest = Manifest.load(manifest_file)
+
+    stale = []
+    if manifest is not None:
+        for pdf_path, md_path in zip(pdf_paths, md_paths):
+            if md_path.exists() and manifest.is_current(pdf_path):
+                logger.info("PDF %s unchanged since last conversion — skipping PDF -> markdown conversion", pdf_path)
+            else:
+                stale.append(pdf_path)
+    elif marker_file.exists():
+        # Legacy all-or-nothing marker from before per-file manifests
+        manifest = Manifest()
+        for pdf_path, md_path in zip(pdf_paths, md_paths):
+            if md_path.exists():
+                logger.info("Markdown marker %s found — skipping PDF -> markdown conversion", marker_file)
+                manifest.record(pdf_path, outputs=[str(md_path)])
+            else:
+                logger.warning("Marker %s found but markdown %s missing; regenerating", marker_file, md_path)
+                stale.append(pdf_path)
+    else:
+        manifest = Manifest()
+        stale = list(pdf_paths)
+
+    if stale:
+        logger.info("Converting %d PDFs -> markdown", len(stale))
+        converted = _convert_pdfs(stale, workers or os.cpu_count() or 1, pages_per_shard)
+
+        for pdf_path in stale:
+            md_path = out_dir / f"{pdf_path.stem}.md"
+            pages_path = _write_markdown(md_path, converted[pdf_path])
+            logger.info("Wrote markdown to %s", md_path)
+            manifest.record(pdf_path, outputs=[str(md_path), str(pages_path)])
+
+    manifest.save(manifest_file)
+
+    if stale:
+        marker_contents = f"Ingested: {datetime.utcnow().isoformat()}Z\nSource: {', '.join(map(str, stale))}\n"
+        try:
+            marker_file.write_text(marker_contents, encoding="utf-8")
+            logger.info("Wrote markdown marker %s", marker_file)
+        except Exception:
+            logger.exception("Failed to write markdown marker %s", marker_file)
+
+    return md_paths
+
+
+def pdf_to_markdown(
+    pdf_path: Path,
+    out_dir: Path,
+    *,
+    workers: Optional[int] = None,
+    pages_per_shard: int = PAGES_PER_SHARD,
+) -> Path:
+    """
+    Convert a PDF to markdown and write the result to out_dir/<stem>.md.
+    Returns the path to the written markdown file. See pdfs_to_markdown.
+    """
+    return pdfs_to_markdown([pdf_path], out_dir, workers=workers, pages_per_shard=pages_per_shard)[0]
+
+
+def prune_stale_markdown(out_dir: Path) -> list[Path]:
+    """
+    Delete markdown (and page sidecar) files in out_dir whose source PDF no longer
+    exists and drop them from the conversion manifest. Returns the removed paths.
+    """
+    out_dir = Path(out_dir).resolve()
+    manifest_file = out_dir / f"{out_dir.stem}_md.manifest.json"
+    manifest = Manifest.load(manifest_file)
+    if manifest is None:
+        return []
+
+    removed = []
+    for pdf in [p for p in manifest.files if not Path(p).exists()]:
+        entry = manifest.forget(pdf)
+        for output in entry.outputs:
+            md_path = Path(output)
+            if md_path.exists():
+                md_path.unlink()
+                removed.append(md_path)
+                logger.info("Source %s removed — deleted stale output %s", pdf, md_path)
+
+    manifest.save(manifest_file)
+    return removed
+
+
+def _chunk_params(chunking: str) -> str:
+    if chunking == HS_HIERARCHY:
+        return f"hs_hierarchy;leaf={LEAF_CHUNK_SIZE};parent={PARENT_CHUNK_SIZE}"
+    return f"chunk_size={CHUNK_SIZE};chunk_overlap={CHUNK_OVERLAP}"
+
+
+def _embed_nodes_with_cache(
+    nodes: list[BaseNode],
+    embed_model,
+    cache: EmbeddingCache,
+    show_progress: bool = True,
+    chunking: str = HS_HIERARCHY,
+) -> int:
+    """
+    Attach embeddings to nodes in place, reusing cached vectors where the
+    (text, model, chunking) key is unchanged and embedding only the misses.
+    VectorStoreIndex skips nodes that already carry an embedding.
+    Returns the number of texts sent to the embedding model.
+    """
+    model_name = getattr(embed_model, "model_name", None) or type(embed_model).__name__
+    chunk_params = _chunk_params(chunking)
+
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    keys = [EmbeddingCache.make_key(text, model_name, chunk_params) for text in texts]
+    cached = cache.get_many(keys)
+
+    # identical chunks (e.g. repeated table headers) only need embedding once
+    to_embed = {key: text for key, text in zip(keys, texts) if key not in cached}
+    if to_embed:
+        new_embeddings = embed_model.get_text_embedding_batch(list(to_embed.values()), show_progress=show_progress)
+        fresh = dict(zip(to_embed.keys(), new_embeddings))
+        cache.put_many(fresh)
+        cached.update(fresh)
+
+    for node, key in zip(nodes, keys):
+        node.embedding = cached[key]
+
+    return len(to_embed)
+
+
+def _log_cache_stats(cache: EmbeddingCache, embedded: int) -> None:
+    logger.info("Embedding cache %s: %d hits, %d misses (%d embedded)",
+                cache.path, cache.hits, cache.misses, embedded)
+
+
+def _build_pipeline(chunking: str = HS_HIERARCHY) -> IngestionPipeline:
+    # the default in-memory IngestionCache would keep every parsed node alive for the pipeline's
+    # lifetime (all pages of a stream_ingest run); re-parsing is cheap next to the embedding cache
+    if chunking == HS_HIERARCHY:
+        return IngestionPipeline(transformations=[HSHierarchyNodeParser()], disable_cache=True)
+    if chunking != FLAT:
+        raise ValueError(f"Unknown chunking {chunking!r}, expected {HS_HIERARCHY!r} or {FLAT!r}")
+
+    # split long chunks
+    text_splitter = TokenTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+    parser = MarkdownNodeParser()
+
+    return IngestionPipeline(
+        transformations=[
+            parser,
+            text_splitter
+        ],
+        disable_cache=True,
+    )
 
-            return md_path
-        else:
-            logger.warning("Marker %s found but markdown %s missing; regenerating", marker_file, md_path)
 
-    logger.info("Converting PDF %s -> markdown", pdf_path)
-    md_text = to_markdown(str(pdf_path))
+def _split_leaves(nodes: list[BaseNode]) -> tuple[list[BaseNode], list[BaseNode]]:
+    """Separate the nodes to embed (leaves) from the parents only kept in the docstore."""
+    leaves, parents = [], []
+    for node in nodes:
+        (leaves if is_leaf(node) else parents).append(node)
+    return leaves, parents
 
-    md_path.write_text(md_text, encoding="utf-8")
-    logger.info("Wrote markdown to %s", md_path)
 
-    marker_contents = f"Ingested: {datetime.utcnow().isoformat()}Z\nSource: {pdf_path}\n"
+def _delete_ref_doc(index: VectorStoreIndex, doc_id: str) -> None:
+    """
+    delete_ref_doc for an index that also holds docstore-only parent nodes,
+    which VectorStoreIndex.delete_ref_doc would look up in the index struct.
+    """
+    ref_doc_info = index.docstore.get_ref_doc_info(doc_id)
+    indexed = set(index.index_struct.nodes_dict.values())
+    for node_id in list(ref_doc_info.node_ids) if ref_doc_info else []:
+        if node_id not in indexed:
+            index.docstore.delete_document(node_id, raise_error=False)
+    index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+
+def _load_page_offsets(md_path: Path) -> Optional[tuple[list[int], list[int]]]:
+    """(character offsets, page numbers) from the pages sidecar of md_path, or None without one."""
+    pages_path = md_path.with_suffix(".pages.json")
+    if not pages_path.exists():
+        return None
     try:
-        marker_file.write_text(marker_contents, encoding="utf-8")
-        logger.info("Wrote markdown marker %s", marker_file)
+        pages = json.loads(pages_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        logger.warning("Could not read page offsets %s; its nodes get no page numbers", pages_path, exc_info=True)
+        return None
+    return [page["offset"] for page in pages], [page["page"] for page in pages]
+
+
+def _set_page_number(node: BaseNode, text: str, offsets: list[int], page_numbers: list[int]) -> None:
+    """
+    Set page_number, the PDF page a chunk starts on, from the page offsets of
+    the text it was parsed from. The node is found in text by start_char_idx,
+    or by its content where the parser did not record one that matches.
+    """
+    content = node.get_content(metadata_mode=MetadataMode.NONE)
+    start = node.start_char_idx
+    if start is None or text[start:start + len(content)] != content:
+        start = text.find(content)
+    if start >= 0:
+        node.metadata["page_number"] = page_numbers[max(bisect_right(offsets, start) - 1, 0)]
+
+
+def _apply_page_numbers(documents: list[Document], nodes: list[BaseNode]) -> None:
+    """
+    Set page_number on the nodes of documents whose markdown has a pages
+    sidecar (see _write_markdown).
+    """
+    pages = {}
+    for document in documents:
+        offsets = _load_page_offsets(Path(document.metadata.get("file_path", "")))
+        if offsets:
+            pages[document.doc_id] = (document.text, *offsets)
+
+    for node in nodes:
+        if node.ref_doc_id in pages:
+            _set_page_number(node, *pages[node.ref_doc_id])
+
+
+def _parse_markdown(
+    md_files: list[Path],
+    chunking: str = HS_HIERARCHY,
+) -> tuple[list[BaseNode], dict[Path, list[str]]]:
+    """
+    Load the given markdown files and split them into nodes, with the page
+    numbers of converted PDFs (see _apply_page_numbers). Also returns the
+    ref_doc ids produced for each file, which is what the index deletes by.
+    """
+    documents = SimpleDirectoryReader(
+        input_files=[str(f) for f in md_files],
+        filename_as_id=True,
+    ).load_data()
+
+    doc_ids: dict[Path, list[str]] = {f: [] for f in md_files}
+    for doc in documents:
+        source = Path(doc.metadata.get("file_path", "")).resolve()
+        doc_ids.setdefault(source, []).append(doc.doc_id)
+        # inherited by the nodes; a page number is not worth re-embedding a chunk for
+        doc.excluded_embed_metadata_keys.append("page_number")
+
+    nodes = _build_pipeline(chunking).run(documents=documents)
+    _apply_page_numbers(documents, nodes)
+
+    return nodes, doc_ids
+
+
+def _load_persisted_index(index_out_dir: Path, index_id: str) -> Optional[VectorStoreIndex]:
+    try:
+        storage_context = storage_context_from_persist_dir(index_out_dir)
+        return load_index_from_storage(storage_context, index_id=index_id)
     except Exception:
-        logger.exception("Failed to write markdown marker %s", marker_file)
+        logger.warning("Could not load persisted index %s from %s; rebuilding from scratch",
+                       index_id, index_out_dir, exc_info=True)
+        return None
 
-    return md_path
 
+def _enable_ann(index: VectorStoreIndex, ann_lists: Optional[int], ann_probe: int) -> None:
+    """Turn on the IVF index of a loaded index's NumpyVectorStore; it is built when the index is persisted."""
+    vector_store = index.vector_store
+    if not isinstance(vector_store, NumpyVectorStore):
+        raise ValueError(f"An ANN index needs the {NUMPY!r} vector store backend, the persisted index has "
+                         f"{type(vector_store).__name__}")
+    vector_store.ann = True
+    vector_store.ann_lists = ann_lists or vector_store.ann_lists
+    vector_store.ann_probe = ann_probe
 
-def build_and_persist_index(md_dir: Path, index_out_dir: Path) -> Path:
+
+def _ann_missing(index_out_dir: Path) -> bool:
+    """Whether the persisted numpy store was built without an ANN index."""
+    return NumpyVectorStore.exists(index_out_dir) and not NumpyVectorStore.from_persist_dir(index_out_dir).ann
+
+
+def build_and_persist_index(
+    md_dir: Path,
+    index_out_dir: Path,
+    *,
+    cache_dir: Optional[Path] = None,
+    vector_store: str = NUMPY,
+    chunking: str = HS_HIERARCHY,
+    ann: bool = False,
+    ann_lists: Optional[int] = None,
+    ann_probe: int = DEFAULT_N_PROBE,
+) -> Path:
     """
     Build a VectorStoreIndex from a directory of markdown files and persist it under
     index_out_dir/<stem>_index. Returns the path to the persisted index directory.
 
+    Markdown files are fingerprinted in index_out_dir/<stem>_index.manifest.json.
+    When a manifest exists, only the nodes of added, edited or removed files are
+    deleted/inserted in the persisted index instead of rebuilding it. Without a
+    readable manifest (including indexes from before manifests, which only have
+    a .ingested marker) the index is rebuilt.
+
+    Node embeddings are looked up in an EmbeddingCache under cache_dir (defaults to
+    index_out_dir) so that rebuilds only embed new or edited chunks.
+
+    vector_store selects the backend for a fresh build: "numpy" (memory-mapped
+    float32 matrix, see parser/numpy_vector_store.py) or "simple" (llama-index
+    JSON store). Incremental updates keep whatever backend was persisted.
+
+    ann adds an IVF approximate nearest-neighbour index to the numpy store (see
+    parser/ann_index.py) for corpora too large to scan per query: ann_lists
+    lists (default ~4 * sqrt(chunks)), of which the retriever scans the
+    ann_probe closest. More probes raise recall and latency, see
+    benchmarks/ann.py. A persisted index keeps its ANN index on later updates,
+    and ann on an unchanged corpus adds one to the persisted index.
+
+    chunking "hs_hierarchy" splits along the tariff's Section/Chapter/Heading
+    structure into small embedded leaves linked to parent nodes that are only
+    stored in the docstore (see parser/hs_hierarchy.py); "flat" is the previous
+    markdown + 1024-token splitter.
+
+    The BM25 index over the same nodes (bm25.json), the HS code lookup index
+    (hs_codes.json) and the columnar tariff table (tariff_lines.parquet) are
+    rebuilt alongside, see parser/bm25.py, parser/hs_codes.py and
+    parser/tariff_store.py.
+
     Note: md_dir must be a directory (not a single file). The index name is derived
     from md_dir.stem.
     """
@@ -75,46 +491,94 @@ def build_and_persist_index(md_dir: Path, index_out_dir: Path) -> Path:
     index_out_dir = Path(index_out_dir).resolve()
     index_out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Check for marker file to skip repeated work if index already built
     index_id = f"{md_dir.stem}_index"
     marker_file = index_out_dir / f"{index_id}.ingested"
-    if marker_file.exists():
-        logger.info("Index marker %s found — skipping index build/persist", marker_file)
-        return index_out_dir
-
-    logger.info("Loading documents from markdown directory %s", md_dir)
-    documents = SimpleDirectoryReader(str(md_dir)).load_data()
-
-    # split long chunks
-    text_splitter = TokenTextSplitter(
-        chunk_size=1024,
-        chunk_overlap=128
-    )
-
-    parser = MarkdownNodeParser()
-
-    pipeline = IngestionPipeline(
-        transformations=[
-            parser,
-            text_splitter
-        ]
-    )
+    manifest_file = index_out_dir / f"{index_id}.manifest.json"
+    manifest = Manifest.load(manifest_file)
+
+    # Legacy all-or-nothing marker from before per-file manifests, or a lost/corrupt manifest: which
+    # files the index covers is unknown, so it is rebuilt once (the embedding cache keeps unchanged
+    # chunks from being embedded again) and gets a manifest and every sidecar index
+    if manifest is None and marker_file.exists():
+        logger.info("Index marker %s found without a manifest — rebuilding the index", marker_file)
+
+    md_files = sorted(p.resolve() for p in md_dir.glob("*.md"))
+
+    index = None
+    if manifest is not None:
+        changed = [f for f in md_files if not manifest.is_current(f)]
+        current = {str(f) for f in md_files}
+        removed = [p for p in manifest.files if p not in current]
+
+        if not changed and not removed and not (ann and _ann_missing(index_out_dir)):
+            logger.info("No markdown changes in %s since last build — skipping index build/persist", md_dir)
+            manifest.save(manifest_file)
+            if not (index_out_dir / HS_CODE_INDEX_FILENAME).exists():
+                build_hs_code_index(md_dir, index_out_dir)
+            if not (index_out_dir / TARIFF_STORE_FILENAME).exists():
+                build_tariff_store(index_out_dir)
+            if not (index_out_dir / BM25_INDEX_FILENAME).exists():
+                build_bm25_index(SimpleDocumentStore.from_persist_dir(str(index_out_dir)), index_out_dir)
+            return index_out_dir
+
+        index = _load_persisted_index(index_out_dir, index_id)
+
+    if index is None:
+        manifest = Manifest()
+        changed, removed = md_files, []
+        logger.info("Building index from %d markdown files in %s", len(changed), md_dir)
+    else:
+        logger.info("Updating index: %d changed/added, %d removed markdown files", len(changed), len(removed))
 
-    nodes = pipeline.run(documents=documents)
+        # drop the stale nodes of edited and deleted files
+        for path in removed + [str(f) for f in changed]:
+            entry = manifest.forget(path)
+            for doc_id in entry.outputs if entry else []:
+                _delete_ref_doc(index, doc_id)
 
-    logger.info("Building VectorStoreIndex from parsed nodes")
+    nodes, doc_ids = _parse_markdown(changed, chunking) if changed else ([], {})
+    nodes, parents = _split_leaves(nodes)
 
     # NOTE: llamaindex automatically uses ada, openai's embedding model,
     # to change, change in the settings:
     # https://developers.llamaindex.ai/python/framework/module_guides/models/embeddings/
-    index = VectorStoreIndex(nodes)
+    embed_model = Settings.embed_model
+    cache_dir = Path(cache_dir).resolve() if cache_dir else index_out_dir
+    cache = EmbeddingCache(cache_dir / EMBEDDING_CACHE_FILENAME)
+    try:
+        embedded = _embed_nodes_with_cache(nodes, embed_model, cache, chunking=chunking)
+        _log_cache_stats(cache, embedded)
+    finally:
+        cache.close()
+
+    if index is None:
+        logger.info("Building VectorStoreIndex from %d parsed nodes", len(nodes))
+        storage_context = new_storage_context(vector_store, ann=ann, ann_lists=ann_lists, ann_probe=ann_probe)
+        index = VectorStoreIndex(nodes, storage_context=storage_context, embed_model=embed_model)
+    else:
+        logger.info("Inserting %d parsed nodes into persisted index", len(nodes))
+        index.insert_nodes(nodes)
+        if ann:
+            _enable_ann(index, ann_lists, ann_probe)
+
+    if parents:
+        # not embedded, only fetched by id when retrieval expands a leaf to its parent
+        index.docstore.add_documents(parents, allow_update=True)
+        logger.info("Stored %d parent nodes in the docstore", len(parents))
 
     # Official persistence: set index id and persist storage_context
-    index_id = f"{md_dir.stem}_index"
     index.set_index_id(index_id)
     index.storage_context.persist(persist_dir=str(index_out_dir))
     logger.info("Index persisted to %s using storage_context.persist", index_out_dir)
 
+    for f in changed:
+        manifest.record(f, outputs=doc_ids.get(f, []))
+    manifest.save(manifest_file)
+
+    build_bm25_index(index.docstore, index_out_dir)
+    build_hs_code_index(md_dir, index_out_dir)
+    build_tariff_store(index_out_dir)
+
     # write marker to signal successful ingestion
     marker_contents = f"Ingested: {datetime.utcnow().isoformat()}Z\n"
     try:
@@ -126,39 +590,337 @@ def build_and_persist_index(md_dir: Path, index_out_dir: Path) -> Path:
     return index_out_dir
 
 
+def _iter_page_shards(
+    pdf_path: Path,
+    workers: int,
+    pages_per_shard: int,
+) -> Iterator[list[tuple[int, str]]]:
+    """
+    Yield converted page shards of a PDF in page order, keeping at most `workers`
+    shards in flight so converted text never piles up ahead of the consumer.
+    """
+    with pymupdf.open(str(pdf_path)) as doc:
+        page_count = doc.page_count
+    ranges = [list(range(start, min(start + pages_per_shard, page_count)))
+              for start in range(0, page_count, pages_per_shard)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        for page_range in ranges:
+            yield _convert_page_range(str(pdf_path), page_range)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        pending = deque()
+        remaining = iter(ranges)
+        for page_range in islice(remaining, workers):
+            pending.append(pool.submit(_convert_page_range, str(pdf_path), page_range))
+        while pending:
+            pages = pending.popleft().result()
+            for page_range in islice(remaining, 1):
+                pending.append(pool.submit(_convert_page_range, str(pdf_path), page_range))
+            yield pages
+
+
+def _iter_page_documents(
+    pdf_path: Path,
+    md_path: Path,
+    workers: int,
+    pages_per_shard: int,
+    meter: PipelineMeter,
+) -> Iterator[Document]:
+    """
+    Stream a PDF as one Document per page, appending each page to md_path (and
+    its offset to the pages sidecar) as it goes.
+    """
+    offsets = []
+    position = 0
+    shards = _iter_page_shards(pdf_path, workers, pages_per_shard)
+
+    with open(md_path, "w", encoding="utf-8") as md_file:
+        while True:
+            with meter.measure("convert", items=0) as stats:
+                pages = next(shards, None)
+                if pages is not None:
+                    stats.items += len(pages)
+            if pages is None:
+                break
+
+            for page_number, text in pages:
+                md_file.write(text)
+                offsets.append({"page": page_number, "offset": position})
+                position += len(text)
+
+                yield Document(
+                    text=text,
+                    id_=f"{md_path}_page_{page_number}",
+                    metadata={"file_path": str(md_path), "file_name": md_path.name, "page_number": page_number},
+                    # as in _parse_markdown, the page does not change what is embedded
+                    excluded_embed_metadata_keys=["page_number"],
+                )
+
+    md_path.with_suffix(".pages.json").write_text(json.dumps(offsets), encoding="utf-8")
+
+
+def _iter_block_documents(
+    pages: Iterable[Document],
+) -> Iterator[tuple[Document, dict[str, str], list[int], list[int]]]:
+    """
+    Regroup the page Documents of one markdown file (see _iter_page_documents)
+    into Documents that end where a Section, Chapter or Heading block starts, so
+    HSHierarchyNodeParser sees every block whole, as it does parsing the file in
+    build_and_persist_index. Yields each with the hs_* context it starts in and
+    the offsets and numbers of the pages it spans.
+
+    Only the text since the last block start is held back, so memory is bounded
+    by the longest block rather than the file.
+    """
+    text = ""
+    offsets: list[int] = []
+    page_numbers: list[int] = []
+    context: dict[str, str] = {}
+    metadata: dict = {}
+    part = 0
+
+    def cut(end: int) -> Document:
+        nonlocal part
+        part += 1
+        return Document(
+            text=text[:end],
+            id_=f"{metadata['file_path']}_part_{part}",
+            metadata={**metadata, "page_number": page_numbers[0]},
+            excluded_embed_metadata_keys=["page_number"],
+        )
+
+    for page in pages:
+        metadata = {k: v for k, v in page.metadata.items() if k != "page_number"}
+        offsets.append(len(text))
+        page_numbers.append(page.metadata["page_number"])
+        text += page.text
+
+        # a trailing partial line may turn out to be a marker once the next page completes it
+        start, start_context = last_block_start(text[:text.rfind("\n") + 1], context)
+        if start == 0:
+            continue
+
+        yield cut(start), context, offsets, page_numbers
+        first = bisect_right(offsets, start) - 1
+        offsets = [0] + [offset - start for offset in offsets[first + 1:]]
+        page_numbers = page_numbers[first:]
+        text, context = text[start:], start_context
+
+    if text:
+        yield cut(len(text)), context, offsets, page_numbers
+
+
+def _iter_nodes(documents: Iterable[Document], meter: PipelineMeter,
+                chunking: str = HS_HIERARCHY) -> Iterator[BaseNode]:
+    """
+    Parse the page Documents of one markdown file. With hs_hierarchy chunking
+    they are regrouped along block boundaries first (see _iter_block_documents)
+    and every node gets the page it starts on.
+    """
+    pipeline = _build_pipeline(chunking)
+    if chunking != HS_HIERARCHY:
+        for document in documents:
+            with meter.measure("parse", items=0) as stats:
+                nodes = pipeline.run(documents=[document])
+                stats.items += len(nodes)
+            yield from nodes
+        return
+
+    for document, context, offsets, page_numbers in _iter_block_documents(documents):
+        with meter.measure("parse", items=0) as stats:
+            nodes = pipeline.run(documents=[document], hs_context=context)
+            for node in nodes:
+                _set_page_number(node, document.text, offsets, page_numbers)
+            stats.items += len(nodes)
+        yield from nodes
+
+
+def _iter_embedded_batches(
+    nodes: Iterable[BaseNode],
+    embed_model,
+    cache: EmbeddingCache,
+    batch_size: int,
+    meter: PipelineMeter,
+    counts: dict,
+    chunking: str = HS_HIERARCHY,
+) -> Iterator[list[BaseNode]]:
+    nodes = iter(nodes)
+    while True:
+        batch = list(islice(nodes, batch_size))
+        if not batch:
+            return
+        with meter.measure("embed", items=len(batch)):
+            counts["embedded"] += _embed_nodes_with_cache(batch, embed_model, cache, show_progress=False,
+                                                          chunking=chunking)
+        yield batch
+
+
+def stream_ingest(
+    pdf_paths: list[Path],
+    md_out_dir: Path,
+    index_out_dir: Path,
+    *,
+    cache_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    pages_per_shard: int = PAGES_PER_SHARD,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    vector_store: str = NUMPY,
+    chunking: str = HS_HIERARCHY,
+    ann: bool = False,
+    ann_lists: Optional[int] = None,
+    ann_probe: int = DEFAULT_N_PROBE,
+) -> Path:
+    """
+    Rebuild the index from PDFs as a generator pipeline: page shards are
+    converted to markdown, split into nodes, embedded in fixed-size batches and
+    inserted into the index one batch at a time, so no stage ever holds the whole
+    corpus. Per-stage throughput and peak RSS are logged at the end. chunking and
+    the ann options are as in build_and_persist_index; hs_hierarchy chunks come
+    out the same as parsing each file whole, since pages are regrouped at block
+    boundaries and the Section/Chapter/Heading context carries across them.
+
+    The markdown, page sidecars and both manifests are written exactly as
+    pdfs_to_markdown/build_and_persist_index would, so later runs can update the
+    result incrementally. Returns index_out_dir.
+
+    Note: the vector store still grows with the index itself until it is
+    persisted; this path only removes the whole-corpus intermediates held by the
+    batch path.
+    """
+    pdf_paths = [Path(p).resolve() for p in pdf_paths]
+    md_out_dir = Path(md_out_dir).resolve()
+    md_out_dir.mkdir(parents=True, exist_ok=True)
+    index_out_dir = Path(index_out_dir).resolve()
+    index_out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    for pdf_path in pdf_paths:
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    index_id = f"{md_out_dir.stem}_index"
+    md_manifest = Manifest.load(md_out_dir / f"{md_out_dir.stem}_md.manifest.json") or Manifest()
+    index_manifest = Manifest()
+
+    embed_model = Settings.embed_model
+    cache_dir = Path(cache_dir).resolve() if cache_dir else index_out_dir
+    cache = EmbeddingCache(cache_dir / EMBEDDING_CACHE_FILENAME)
+    storage_context = new_storage_context(vector_store, ann=ann, ann_lists=ann_lists, ann_probe=ann_probe)
+    index = VectorStoreIndex([], storage_context=storage_context, embed_model=embed_model)
+
+    meter = PipelineMeter()
+    counts = {"embedded": 0}
+    try:
+        for pdf_path in pdf_paths:
+            md_path = md_out_dir / f"{pdf_path.stem}.md"
+            logger.info("Streaming PDF %s -> %s -> index", pdf_path, md_path)
+
+            # the ref_doc ids the index deletes this file by, in order
+            doc_ids = {}
+            parents = []
+
+            def leaves():
+                documents = _iter_page_documents(pdf_path, md_path, workers, pages_per_shard, meter)
+                for node in _iter_nodes(documents, meter, chunking):
+                    doc_ids.setdefault(node.ref_doc_id)
+                    if is_leaf(node):
+                        yield node
+                    else:
+                        parents.append(node)
+
+            for batch in _iter_embedded_batches(leaves(), embed_model, cache, embed_batch_size, meter, counts,
+                                                chunking):
+                with meter.measure("insert", items=len(batch)):
+                    index.insert_nodes(batch)
+                    index.docstore.add_documents(parents, allow_update=True)
+                    parents.clear()
+            index.docstore.add_documents(parents, allow_update=True)
+
+            md_manifest.record(pdf_path, outputs=[str(md_path), str(md_path.with_suffix(".pages.json"))])
+            index_manifest.record(md_path, outputs=list(doc_ids))
+
+        _log_cache_stats(cache, counts["embedded"])
+    finally:
+        cache.close()
+
+    with meter.measure("persist"):
+        index.set_index_id(index_id)
+        index.storage_context.persist(persist_dir=str(index_out_dir))
+    logger.info("Index persisted to %s using storage_context.persist", index_out_dir)
+
+    md_manifest.save(md_out_dir / f"{md_out_dir.stem}_md.manifest.json")
+    index_manifest.save(index_out_dir / f"{index_id}.manifest.json")
+
+    with meter.measure("bm25"):
+        build_bm25_index(index.docstore, index_out_dir)
+    with meter.measure("hs_codes"):
+        build_hs_code_index(md_out_dir, index_out_dir)
+    with meter.measure("tariff_store"):
+        build_tariff_store(index_out_dir)
+
+    meter.log(logger)
+
+    return index_out_dir
+
+
 def run(
     pdf_path: Optional[Path] = None,
     *,
     data_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    streaming: bool = False,
+    ann: bool = False,
 ) -> None:
     """
-    Simple script entrypoint.
+    Simple script entrypoint. Converts pdf_path, or every PDF in the raw data
+    directory when omitted, then brings the persisted index up to date.
+
+    workers sets the PDF conversion process pool size (defaults to the core count).
+    streaming rebuilds the index through the bounded-memory stream_ingest
+    pipeline instead of the incremental batch path. ann adds an approximate
+    nearest-neighbour index, see build_and_persist_index.
 
     Priority:
       1) explicit data_dir arg (treated as base data directory)
-      2) values imported from config (RAW_DIR / INTERMEDIATE_DIR / PROCESSED_DIR)
+      2) values imported from config (RAW_DIR / INTERMEDIATE_DIR / PROCESSED_DIR / CACHE_DIR)
     """
     if data_dir:
         base = Path(data_dir).resolve()
         raw_dir = base / "raw"
         intermediate_dir = base / "intermediate"
         processed_dir = base / "processed"
+        cache_dir = base / "cache"
     else:
         raw_dir = RAW_DATA_DIR
         intermediate_dir = INTERMEDIATE_DATA_DIR
         processed_dir = PROCESSED_DATA_DIR
+        cache_dir = CACHE_DATA_DIR
 
     # ensure directories exist where we will write
     intermediate_dir.mkdir(parents=True, exist_ok=True)
     processed_dir.mkdir(parents=True, exist_ok=True)
 
-    pdf_path = Path(pdf_path) if pdf_path else raw_dir / "stcced2022.pdf"
+    if pdf_path:
+        pdf_paths = [Path(pdf_path)]
+        if not pdf_paths[0].exists():
+            raise FileNotFoundError(f"PDF not found at {pdf_path}")
+    else:
+        pdf_paths = sorted(raw_dir.glob("*.pdf"))
+        if not pdf_paths:
+            raise FileNotFoundError(f"No PDFs found in {raw_dir}")
+
+    if streaming:
+        stream_ingest(pdf_paths, intermediate_dir, processed_dir, cache_dir=cache_dir, workers=workers, ann=ann)
+        return
 
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF not found at {pdf_path}")
+    # only PDFs that changed since the last run are converted again
+    pdfs_to_markdown(pdf_paths, intermediate_dir, workers=workers)
 
-    md_file = pdf_to_markdown(pdf_path, intermediate_dir)
+    if not pdf_path:
+        prune_stale_markdown(intermediate_dir)
 
-    # build_and_persist_index now expects a directory containing markdown files
-    md_dir = md_file.parent
-    build_and_persist_index(md_dir, processed_dir)
+    # build_and_persist_index expects a directory containing markdown files and
+    # only re-indexes the files that changed
+    build_and_persist_index(intermediate_dir, processed_dir, cache_dir=cache_dir, ann=ann)
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+
+class FileFingerprint(BaseModel):
+    size: int = Field(..., description="File size in bytes")
+    mtime: float = Field(..., description="Last modification time (st_mtime)")
+    sha256: str = Field(..., description="Hex digest of the file contents")
+
+
+class ManifestEntry(BaseModel):
+    fingerprint: FileFingerprint
+    outputs: List[str] = Field(default_factory=list,
+                               description="Artifacts derived from the file (markdown paths or index ref_doc ids)")
+
+
+class Manifest(BaseModel):
+    """
+    Per-file record of what has already been ingested. Lets the ingestion steps
+    redo work only for files whose fingerprint changed since the last run.
+    """
+    files: Dict[str, ManifestEntry] = Field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Manifest"]:
+        """Return the manifest stored at path, or None if missing or unreadable."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            return cls.model_validate_json(path.read_text(encoding="utf-8"))
+        except Exception:
+            logger.exception("Failed to read manifest %s; ignoring it", path)
+            return None
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.model_dump_json(indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def is_current(self, path: Path) -> bool:
+        """
+        True if path is recorded with an unchanged fingerprint. Size and mtime are
+        checked first; the content hash is only computed when those differ, so a
+        touched-but-identical file still counts as current.
+        """
+        entry = self.files.get(str(Path(path).resolve()))
+        if entry is None or not Path(path).exists():
+            return False
+
+        stat = Path(path).stat()
+        recorded = entry.fingerprint
+        if stat.st_size != recorded.size:
+            return False
+        if stat.st_mtime == recorded.mtime:
+            return True
+        if file_sha256(path) != recorded.sha256:
+            return False
+
+        # contents unchanged, remember the new mtime to keep the fast path
+        entry.fingerprint = FileFingerprint(size=stat.st_size, mtime=stat.st_mtime, sha256=recorded.sha256)
+        return True
+
+    def record(self, path: Path, outputs: List[str]) -> None:
+        self.files[str(Path(path).resolve())] = ManifestEntry(fingerprint=fingerprint(path), outputs=outputs)
+
+    def forget(self, path: str) -> Optional[ManifestEntry]:
+        return self.files.pop(str(path), None)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path: Path) -> FileFingerprint:
+    stat = Path(path).stat()
+    return FileFingerprint(size=stat.st_size, mtime=stat.st_mtime, sha256=file_sha256(path))
+
+
+# files rewritten by every persist of the index, see build_and_persist_index
+_INDEX_FILES = ("docstore.json", "index_store.json", "default__vector_store.json", "default__vector_store.npy",
+                "default__vector_store.ivf.npz")
+
+
+def index_version(persist_dir: Path) -> Optional[str]:
+    """
+    Cheap identifier of the persisted index, derived from the size and mtime of
+    its storage files. Changes whenever the index is rebuilt or updated; None if
+    nothing has been persisted.
+    """
+    parts = []
+    for name in _INDEX_FILES:
+        path = Path(persist_dir) / name
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+
+    if not parts:
+        return None
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
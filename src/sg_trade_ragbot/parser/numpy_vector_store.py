@@ -0,0 +1,381 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core import StorageContext
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from sg_trade_ragbot.parser.ann_index import ANN_MIN_ROWS, DEFAULT_N_PROBE, IVFIndex
+
+logger = logging.getLogger(__name__)
+
+
+# vector store backends accepted by build_and_persist_index / stream_ingest
+SIMPLE = "simple"
+NUMPY = "numpy"
+
+DEFAULT_NAMESPACE = "default"
+_PERSIST_SUFFIX = "__vector_store"
+_ANN_SUFFIX = ".ivf.npz"
+
+# overrides the persisted ann_probe of a loaded store, e.g. to trade recall for latency when serving
+ANN_PROBE_ENV = "RAGBOT_ANN_PROBE"
+# lists are retrained once the store has grown or shrunk by this factor since training
+ANN_RETRAIN_FACTOR = 2.0
+
+# rows scored per matrix product, bounds the float32 scratch space for float16 stores
+QUERY_BLOCK_ROWS = 65536
+
+
+def _persist_paths(persist_dir: Path, namespace: str = DEFAULT_NAMESPACE) -> tuple[Path, Path]:
+    base = Path(persist_dir) / f"{namespace}{_PERSIST_SUFFIX}"
+    return base.with_suffix(".npy"), base.with_suffix(".ids.json")
+
+
+def _ann_path(persist_dir: Path, namespace: str = DEFAULT_NAMESPACE) -> Path:
+    return Path(persist_dir) / f"{namespace}{_PERSIST_SUFFIX}{_ANN_SUFFIX}"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by one contiguous matrix of L2-normalised embeddings.
+
+    Persisted as <namespace>__vector_store.npy (float32 or float16) plus an
+    .ids.json sidecar holding node/ref_doc ids, and opened with mmap on load so
+    startup neither parses nor copies the embeddings. Cosine similarity for a
+    query is a single matrix-vector product and top-k uses argpartition.
+
+    With ann set, persist() also builds an IVF index (see parser/ann_index.py)
+    with ann_lists lists (default ~4 * sqrt(rows)) and sorts the matrix by list;
+    queries then scan only the ann_probe closest lists. Stores under
+    ANN_MIN_ROWS rows stay exact unless ann_lists is given. Queries restricted
+    to node or doc ids, and query(..., exact=True), always scan every row.
+
+    Node text lives in the docstore, as with SimpleVectorStore. Metadata filters
+    are not supported.
+    """
+
+    stores_text: bool = False
+    dtype: str = "float32"
+    ann: bool = False
+    ann_lists: Optional[int] = None
+    ann_probe: int = DEFAULT_N_PROBE
+
+    _matrix: np.ndarray = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _alive: np.ndarray = PrivateAttr()
+    _pending: List[np.ndarray] = PrivateAttr()
+    _ivf: Optional[IVFIndex] = PrivateAttr()
+
+    def __init__(
+        self,
+        dtype: str = "float32",
+        matrix: Optional[np.ndarray] = None,
+        node_ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[str]] = None,
+        ivf: Optional[IVFIndex] = None,
+        **kwargs: Any,
+    ) -> None:
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"dtype must be 'float32' or 'float16', got {dtype!r}")
+        super().__init__(dtype=dtype, **kwargs)
+
+        self._matrix = matrix if matrix is not None else np.empty((0, 0), dtype=dtype)
+        self._node_ids = list(node_ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [])
+        self._alive = np.ones(len(self._node_ids), dtype=bool)
+        self._pending = []
+        self._ivf = ivf
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @staticmethod
+    def exists(persist_dir: Path, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        matrix_path, ids_path = _persist_paths(persist_dir, namespace)
+        return matrix_path.exists() and ids_path.exists()
+
+    @classmethod
+    def from_persist_dir(
+        cls,
+        persist_dir: Path,
+        namespace: str = DEFAULT_NAMESPACE,
+        mmap: bool = True,
+        ann_probe: Optional[int] = None,
+    ) -> "NumpyVectorStore":
+        """
+        Load a persisted store, with its IVF index if it was persisted with one.
+        ann_probe (else RAGBOT_ANN_PROBE, else the persisted setting) sets the
+        lists scanned per query.
+        """
+        matrix_path, ids_path = _persist_paths(persist_dir, namespace)
+        ids = json.loads(ids_path.read_text(encoding="utf-8"))
+        matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+
+        ann = ids.get("ann") or {}
+        ivf = None
+        ann_path = _ann_path(persist_dir, namespace)
+        if ann and ann_path.exists():
+            ivf = IVFIndex.load(ann_path)
+            if ivf.n_rows != len(matrix) or ivf.centroids.shape[1:] != matrix.shape[1:]:
+                logger.warning("Ignoring %s, it does not match %s; queries scan every row", ann_path, matrix_path)
+                ivf = None
+
+        ann_probe = ann_probe or int(os.getenv(ANN_PROBE_ENV) or ann.get("probe") or DEFAULT_N_PROBE)
+        return cls(dtype=str(matrix.dtype), matrix=matrix, node_ids=ids["node_ids"],
+                   ref_doc_ids=ids["ref_doc_ids"], ivf=ivf, ann=bool(ann), ann_lists=ann.get("lists"),
+                   ann_probe=ann_probe)
+
+    def __len__(self) -> int:
+        self._consolidate()
+        return int(self._alive.sum())
+
+    def __bool__(self) -> bool:
+        # StorageContext.from_defaults tests `if vector_store:`, an empty store must not be swapped out
+        return True
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+
+        vectors = _normalize(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        self._pending.append(vectors.astype(self.dtype))
+        self._node_ids.extend(node.node_id for node in nodes)
+        self._ref_doc_ids.extend(node.ref_doc_id or "None" for node in nodes)
+        self._alive = np.concatenate([self._alive, np.ones(len(nodes), dtype=bool)])
+
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        # rows are only masked here; persist() compacts them away
+        for i, doc_id in enumerate(self._ref_doc_ids):
+            if doc_id == ref_doc_id:
+                self._alive[i] = False
+
+    def _consolidate(self) -> None:
+        """Append pending rows to the matrix (copying it out of the mmap if needed)."""
+        if not self._pending:
+            return
+
+        parts = ([self._matrix] if self._matrix.size else []) + self._pending
+        self._matrix = np.ascontiguousarray(np.vstack(parts), dtype=self.dtype)
+        self._pending = []
+
+    def _compact(self) -> None:
+        self._consolidate()
+        if self._alive.all():
+            return
+
+        keep = np.flatnonzero(self._alive)
+        self._matrix = np.ascontiguousarray(self._matrix[keep])
+        self._node_ids = [self._node_ids[i] for i in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+
+    def build_ann(self, n_lists: Optional[int] = None, retrain: bool = False) -> Optional[IVFIndex]:
+        """
+        (Re)build the IVF index over the live rows and sort the matrix by list.
+        The current lists are kept unless retrain is set, n_lists differs from
+        them, or the store has grown or shrunk by ANN_RETRAIN_FACTOR since they
+        were trained. Returns None, and leaves queries exact, when the store is
+        below ANN_MIN_ROWS and no n_lists (or ann_lists) is given.
+        """
+        self._compact()
+        n_rows = len(self._node_ids)
+        n_lists = n_lists or self.ann_lists
+        if not n_rows or (n_lists is None and n_rows < ANN_MIN_ROWS):
+            self._ivf = None
+            return None
+
+        previous = self._ivf
+        if previous is not None and (
+            retrain
+            or (n_lists is not None and n_lists != previous.n_lists)
+            or not previous.trained_rows / ANN_RETRAIN_FACTOR <= n_rows <= previous.trained_rows * ANN_RETRAIN_FACTOR
+        ):
+            previous = None
+
+        ivf, order = IVFIndex.build(self._matrix, n_lists=n_lists, previous=previous)
+        self._matrix = np.ascontiguousarray(self._matrix[order])
+        self._node_ids = [self._node_ids[i] for i in order]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in order]
+        self._ivf = ivf
+        return ivf
+
+    def similarities(self, query_embedding: Sequence[float]) -> np.ndarray:
+        """Cosine similarity of the query against every row; deleted rows score -inf."""
+        self._consolidate()
+        if not self._matrix.size:
+            return np.empty(0, dtype=np.float32)
+
+        query = _normalize(np.asarray([query_embedding], dtype=np.float32))[0]
+        if self._matrix.dtype == np.float32 and len(self._matrix) <= QUERY_BLOCK_ROWS:
+            scores = self._matrix @ query
+        else:
+            scores = np.empty(len(self._matrix), dtype=np.float32)
+            for start in range(0, len(self._matrix), QUERY_BLOCK_ROWS):
+                block = np.asarray(self._matrix[start:start + QUERY_BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+
+        scores[~self._alive] = -np.inf
+        return scores
+
+    def batch_similarities(self, query_embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Cosine similarities of several queries at once as a (queries, rows) matrix,
+        one matrix product per block of rows; deleted rows score -inf.
+        """
+        self._consolidate()
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        if not self._matrix.size:
+            return np.empty((len(queries), 0), dtype=np.float32)
+
+        scores = np.empty((len(queries), len(self._matrix)), dtype=np.float32)
+        for start in range(0, len(self._matrix), QUERY_BLOCK_ROWS):
+            block = np.asarray(self._matrix[start:start + QUERY_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+
+        scores[:, ~self._alive] = -np.inf
+        return scores
+
+    def ann_query(self, query_embedding: Sequence[float], similarity_top_k: int,
+                  n_probe: Optional[int] = None) -> VectorStoreQueryResult:
+        """Top similarity_top_k rows from the n_probe (default ann_probe) IVF lists closest to the query."""
+        self._consolidate()
+        query = _normalize(np.asarray([query_embedding], dtype=np.float32))[0]
+        rows = self._ivf.candidate_rows(query, similarity_top_k, n_probe or self.ann_probe, len(self._matrix))
+
+        scores = np.asarray(self._matrix[rows], dtype=np.float32) @ query
+        scores[~self._alive[rows]] = -np.inf
+        return self._top_k(scores, similarity_top_k, rows)
+
+    def batch_query(self, query_embeddings: Sequence[Sequence[float]], similarity_top_k: int) -> List[VectorStoreQueryResult]:
+        """Top similarity_top_k rows for each query embedding, in input order."""
+        if self._ivf is not None:
+            return [self.ann_query(embedding, similarity_top_k) for embedding in query_embeddings]
+        scores = self.batch_similarities(query_embeddings)
+        return [self._top_k(row, similarity_top_k) for row in scores]
+
+    def _top_k(self, scores: np.ndarray, similarity_top_k: int,
+               rows: Optional[np.ndarray] = None) -> VectorStoreQueryResult:
+        """Best similarity_top_k of scores, which belong to rows (default: every row)."""
+        k = min(similarity_top_k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = top if rows is None else rows[top]
+
+        return VectorStoreQueryResult(
+            similarities=[float(scores[i]) for i in top],
+            ids=[self._node_ids[i] for i in ids],
+        )
+
+    def query(self, query: VectorStoreQuery, exact: bool = False, **kwargs: Any) -> VectorStoreQueryResult:
+        """Top similarity_top_k nodes, from the IVF index when there is one unless exact is set."""
+        if query.filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        if query.query_embedding is None:
+            raise ValueError("NumpyVectorStore requires a query embedding")
+
+        restrict = set(query.node_ids or []) | set(query.doc_ids or [])
+        if self._ivf is not None and not restrict and not exact:
+            return self.ann_query(query.query_embedding, query.similarity_top_k)
+
+        scores = self.similarities(query.query_embedding)
+        if restrict:
+            allowed = np.fromiter(
+                ((node_id in restrict or doc_id in restrict)
+                 for node_id, doc_id in zip(self._node_ids, self._ref_doc_ids)),
+                dtype=bool,
+                count=len(self._node_ids),
+            )
+            scores[~allowed] = -np.inf
+
+        return self._top_k(scores, query.similarity_top_k)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Write <namespace>__vector_store.npy/.ids.json next to persist_path, the
+        JSON path StorageContext.persist asks for. Any SimpleVectorStore JSON left
+        at persist_path by an earlier build is removed so loaders cannot pick up
+        stale vectors. With ann set the IVF index is rebuilt first and written
+        to <namespace>__vector_store.ivf.npz.
+        """
+        if self.ann:
+            self.build_ann()
+        else:
+            self._ivf = None
+        self._compact()
+
+        persist_path = Path(persist_path)
+        namespace = persist_path.name.split(_PERSIST_SUFFIX)[0] or DEFAULT_NAMESPACE
+        matrix_path, ids_path = _persist_paths(persist_path.parent, namespace)
+        matrix_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write-then-rename so a process with the old file mmapped keeps its view
+        tmp_matrix = matrix_path.with_suffix(".tmp.npy")
+        np.save(tmp_matrix, np.ascontiguousarray(self._matrix, dtype=self.dtype))
+        os.replace(tmp_matrix, matrix_path)
+
+        tmp_ids = ids_path.with_suffix(".tmp")
+        ann = {"lists": self.ann_lists, "probe": self.ann_probe} if self.ann else None
+        tmp_ids.write_text(json.dumps({"node_ids": self._node_ids, "ref_doc_ids": self._ref_doc_ids, "ann": ann}),
+                           encoding="utf-8")
+        os.replace(tmp_ids, ids_path)
+
+        ann_path = _ann_path(persist_path.parent, namespace)
+        if self._ivf is not None:
+            self._ivf.save(ann_path)
+        else:
+            ann_path.unlink(missing_ok=True)
+
+        persist_path.unlink(missing_ok=True)
+        logger.info("Persisted %d vectors (%s%s) to %s", len(self._node_ids), self.dtype,
+                    f", {self._ivf.n_lists} IVF lists" if self._ivf is not None else "", matrix_path)
+
+
+def new_storage_context(backend: str = NUMPY, dtype: str = "float32", ann: bool = False,
+                        ann_lists: Optional[int] = None, ann_probe: int = DEFAULT_N_PROBE) -> StorageContext:
+    """
+    Fresh storage context for an index build using the given vector store
+    backend. ann and its parameters are NumpyVectorStore's.
+    """
+    if backend == NUMPY:
+        return StorageContext.from_defaults(vector_store=NumpyVectorStore(dtype=dtype, ann=ann, ann_lists=ann_lists,
+                                                                          ann_probe=ann_probe))
+    if ann:
+        raise ValueError(f"An ANN index needs the {NUMPY!r} vector store backend, got {backend!r}")
+    if backend == SIMPLE:
+        return StorageContext.from_defaults()
+    raise ValueError(f"Unknown vector store backend {backend!r}, expected {NUMPY!r} or {SIMPLE!r}")
+
+
+def storage_context_from_persist_dir(persist_dir: Path) -> StorageContext:
+    """Load a persisted storage context, picking the numpy store when one was persisted."""
+    if NumpyVectorStore.exists(persist_dir):
+        return StorageContext.from_defaults(persist_dir=str(persist_dir),
+                                            vector_store=NumpyVectorStore.from_persist_dir(persist_dir))
+    return StorageContext.from_defaults(persist_dir=str(persist_dir))
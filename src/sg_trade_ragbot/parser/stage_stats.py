@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+import logging
+import os
+import time
+from typing import Dict, Iterator
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+
+def current_rss_bytes() -> int:
+    """
+    Resident set size of this process. Reads /proc on linux and falls back to
+    the lifetime peak from getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+        self.peak_rss = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+class PipelineMeter:
+    """
+    Per-stage item counts, wall time and peak RSS for a generator pipeline.
+    Only the time spent inside measure() is attributed to a stage, so upstream
+    generators pulled lazily from within a stage are not double counted.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+
+    @contextmanager
+    def measure(self, stage: str, items: int = 1) -> Iterator[StageStats]:
+        stats = self.stages.setdefault(stage, StageStats(stage))
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.items += items
+            stats.peak_rss = max(stats.peak_rss, current_rss_bytes())
+
+    def log(self, logger: logging.Logger) -> None:
+        for stats in self.stages.values():
+            logger.info(
+                "Stage %-8s items=%d seconds=%.2f items/s=%.1f peak_rss=%.1fMB",
+                stats.name,
+                stats.items,
+                stats.seconds,
+                stats.throughput,
+                stats.peak_rss / (1024 * 1024),
+            )
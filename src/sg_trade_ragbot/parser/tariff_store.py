@@ -0,0 +1,130 @@
+import logging
+from pathlib import Path
+import re
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple
+
+from sg_trade_ragbot.parser.hs_codes import HS_CODE_INDEX_FILENAME, HSCodeIndex, format_code, normalize_description
+from sg_trade_ragbot.utils.pydantic_models.models import TariffLine
+
+# pandas takes a while to import and only the tariff query tool needs it, so it is imported on use
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+TARIFF_STORE_FILENAME = "tariff_lines.parquet"
+
+# code length -> level of the line in the HS hierarchy
+LEVELS = {4: "heading", 6: "subheading", 8: "tariff_line"}
+
+DUTY_KINDS = ("customs", "excise")
+
+_FREE_RE = re.compile(r"^(free|nil|exempt|0+(\.0+)?\s*%?)$", re.IGNORECASE)
+_RATE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_SPECIFIC_RE = re.compile(r"\$\s*(\d+(?:,\d{3})*(?:\.\d+)?)")
+
+
+def parse_duty(text: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    (ad valorem rate in percent, specific amount in dollars per unit) of a duty
+    as written in the tariff table: 'Free' -> (0, 0), '5%' -> (5, None),
+    '$0.30/kg' -> (None, 0.3). (None, None) when the column is empty or unreadable.
+    """
+    if not text or not text.strip():
+        return None, None
+    text = text.strip()
+    if _FREE_RE.match(text):
+        return 0.0, 0.0
+
+    rate = _RATE_RE.search(text)
+    specific = _SPECIFIC_RE.search(text)
+    return (float(rate.group(1)) if rate else None,
+            float(specific.group(1).replace(",", "")) if specific else None)
+
+
+def tariff_frame(lines: Iterable[TariffLine]) -> "pd.DataFrame":
+    """
+    One row per tariff line, in code order, with the columns the query tool
+    filters on: code prefixes (chapter, heading, subheading), level, the
+    normalised description and each duty split into rate, specific amount and
+    a dutiable flag (a non-zero rate or amount).
+    """
+    import pandas as pd
+
+    rows = []
+    for line in sorted(lines, key=lambda line: line.hs_code):
+        row = line.model_dump()
+        row.update(
+            code=format_code(line.hs_code),
+            chapter=line.hs_code[:2],
+            heading=line.hs_code[:4],
+            subheading=line.hs_code[:6] if len(line.hs_code) >= 6 else None,
+            level=LEVELS.get(len(line.hs_code), "other"),
+            search_text=normalize_description(line.description),
+        )
+        for kind in DUTY_KINDS:
+            rate, specific = parse_duty(getattr(line, f"{kind}_duty"))
+            row[f"{kind}_rate"] = rate
+            row[f"{kind}_specific"] = specific
+        rows.append(row)
+
+    frame = pd.DataFrame(rows, columns=list(TariffLine.model_fields) + [
+        "code", "chapter", "heading", "subheading", "level", "search_text",
+        *(f"{kind}_{part}" for kind in DUTY_KINDS for part in ("rate", "specific"))])
+    for kind in DUTY_KINDS:
+        frame[f"{kind}_rate"] = frame[f"{kind}_rate"].astype("float64")
+        frame[f"{kind}_specific"] = frame[f"{kind}_specific"].astype("float64")
+        frame[f"{kind}_dutiable"] = (frame[f"{kind}_rate"].fillna(0) > 0) | (frame[f"{kind}_specific"].fillna(0) > 0)
+    frame["level"] = frame["level"].astype("category")
+    return frame
+
+
+def build_tariff_store(index_dir: Path) -> Optional[Path]:
+    """
+    Write the tariff lines of index_dir/hs_codes.json (see build_hs_code_index)
+    as a Parquet table, index_dir/tariff_lines.parquet. Returns the written path,
+    or None when there are no lines or the Parquet engine (pyarrow, a project
+    dependency) is missing from the environment, which is logged as a warning;
+    load_tariff_frame then falls back to hs_codes.json.
+    """
+    index_dir = Path(index_dir)
+    hs_path = index_dir / HS_CODE_INDEX_FILENAME
+    if not hs_path.exists():
+        return None
+
+    frame = tariff_frame(HSCodeIndex.load(hs_path).lines())
+    out_path = index_dir / TARIFF_STORE_FILENAME
+    try:
+        frame.to_parquet(out_path, index=False)
+    except ImportError as e:
+        logger.warning("Not writing %s, the Parquet engine is missing (%s); install pyarrow, "
+                       "tariff queries fall back to %s until then", out_path, e, HS_CODE_INDEX_FILENAME)
+        return None
+
+    logger.info("Wrote %d tariff lines to %s", len(frame), out_path)
+    return out_path
+
+
+def load_tariff_frame(index_dir: Path) -> Optional["pd.DataFrame"]:
+    """
+    The tariff table persisted in index_dir: the Parquet store if present and
+    readable, else rebuilt from hs_codes.json. None if ingestion produced neither.
+    """
+    import pandas as pd
+
+    index_dir = Path(index_dir)
+    store_path = index_dir / TARIFF_STORE_FILENAME
+    if store_path.exists():
+        try:
+            frame = pd.read_parquet(store_path)
+            frame["level"] = frame["level"].astype("category")
+            return frame
+        except ImportError as e:
+            logger.warning("Cannot read %s, the Parquet engine is missing (%s); install pyarrow, "
+                           "rebuilding the table from %s", store_path, e, HS_CODE_INDEX_FILENAME)
+
+    hs_path = index_dir / HS_CODE_INDEX_FILENAME
+    if not hs_path.exists():
+        return None
+    return tariff_frame(HSCodeIndex.load(hs_path).lines())
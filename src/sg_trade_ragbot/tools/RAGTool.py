@@ -1,15 +1,35 @@
 from pathlib import Path
+from typing import AsyncIterator, List, Optional, Sequence, Union
 from dotenv import load_dotenv
-from langchain_core.tools import tool
-from llama_index.core import StorageContext, load_index_from_storage, get_response_synthesizer
+from llama_index.core import Settings, load_index_from_storage, get_response_synthesizer
 from llama_index.core.query_engine import RetrieverQueryEngine
 
 from llama_index.core.retrievers import VectorIndexRetriever
-
-from config import PROCESSED_DATA_DIR
-from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput, RetrievalItem, RAGToolError, RetrievalValidationError
-
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from config import CACHE_DATA_DIR, PROCESSED_DATA_DIR
+from sg_trade_ragbot.parser.bm25 import BM25_INDEX_FILENAME, BM25Index
+from sg_trade_ragbot.parser.hs_codes import HS_CODE_INDEX_FILENAME, HSCodeIndex, format_code
+from sg_trade_ragbot.parser.manifest import index_version
+from sg_trade_ragbot.parser.numpy_vector_store import NumpyVectorStore, storage_context_from_persist_dir
+from sg_trade_ragbot.tools.answer_cache import ANSWER_CACHE_FILENAME, AnswerCache
+from sg_trade_ragbot.tools.context_packer import pack_nodes
+from sg_trade_ragbot.tools.retrievers import HYBRID, VECTOR, HybridRetriever, SmallToBigRetriever
+from sg_trade_ragbot.utils.metrics.metrics import REGISTRY, count_tokens, observe_stage, record_tokens, span
+from sg_trade_ragbot.utils.models.models import CONTEXT_WINDOWS, get_context_budget
+from sg_trade_ragbot.utils.pydantic_models.models import (
+    RAGToolOutput,
+    RetrievalItem,
+    RAGToolError,
+    RetrievalValidationError,
+    TariffLine,
+)
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import re
 import threading
+import time
 
 import logging
 
@@ -24,28 +44,255 @@ load_dotenv()
 
 
 _INDEX = None
+_INDEX_VERSION = None
+_BM25 = None
+_HS_INDEX = None
+# (size, mtime) of the hs_codes.json _HS_INDEX was loaded from, see _load_hs_index
+_HS_INDEX_VERSION = None
+# guards loading of the module-level indexes, _RETRIEVERS and _QUERY_ENGINES
+_LOAD_LOCK = threading.RLock()
+# (top_k, retrieval_mode) -> retriever, see _get_retriever
+_RETRIEVERS = {}
+# (top_k, retrieval_mode, response_mode, id(llm), streaming) -> RetrieverQueryEngine, see _get_query_engine
+_QUERY_ENGINES = {}
+_ANSWER_CACHE = AnswerCache()
+
+# questions that are nothing but a code, optionally prefixed, e.g. "0104.10.10" or "HS code 01.04?"
+_CODE_QUERY_RE = re.compile(
+    r"^\s*(?P<prefix>(?:hs|chapter|heading|subheading)\s*(?:code)?\s*[:#]?\s*)?"
+    r"(?P<code>\d{2}\.\d{2}|\d{4}(?:\.\d{2}){0,2}|\d{8}|\d{6}|\d{2})\s*[?.]?\s*$",
+    re.IGNORECASE,
+)
+# bare numbers that are as likely a year or a quantity as a chapter/heading, only codes with a prefix
+_AMBIGUOUS_CODE_RE = re.compile(r"\d{2}|\d{4}")
+
+# cap on lines returned for a chapter/heading prefix lookup
+MAX_HS_LOOKUP_RESULTS = 25
+
+# each side of hybrid retrieval contributes this many candidates per requested node
+HYBRID_CANDIDATES_PER_RESULT = 4
+
+DEFAULT_RESPONSE_MODE = "tree_summarize"
+
+# candidates retrieved per chunk that may reach the synthesizer, see _pack_context
+CONTEXT_CANDIDATES_PER_RESULT = 2
+# (model name, configured context window) -> context token budget, see _context_budget
+_CONTEXT_BUDGETS = {}
+_CONTEXT_BUDGETS_LOCK = threading.Lock()
+
+# concurrent synthesis calls made by rag_tool_batch
+DEFAULT_BATCH_WORKERS = 4
 
 
 def _load_index():
     """
     Load the persisted index from disk. Ensure the processed directory exists.
+    A persisted NumpyVectorStore is preferred over the default JSON vector store
+    (see storage_context_from_persist_dir);
+    if it was persisted with an IVF index, vector retrieval (and so the
+    retrievers of _rag_tool_helper) searches that instead of every row.
+    The BM25 index persisted alongside the storage context, if any, is loaded
+    with it (see _load_bm25).
+
+    The loaded index is reused until the persisted files change (see
+    index_version), at which point it is reloaded and the cached query engines
+    and HS code index are dropped. Loading happens under a lock so concurrent
+    first calls load once.
     """
-    global _INDEX
+    global _INDEX, _INDEX_VERSION, _BM25, _HS_INDEX
+
+    version = index_version(PROCESSED_DATA_DIR)
+    if _INDEX is not None and version == _INDEX_VERSION:
+        return _INDEX
+
+    with _LOAD_LOCK:
+        if _INDEX is not None and version == _INDEX_VERSION:
+            return _INDEX
+        if _INDEX is not None:
+            logger.info("Persisted index changed (%s -> %s); reloading", _INDEX_VERSION, version)
 
-    if _INDEX is None:
         Path(PROCESSED_DATA_DIR).mkdir(parents=True, exist_ok=True)
-        storage_context = StorageContext.from_defaults(persist_dir=str(PROCESSED_DATA_DIR))
-        index = load_index_from_storage(storage_context)
+        index = load_index_from_storage(storage_context_from_persist_dir(Path(PROCESSED_DATA_DIR)))
+
+        bm25_path = Path(PROCESSED_DATA_DIR) / BM25_INDEX_FILENAME
+        _BM25 = BM25Index.load(bm25_path) if bm25_path.exists() else None
 
+        _RETRIEVERS.clear()
+        _QUERY_ENGINES.clear()
+        _HS_INDEX = None
+        _INDEX_VERSION = version
         _INDEX = index
 
     return _INDEX
 
 
-def _increment_tool_call_count() -> None:
+def _load_bm25():
+    """Return the BM25 index loaded with the vector index, or None if not persisted."""
+    _load_index()
+    return _BM25
+
+
+def _build_retriever(index, top_k: int, retrieval_mode: str):
+    """
+    Leaf retriever for retrieval_mode, wrapped in a SmallToBigRetriever so
+    matches from an HS-hierarchy index expand to their parent when needed.
+    """
+    retriever = None
+    if retrieval_mode == HYBRID:
+        bm25 = _load_bm25()
+        if bm25 is not None:
+            candidate_k = top_k * HYBRID_CANDIDATES_PER_RESULT
+            vector_retriever = VectorIndexRetriever(index=index, similarity_top_k=candidate_k)
+            retriever = HybridRetriever(vector_retriever, bm25, index.docstore,
+                                        similarity_top_k=top_k, candidate_k=candidate_k)
+        else:
+            logger.warning("No %s found in %s; falling back to vector retrieval",
+                           BM25_INDEX_FILENAME, PROCESSED_DATA_DIR)
+    elif retrieval_mode != VECTOR:
+        raise ValueError(f"Unknown retrieval_mode {retrieval_mode!r}, expected {VECTOR!r} or {HYBRID!r}")
+
+    if retriever is None:
+        retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k)
+
+    return SmallToBigRetriever(retriever, index.docstore)
+
+
+def _load_hs_index():
+    """
+    Load the HS code lookup index persisted next to the vector index, or None if
+    ingestion has not produced one. Like _load_index, it is reloaded when the
+    persisted file changes: the fast path runs before (and often instead of)
+    _load_index, so it cannot rely on that to drop a stale index.
+    """
+    global _HS_INDEX, _HS_INDEX_VERSION
+
+    path = Path(PROCESSED_DATA_DIR) / HS_CODE_INDEX_FILENAME
+    try:
+        stat = path.stat()
+        version = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        version = None
+
+    if _HS_INDEX is None or version != _HS_INDEX_VERSION:
+        with _LOAD_LOCK:
+            if _HS_INDEX is None or version != _HS_INDEX_VERSION:
+                _HS_INDEX = HSCodeIndex.load(path) if version is not None else None
+                _HS_INDEX_VERSION = version
+
+    return _HS_INDEX
+
+
+def _get_retriever(top_k: int, retrieval_mode: str = HYBRID):
+    """Shared retriever for this configuration, built on first use like _get_query_engine."""
+    index = _load_index()
+    key = (top_k, retrieval_mode)
+
+    retriever = _RETRIEVERS.get(key)
+    if retriever is None:
+        with _LOAD_LOCK:
+            retriever = _RETRIEVERS.get(key)
+            if retriever is None:
+                retriever = _build_retriever(index, top_k, retrieval_mode)
+                _RETRIEVERS[key] = retriever
+
+    return retriever
+
+
+def _get_query_engine(top_k: int, retrieval_mode: str = HYBRID,
+                      response_mode: str = DEFAULT_RESPONSE_MODE, llm=None,
+                      streaming: bool = False) -> RetrieverQueryEngine:
+    """
+    Return the query engine for this configuration, building the retriever and
+    response synthesizer only on first use. Engines are shared between calls and
+    threads and are rebuilt after the index is reloaded. streaming engines
+    synthesize into a token stream, see astream_rag_tool.
+    """
+    retriever = _get_retriever(top_k, retrieval_mode)
+    llm = llm or Settings.llm
+    key = (top_k, retrieval_mode, response_mode, id(llm), streaming)
+
+    engine = _QUERY_ENGINES.get(key)
+    if engine is None:
+        with _LOAD_LOCK:
+            engine = _QUERY_ENGINES.get(key)
+            if engine is None:
+                response_synthesizer = get_response_synthesizer(llm=llm, response_mode=response_mode,
+                                                                streaming=streaming)
+                # the engine keeps llm alive, so id(llm) in the key cannot be reused
+                engine = RetrieverQueryEngine(retriever=retriever,
+                                              response_synthesizer=response_synthesizer)
+                _QUERY_ENGINES[key] = engine
+
+    return engine
+
+
+def warmup(top_ks=(3,), retrieval_modes=(HYBRID,), response_mode: str = DEFAULT_RESPONSE_MODE) -> float:
+    """
+    Load the index, BM25 and HS code indexes and build the query engines for the
+    given configurations ahead of the first question. Returns the seconds taken.
+    """
+    start = time.perf_counter()
+    _load_hs_index()
+    for top_k in top_ks:
+        for retrieval_mode in retrieval_modes:
+            _get_query_engine(top_k, retrieval_mode, response_mode)
+    elapsed = time.perf_counter() - start
+    logger.info("RAG tool warmed up in %.2fs (%d query engines)", elapsed, len(_QUERY_ENGINES))
+    return elapsed
+
+
+def _format_tariff_line(line: TariffLine) -> str:
+    details = [f"{label}: {value}" for label, value in (
+        ("unit", line.unit),
+        ("customs duty", line.customs_duty),
+        ("excise duty", line.excise_duty),
+    ) if value]
+    text = f"{format_code(line.hs_code)} {line.description}"
+    return f"{text} ({'; '.join(details)})" if details else text
+
+
+def _hs_code_fast_path(question: str) -> Optional[RAGToolOutput]:
+    """
+    Answer exact/prefix HS code lookups and verbatim heading descriptions straight
+    from the HS code index, without retrieval or an LLM call. A bare 2- or
+    4-digit number (a year, a quantity) only counts as a code with a prefix
+    such as "HS", "chapter" or "heading", or written dotted ("01.04"). Returns
+    None when the question is not such a lookup or nothing matches.
+    """
+    hs_index = _load_hs_index()
+    if hs_index is None:
+        return None
+
+    match = _CODE_QUERY_RE.match(question)
+    if match and not match.group("prefix") and _AMBIGUOUS_CODE_RE.fullmatch(match.group("code")):
+        match = None
+    if match:
+        lines = hs_index.prefix(match.group("code"), limit=MAX_HS_LOOKUP_RESULTS + 1)
+    else:
+        lines = hs_index.by_description(question)
+
+    if not lines:
+        return None
+
+    truncated = len(lines) > MAX_HS_LOOKUP_RESULTS
+    lines = lines[:MAX_HS_LOOKUP_RESULTS]
+
+    formatted = [_format_tariff_line(line) for line in lines]
+    answer = "\n".join(formatted)
+    if truncated:
+        answer += f"\n(showing the first {MAX_HS_LOOKUP_RESULTS} matches, narrow the code for more)"
+
+    retrievals = [RetrievalItem(id=f"hs:{format_code(line.hs_code)}", text=text)
+                  for line, text in zip(lines, formatted)]
+
+    return RAGToolOutput(answer=answer, retrievals=retrievals)
+
+
+def _increment_tool_call_count(calls: int = 1) -> None:
     global _tool_call_count
     with _tool_call_lock:
-        _tool_call_count += 1
+        _tool_call_count += calls
+    REGISTRY.counter("ragbot_tool_calls_total", "Calls of the RAG tool entrypoints").inc(calls)
 
 
 def get_tool_call_count() -> int:
@@ -61,92 +308,397 @@ def reset_tool_call_count() -> None:
         _tool_call_count = 0
 
 
-# Chunking is an issue. I suspect that chunks are too large for the smaller models
-def _rag_tool_helper(question: str, top_k: int = 3) -> RAGToolOutput:
+def get_answer_cache_stats() -> dict:
     """
-    Query the persisted LlamaIndex and return a JSON-encoded response string.
+    Counters of the answer cache in front of _rag_tool_helper: exact_hits,
+    semantic_hits, misses, hit_rate, saved_seconds (latency of the original
+    calls that hits avoided) and entries.
+    """
+    return _ANSWER_CACHE.stats()
 
-    Successful return value:
-      - The RAGToolOutput pydantic model.
 
-    Failure behavior:
-      - On error the function raises a RAGToolError or RetrievalValidationError
+def reset_answer_cache_stats() -> None:
+    """Reset the answer cache counters to zero (useful between test runs)."""
+    _ANSWER_CACHE.reset_stats()
+
+
+def configure_answer_cache(**kwargs) -> AnswerCache:
     """
-    _increment_tool_call_count()
+    Replace the process-wide answer cache, e.g. to change similarity_threshold,
+    max_entries or ttl_seconds. Returns the new cache.
+    """
+    global _ANSWER_CACHE
+    _ANSWER_CACHE = AnswerCache(**kwargs)
+    return _ANSWER_CACHE
 
-    try:
-        # for now limit 3 since chunks reach more tokens than accepted
-        # in llama? But honestly it shouldn't really be reaching this
-        if top_k > 3:
-            top_k = 3
 
-        index = _load_index()
-        retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k)
+def save_answer_cache(path: Optional[Path] = None) -> Path:
+    """Persist the answer cache (defaults to data/cache/answer_cache.json)."""
+    path = Path(path) if path else Path(CACHE_DATA_DIR) / ANSWER_CACHE_FILENAME
+    _ANSWER_CACHE.save(path)
+    return path
 
-        response_synthesizer = get_response_synthesizer(response_mode="tree_summarize")
 
-        query_engine = RetrieverQueryEngine(retriever=retriever,
-                                            response_synthesizer=response_synthesizer)
+def load_answer_cache(path: Optional[Path] = None) -> bool:
+    """Load a cache written by save_answer_cache. Returns False if there is none."""
+    path = Path(path) if path else Path(CACHE_DATA_DIR) / ANSWER_CACHE_FILENAME
+    if not path.exists():
+        return False
+    _ANSWER_CACHE.load(path)
+    return True
 
-        response = query_engine.query(question)
 
-        answer = str(response)
+def _source_nodes_to_retrievals(source_nodes, include_details: bool = False) -> list[RetrievalItem]:
+    """
+    Convert retrieved nodes into RetrievalItems. include_details also fills in
+    the retrieval score and node metadata (used by retrieval-only calls).
+    """
+    retrievals = []
+
+    for sn in source_nodes or []:
+        node = getattr(sn, "node", sn)
 
-        retrievals = []
+        # Prefer get_content(), then get_text(), then node.text attribute, then str(node)
+        text = None
+        if hasattr(node, "get_content"):
+            try:
+                text = node.get_content()
+            except Exception:
+                text = None
+
+        if not text and hasattr(node, "get_text"):
+            try:
+                text = node.get_text()
+            except Exception:
+                text = None
+
+        if not text:
+            text = getattr(node, "text", None) or str(node)
+
+        node_id = (getattr(node, "id", None) or
+                   getattr(node, "id_", None) or
+                   getattr(node, "doc_id", None) or
+                   "")
+        try:
+            details = {}
+            if include_details:
+                details = {"score": getattr(sn, "score", None),
+                           "metadata": dict(getattr(node, "metadata", None) or {}) or None}
+            item = RetrievalItem(id=str(node_id), text=str(text), **details)
+            retrievals.append(item)
+        except Exception as e:
+            # Build helpful debug message (truncate long text/repr)
+            snippet = (str(text)[:200] + "...") if text and len(str(text)) > 200 else str(text)
+            node_repr = repr(node)
+            node_repr_snip = node_repr[:200] + "..." if len(node_repr) > 200 else node_repr
+            msg = (
+                f"Failed to validate retrieval item for node_id={node_id!r}. "
+                f"Validation error: {e}. Text snippet: {snippet!r}. Node repr: {node_repr_snip!r}"
+            )
+            logger.exception(msg)
+            raise RetrievalValidationError(msg) from e
+
+    return retrievals
+
+
+def _context_budget(context_budget: Optional[int] = None) -> int:
+    """
+    Token budget for the chunks handed to the synthesizer: context_budget if
+    given, else derived from the model behind Settings.llm (see
+    get_context_budget).
+    """
+    if context_budget is not None:
+        return context_budget
 
-        for sn in getattr(response, "source_nodes", []) or []:
-            node = getattr(sn, "node", sn)
+    llm = Settings.llm
+    name = getattr(llm, "model", None)
+    # LLMs that take a context window (e.g. Ollama, OpenAILike) can differ per instance
+    key = (name, getattr(llm, "context_window", None))
 
-            # Prefer get_content(), then get_text(), then node.text attribute, then str(node)
-            text = None
-            if hasattr(node, "get_content"):
-                try:
-                    text = node.get_content()
-                except Exception:
-                    text = None
+    budget = _CONTEXT_BUDGETS.get(key)
+    if budget is None:
+        with _CONTEXT_BUDGETS_LOCK:
+            budget = _CONTEXT_BUDGETS.get(key)
+            if budget is None:
+                window = None
+                if name not in CONTEXT_WINDOWS:
+                    try:
+                        window = llm.metadata.context_window
+                    except Exception:
+                        logger.warning("Could not read the context window of %r; using the default", name)
+                budget = get_context_budget(name, window)
+                _CONTEXT_BUDGETS[key] = budget
 
-            if not text and hasattr(node, "get_text"):
-                try:
-                    text = node.get_text()
-                except Exception:
-                    text = None
+    return budget
 
-            if not text:
-                text = getattr(node, "text", None) or str(node)
 
-            node_id = (getattr(node, "id", None) or
-                       getattr(node, "id_", None) or
-                       getattr(node, "doc_id", None) or
-                       "")
-            try:
-                item = RetrievalItem(id=str(node_id), text=str(text))
-                retrievals.append(item)
-            except Exception as e:
-                # Build helpful debug message (truncate long text/repr)
-                snippet = (str(text)[:200] + "...") if text and len(str(text)) > 200 else str(text)
-                node_repr = repr(node)
-                node_repr_snip = node_repr[:200] + "..." if len(node_repr) > 200 else node_repr
-                msg = (
-                    f"Failed to validate retrieval item for node_id={node_id!r}. "
-                    f"Validation error: {e}. Text snippet: {snippet!r}. Node repr: {node_repr_snip!r}"
-                )
-                logger.exception(msg)
-                raise RetrievalValidationError(msg) from e
-
-        # Build the pydantic output model and return JSON
-        output = RAGToolOutput(answer=answer, retrievals=retrievals)
+def _pack_context(nodes, top_k: int, context_budget: Optional[int], retrieval_only: bool = False):
+    # retrieval-only results are read by the agent's LLM, which only constrains them
+    # when the agent passes its own budget
+    if retrieval_only and context_budget is None:
+        return pack_nodes(nodes, None, max_nodes=top_k)
+    return pack_nodes(nodes, _context_budget(context_budget), max_nodes=top_k)
+
+
+def _cache_params(top_k: int, retrieval_mode: str, retrieval_only: bool = False,
+                  context_budget: Optional[int] = None) -> str:
+    params = f"top_k={top_k};mode={retrieval_mode}"
+    if context_budget is not None:
+        params += f";budget={context_budget}"
+    return params + ";retrieval_only" if retrieval_only else params
+
+
+def _response_to_output(response, answer: Optional[str] = None) -> RAGToolOutput:
+    # streamed responses pass the answer they already assembled
+    answer = str(response) if answer is None else answer
+    source_nodes = getattr(response, "source_nodes", None) or []
+    with span("convert", nodes=len(source_nodes)):
+        retrievals = _source_nodes_to_retrievals(source_nodes)
+    return RAGToolOutput(answer=answer, retrievals=retrievals)
+
+
+def _nodes_to_output(nodes) -> RAGToolOutput:
+    # retrieval-only: no synthesised answer, the caller's LLM reads the ranked retrievals
+    with span("convert", nodes=len(nodes)):
+        retrievals = _source_nodes_to_retrievals(nodes, include_details=True)
+    return RAGToolOutput(answer="", retrievals=retrievals)
+
+
+def _embed_query(question: str):
+    with span("embed", questions=1):
+        embedding = Settings.embed_model.get_query_embedding(question)
+    record_tokens("embed", "input", count_tokens(question))
+    return embedding
+
+
+def _record_synthesis_tokens(query_bundle: QueryBundle, nodes, answer: str) -> None:
+    # estimated with the global tokenizer, the synthesizer does not report usage
+    prompt = count_tokens(query_bundle.query_str) + sum(
+        count_tokens(n.node.get_content(metadata_mode=MetadataMode.LLM)) for n in nodes)
+    record_tokens("synthesize", "prompt", prompt)
+    record_tokens("synthesize", "completion", count_tokens(answer))
+
+
+def _synthesize(query_engine, query_bundle: QueryBundle, nodes):
+    with span("synthesize", nodes=len(nodes)):
+        response = query_engine.synthesize(query_bundle, nodes)
+    _record_synthesis_tokens(query_bundle, nodes, str(response))
+    return response
+
+
+async def _asynthesize(query_engine, query_bundle: QueryBundle, nodes):
+    with span("synthesize", nodes=len(nodes)):
+        response = await query_engine.asynthesize(query_bundle, nodes)
+    _record_synthesis_tokens(query_bundle, nodes, str(response))
+    return response
+
+
+def _traced_pack(nodes, top_k: int, context_budget: Optional[int], retrieval_only: bool = False):
+    with span("pack", candidates=len(nodes)) as current:
+        packed = _pack_context(nodes, top_k, context_budget, retrieval_only)
+        current.set(nodes=len(packed))
+    return packed
+
+
+class _PreparedQuery:
+    """
+    A question taken up to synthesis by _prepare_query: either an output
+    served by the HS code lookup or the answer cache (source says which), or
+    the packed nodes to answer from and the query engine to synthesise with
+    (None for retrieval-only calls).
+    """
+
+    __slots__ = ("query_bundle", "cache_params", "output", "source", "nodes", "query_engine", "start")
+
+    def __init__(self, query_bundle: QueryBundle, cache_params: str, output: Optional[RAGToolOutput] = None,
+                 source: Optional[str] = None, nodes: Optional[List[NodeWithScore]] = None,
+                 query_engine: Optional[RetrieverQueryEngine] = None, start: Optional[float] = None):
+        self.query_bundle = query_bundle
+        self.cache_params = cache_params
+        self.output = output
+        self.source = source
+        self.nodes = nodes
+        self.query_engine = query_engine
+        # when retrieval started, the latency an answer cache hit saves is measured from here
+        self.start = start
+
+
+def _prepare_query(
+    question: str,
+    top_k: int,
+    use_hs_lookup: bool,
+    retrieval_mode: str,
+    use_cache: bool,
+    retrieval_only: bool,
+    context_budget: Optional[int],
+    streaming: bool = False,
+) -> _PreparedQuery:
+    """
+    Everything before synthesis, shared by _rag_tool_helper, _arag_tool_helper
+    and astream_rag_tool: the HS code lookup, loading the index, the exact and
+    semantic answer cache lookups, embedding the question, resolving the
+    (streaming) query engine, retrieving top_k * CONTEXT_CANDIDATES_PER_RESULT
+    candidates and packing them.
+
+    Blocking throughout (index loads and version checks, embedding and
+    retrieval); the async paths run it in a worker thread.
+    """
+    query_bundle = QueryBundle(query_str=question)
+    cache_params = _cache_params(top_k, retrieval_mode, retrieval_only, context_budget)
+
+    if use_hs_lookup:
+        with span("hs_lookup"):
+            fast = _hs_code_fast_path(question)
+        if fast is not None:
+            return _PreparedQuery(query_bundle, cache_params, output=fast, source="hs_lookup")
+
+    _load_index()
+
+    if use_cache:
+        _ANSWER_CACHE.sync_index_version(_INDEX_VERSION)
+
+        cached = _ANSWER_CACHE.get_exact(cache_params, question)
+        if cached is not None:
+            return _PreparedQuery(query_bundle, cache_params, output=cached, source="cache")
+
+    # embedded up front (not inside the retriever) so the cost shows up as its own stage
+    query_bundle.embedding = _embed_query(question)
+    if use_cache:
+        cached = _ANSWER_CACHE.get_similar(cache_params, query_bundle.embedding)
+        if cached is not None:
+            return _PreparedQuery(query_bundle, cache_params, output=cached, source="cache")
+
+    start = time.perf_counter()
+
+    candidate_k = top_k * CONTEXT_CANDIDATES_PER_RESULT
+    # resolved here rather than by the caller: it checks the index version on disk
+    query_engine = None if retrieval_only else _get_query_engine(candidate_k, retrieval_mode, streaming=streaming)
+    with span("retrieve", retrieval_mode=retrieval_mode, top_k=candidate_k):
+        nodes = _get_retriever(candidate_k, retrieval_mode).retrieve(query_bundle)
+    nodes = _traced_pack(nodes, top_k, context_budget, retrieval_only)
+
+    return _PreparedQuery(query_bundle, cache_params, nodes=nodes, query_engine=query_engine, start=start)
+
+
+def _rag_tool_helper(
+    question: str,
+    top_k: int = 3,
+    use_hs_lookup: bool = True,
+    retrieval_mode: str = HYBRID,
+    use_cache: bool = True,
+    retrieval_only: bool = False,
+    context_budget: Optional[int] = None,
+) -> RAGToolOutput:
+    """
+    Query the persisted LlamaIndex and return a JSON-encoded response string.
+
+    retrieval_mode is "hybrid" (BM25 + vector, reciprocal rank fusion) or
+    "vector"; hybrid falls back to vector when no BM25 index was persisted.
+
+    Questions that are just an HS code (or a verbatim tariff description) are
+    answered from the HS code index first when use_hs_lookup is set.
+
+    With use_cache, answers are served from the answer cache on a normalised
+    text match or a query-embedding match; the computed embedding is reused for
+    retrieval on a miss.
+
+    top_k * CONTEXT_CANDIDATES_PER_RESULT candidates are retrieved and the best
+    of them, at most top_k, are packed into context_budget tokens (by default
+    derived from the synthesizer's model), trimming the last one at a sentence
+    boundary. These steps are _prepare_query.
+
+    With retrieval_only the response synthesizer is skipped: answer is empty and
+    retrievals carry the ranked nodes with their scores and metadata, leaving
+    the reading to the calling agent's LLM.
+
+    The call runs in a rag_tool span with embed, retrieve, pack, synthesize and
+    convert child spans, see utils/metrics/metrics.py.
+
+    Successful return value:
+      - The RAGToolOutput pydantic model.
+
+    Failure behavior:
+      - On error the function raises a RAGToolError or RetrievalValidationError
+    """
+    _increment_tool_call_count()
+
+    try:
+        with span("rag_tool", retrieval_mode=retrieval_mode, top_k=top_k, retrieval_only=retrieval_only) as request:
+            prepared = _prepare_query(question, top_k, use_hs_lookup, retrieval_mode, use_cache,
+                                      retrieval_only, context_budget)
+            if prepared.output is not None:
+                request.set(source=prepared.source)
+                return prepared.output
+
+            if retrieval_only:
+                output = _nodes_to_output(prepared.nodes)
+            else:
+                response = _synthesize(prepared.query_engine, prepared.query_bundle, prepared.nodes)
+                output = _response_to_output(response)
+
+            if use_cache:
+                _ANSWER_CACHE.put(prepared.cache_params, question, prepared.query_bundle.embedding, output,
+                                  latency=time.perf_counter() - prepared.start)
+
+            request.set(source="index")
+            return output
+
+    except Exception as e:
+        raise RAGToolError(str(e)) from e
 
-        return output
+
+async def _arag_tool_helper(
+    question: str,
+    top_k: int = 3,
+    use_hs_lookup: bool = True,
+    retrieval_mode: str = HYBRID,
+    use_cache: bool = True,
+    retrieval_only: bool = False,
+    context_budget: Optional[int] = None,
+) -> RAGToolOutput:
+    """
+    Async counterpart of _rag_tool_helper with the same arguments and caching.
+
+    _prepare_query (index loads, embedding, resolving the query engine and
+    retrieval) runs in a worker thread and the synthesis is awaited through
+    the async LLM client, so concurrent agent runs on one event loop overlap
+    instead of queueing behind each other.
+    """
+    _increment_tool_call_count()
+
+    try:
+        with span("rag_tool", retrieval_mode=retrieval_mode, top_k=top_k, retrieval_only=retrieval_only) as request:
+            prepared = await asyncio.to_thread(_prepare_query, question, top_k, use_hs_lookup, retrieval_mode,
+                                               use_cache, retrieval_only, context_budget)
+            if prepared.output is not None:
+                request.set(source=prepared.source)
+                return prepared.output
+
+            if retrieval_only:
+                output = _nodes_to_output(prepared.nodes)
+            else:
+                response = await _asynthesize(prepared.query_engine, prepared.query_bundle, prepared.nodes)
+                output = _response_to_output(response)
+
+            if use_cache:
+                _ANSWER_CACHE.put(prepared.cache_params, question, prepared.query_bundle.embedding, output,
+                                  latency=time.perf_counter() - prepared.start)
+
+            request.set(source="index")
+            return output
 
     except Exception as e:
         raise RAGToolError(str(e)) from e
 
 
-# @tool
-def rag_tool(question: str, top_k: int = 5) -> str:
+def rag_tool(question: str, top_k: int = 5, retrieval_mode: str = HYBRID, retrieval_only: bool = False,
+             context_budget: Optional[int] = None) -> str:
     """
     Query the persisted index for information and return a JSON-encoded response string.
 
+    retrieval_mode: "hybrid" (keyword + semantic, best for product terms and HS codes)
+    or "vector" (semantic only).
+
     Successful return value:
       - The RAGToolOutput pydantic model.
 
@@ -155,9 +707,257 @@ def rag_tool(question: str, top_k: int = 5) -> str:
     """
 
     try:
-        output = _rag_tool_helper(question, top_k=top_k)
-        print("RAG Tool output: %s", output.model_dump_json())
+        output = _rag_tool_helper(question, top_k=top_k, retrieval_mode=retrieval_mode,
+                                  retrieval_only=retrieval_only, context_budget=context_budget)
+        logger.debug("RAG Tool output: %s", output.model_dump_json(exclude_none=True))
 
-        return output.model_dump_json()
+        return output.model_dump_json(exclude_none=True)
     except RAGToolError as e:
         return f"RAG tool error: {e}"
+
+
+async def arag_tool(question: str, top_k: int = 5, retrieval_mode: str = HYBRID, retrieval_only: bool = False,
+                    context_budget: Optional[int] = None) -> str:
+    """
+    Async variant of rag_tool, used by the agents so tool calls do not block the
+    event loop. Returns the same JSON string or "RAG tool error: ..." message.
+    """
+
+    try:
+        output = await _arag_tool_helper(question, top_k=top_k, retrieval_mode=retrieval_mode,
+                                         retrieval_only=retrieval_only, context_budget=context_budget)
+        logger.debug("RAG Tool output: %s", output.model_dump_json(exclude_none=True))
+
+        return output.model_dump_json(exclude_none=True)
+    except RAGToolError as e:
+        return f"RAG tool error: {e}"
+
+
+async def astream_rag_tool(
+    question: str,
+    top_k: int = 5,
+    retrieval_mode: str = HYBRID,
+    use_hs_lookup: bool = True,
+    use_cache: bool = True,
+    context_budget: Optional[int] = None,
+) -> AsyncIterator[Union[str, RAGToolOutput]]:
+    """
+    Streaming variant of arag_tool: yields the synthesised answer as text
+    deltas while the LLM produces them, then the complete RAGToolOutput with the
+    answer and retrievals as the last item. Answers from the HS code lookup or
+    the answer cache arrive as a single delta.
+
+    Time from the call to the first delta is recorded as the first_token stage
+    (see utils/metrics/metrics.py). Raises RAGToolError like _arag_tool_helper.
+    """
+    _increment_tool_call_count()
+    start = time.perf_counter()
+
+    try:
+        prepared = await asyncio.to_thread(_prepare_query, question, top_k, use_hs_lookup, retrieval_mode,
+                                           use_cache, False, context_budget, streaming=True)
+        output, query_bundle, nodes = prepared.output, prepared.query_bundle, prepared.nodes
+
+        if output is None:
+            synthesis_start = time.perf_counter()
+            response = await prepared.query_engine.asynthesize(query_bundle, nodes)
+    except Exception as e:
+        observe_stage("rag_tool", time.perf_counter() - start, error=type(e).__name__)
+        raise RAGToolError(str(e)) from e
+
+    if output is not None:
+        observe_stage("first_token", time.perf_counter() - start)
+        if output.answer:
+            yield output.answer
+        observe_stage("rag_tool", time.perf_counter() - start)
+        yield output
+        return
+
+    # spans cannot stay open across yields, the streamed stages are timed by hand
+    parts: List[str] = []
+    try:
+        if hasattr(response, "async_response_gen"):
+            async for delta in response.async_response_gen():
+                if not parts:
+                    observe_stage("first_token", time.perf_counter() - start)
+                parts.append(delta)
+                yield delta
+        else:
+            # e.g. the synthesizer's empty response when nothing was retrieved
+            observe_stage("first_token", time.perf_counter() - start)
+            parts.append(str(response))
+            yield parts[0]
+        answer = "".join(parts)
+        observe_stage("synthesize", time.perf_counter() - synthesis_start)
+        _record_synthesis_tokens(query_bundle, nodes, answer)
+
+        output = _response_to_output(response, answer=answer)
+    except Exception as e:
+        observe_stage("rag_tool", time.perf_counter() - start, error=type(e).__name__)
+        raise RAGToolError(str(e)) from e
+
+    if use_cache:
+        _ANSWER_CACHE.put(prepared.cache_params, question, query_bundle.embedding, output,
+                          latency=time.perf_counter() - prepared.start)
+
+    observe_stage("rag_tool", time.perf_counter() - start)
+    yield output
+
+
+def _retrieve_batch(index, retriever, query_bundles: List[QueryBundle], top_k: int) -> List[List[NodeWithScore]]:
+    """
+    Retrieve for several embedded queries at once. With a NumpyVectorStore all
+    queries are scored in one matrix product (or each against its IVF lists)
+    and each distinct node is fetched from the docstore once; other stores fall back to one vector query each.
+    Hybrid retrievers fuse the vector results with BM25 per question, and leaves
+    are expanded to parents as SmallToBigRetriever would.
+    """
+    merger = retriever if isinstance(retriever, SmallToBigRetriever) else None
+    if merger is not None:
+        retriever = merger.base_retriever
+    hybrid = isinstance(retriever, HybridRetriever)
+    candidate_k = top_k * HYBRID_CANDIDATES_PER_RESULT if hybrid else top_k
+
+    vector_store = index.vector_store
+    if isinstance(vector_store, NumpyVectorStore):
+        results = vector_store.batch_query([qb.embedding for qb in query_bundles], candidate_k)
+        node_ids = list(dict.fromkeys(node_id for result in results for node_id in result.ids))
+        nodes = {node.node_id: node for node in index.docstore.get_nodes(node_ids)}
+        vector_results = [
+            [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in zip(result.ids, result.similarities)]
+            for result in results
+        ]
+    else:
+        vector_retriever = VectorIndexRetriever(index=index, similarity_top_k=candidate_k)
+        vector_results = [vector_retriever.retrieve(qb) for qb in query_bundles]
+
+    if hybrid:
+        vector_results = [retriever.fuse(qb, results) for qb, results in zip(query_bundles, vector_results)]
+    if merger is not None:
+        vector_results = [merger.merge(results) for results in vector_results]
+    return vector_results
+
+
+def rag_tool_batch(
+    questions: Sequence[str],
+    top_k: int = 3,
+    retrieval_mode: str = HYBRID,
+    max_workers: int = DEFAULT_BATCH_WORKERS,
+    use_hs_lookup: bool = True,
+    use_cache: bool = True,
+    retrieval_only: bool = False,
+    context_budget: Optional[int] = None,
+) -> List[Union[RAGToolOutput, RAGToolError]]:
+    """
+    Answer several questions (e.g. the line items of one invoice) together.
+
+    Each question counts as one tool call. HS code lookups and cached answers
+    are served first. The remaining questions are embedded as queries
+    concurrently on at most max_workers threads, retrieved together (see
+    _retrieve_batch) and synthesised concurrently on at most max_workers
+    threads, or returned as ranked retrievals with retrieval_only. Each
+    question's candidates are packed into context_budget as in _rag_tool_helper.
+
+    Returns one entry per question, in input order: the RAGToolOutput, or the
+    RAGToolError raised for that question, so one bad item does not fail the
+    batch.
+    """
+    _increment_tool_call_count(len(questions))
+
+    outputs: List[Union[RAGToolOutput, RAGToolError, None]] = [None] * len(questions)
+    cache_params = _cache_params(top_k, retrieval_mode, retrieval_only, context_budget)
+    candidate_k = top_k * CONTEXT_CANDIDATES_PER_RESULT
+
+    pending = []
+    for i, question in enumerate(questions):
+        try:
+            fast = _hs_code_fast_path(question) if use_hs_lookup else None
+        except Exception as e:
+            outputs[i] = RAGToolError(str(e))
+            continue
+        if fast is not None:
+            outputs[i] = fast
+        else:
+            pending.append(i)
+
+    if not pending:
+        return outputs
+
+    try:
+        index = _load_index()
+        retriever = _get_retriever(candidate_k, retrieval_mode)
+        query_engine = None if retrieval_only else _get_query_engine(candidate_k, retrieval_mode)
+    except Exception as e:
+        for i in pending:
+            outputs[i] = RAGToolError(str(e))
+        return outputs
+
+    if use_cache:
+        _ANSWER_CACHE.sync_index_version(_INDEX_VERSION)
+        for i in list(pending):
+            cached = _ANSWER_CACHE.get_exact(cache_params, questions[i])
+            if cached is not None:
+                outputs[i] = cached
+                pending.remove(i)
+        if not pending:
+            return outputs
+
+    try:
+        # query embeddings, as in _embed_query: asymmetric models embed queries and
+        # documents differently, and llama-index has no batched query embedding
+        with span("embed", questions=len(pending)), ThreadPoolExecutor(max_workers=max_workers) as pool:
+            embeddings = list(pool.map(Settings.embed_model.get_query_embedding, [questions[i] for i in pending]))
+        record_tokens("embed", "input", sum(count_tokens(questions[i]) for i in pending))
+    except Exception as e:
+        for i in pending:
+            outputs[i] = RAGToolError(str(e))
+        return outputs
+
+    query_bundles = {}
+    for i, embedding in zip(pending, embeddings):
+        cached = _ANSWER_CACHE.get_similar(cache_params, embedding) if use_cache else None
+        if cached is not None:
+            outputs[i] = cached
+        else:
+            query_bundles[i] = QueryBundle(query_str=questions[i], embedding=embedding)
+
+    if not query_bundles:
+        return outputs
+
+    try:
+        with span("retrieve", retrieval_mode=retrieval_mode, top_k=candidate_k, questions=len(query_bundles)):
+            retrieved = _retrieve_batch(index, retriever, list(query_bundles.values()), candidate_k)
+        retrieved = [_traced_pack(nodes, top_k, context_budget, retrieval_only) for nodes in retrieved]
+    except Exception as e:
+        for i in query_bundles:
+            outputs[i] = RAGToolError(str(e))
+        return outputs
+
+    if retrieval_only:
+        for i, nodes in zip(query_bundles, retrieved):
+            try:
+                outputs[i] = _nodes_to_output(nodes)
+            except Exception as e:
+                outputs[i] = RAGToolError(str(e))
+            else:
+                if use_cache:
+                    _ANSWER_CACHE.put(cache_params, questions[i], query_bundles[i].embedding, outputs[i], latency=0.0)
+        return outputs
+
+    def synthesize(i: int, nodes: List[NodeWithScore]) -> Union[RAGToolOutput, RAGToolError]:
+        start = time.perf_counter()
+        try:
+            output = _response_to_output(_synthesize(query_engine, query_bundles[i], nodes))
+        except Exception as e:
+            return RAGToolError(str(e))
+        if use_cache:
+            _ANSWER_CACHE.put(cache_params, questions[i], query_bundles[i].embedding, output,
+                              latency=time.perf_counter() - start)
+        return output
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {i: pool.submit(synthesize, i, nodes) for i, nodes in zip(query_bundles, retrieved)}
+        for i, future in futures.items():
+            outputs[i] = future.result()
+
+    return outputs
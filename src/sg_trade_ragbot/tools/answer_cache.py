@@ -0,0 +1,200 @@
+from collections import OrderedDict
+import json
+import logging
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+
+logger = logging.getLogger(__name__)
+
+
+ANSWER_CACHE_FILENAME = "answer_cache.json"
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+# cosine similarity of query embeddings above which two questions share an answer
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s.]", " ", question.lower()).split())
+
+
+class _Entry:
+    __slots__ = ("params", "question", "embedding", "output", "latency", "created")
+
+    def __init__(self, params: str, question: str, embedding: Optional[np.ndarray],
+                 output: RAGToolOutput, latency: float, created: float):
+        self.params = params
+        self.question = question
+        self.embedding = embedding
+        self.output = output
+        self.latency = latency
+        self.created = created
+
+
+class AnswerCache:
+    """
+    Bounded LRU + TTL cache of RAGToolOutputs in front of retrieval/synthesis.
+
+    Lookups first match the normalised question text, then fall back to the
+    cosine similarity of the query embedding against cached questions asked
+    with the same parameters. The whole cache is dropped when the index version
+    it was filled against changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.index_version: Optional[str] = None
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    @staticmethod
+    def _key(params: str, question: str) -> str:
+        return f"{params}\x00{normalize_question(question)}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.created > self.ttl_seconds
+
+    def sync_index_version(self, version: Optional[str]) -> None:
+        """Drop every entry if the index was rebuilt since the cache was filled."""
+        with self._lock:
+            if version != self.index_version:
+                if self._entries:
+                    logger.info("Index changed (%s -> %s); clearing %d cached answers",
+                                self.index_version, version, len(self._entries))
+                self._entries.clear()
+                self.index_version = version
+
+    def _hit(self, key: str, entry: _Entry, kind: str) -> RAGToolOutput:
+        self._entries.move_to_end(key)
+        self._stats[kind] += 1
+        self._stats["saved_seconds"] += entry.latency
+        return entry.output.model_copy(deep=True)
+
+    def get_exact(self, params: str, question: str) -> Optional[RAGToolOutput]:
+        """Match on normalised question text only; does not count a miss."""
+        key = self._key(params, question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                del self._entries[key]
+                return None
+            return self._hit(key, entry, "exact_hits")
+
+    def get_similar(self, params: str, embedding: Sequence[float]) -> Optional[RAGToolOutput]:
+        """Best cached answer whose question embedding clears the similarity threshold."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        now = time.time()
+
+        with self._lock:
+            keys: List[str] = []
+            vectors = []
+            for key, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[key]
+                elif entry.params == params and entry.embedding is not None:
+                    keys.append(key)
+                    vectors.append(entry.embedding)
+
+            if keys:
+                matrix = np.vstack(vectors)
+                scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * query_norm + 1e-12)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    return self._hit(keys[best], self._entries[keys[best]], "semantic_hits")
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, params: str, question: str, embedding: Optional[Sequence[float]],
+            output: RAGToolOutput, latency: float) -> None:
+        key = self._key(params, question)
+        vector = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        with self._lock:
+            self._entries[key] = _Entry(params, normalize_question(question), vector,
+                                        output.model_copy(deep=True), latency, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            payload = {
+                "index_version": self.index_version,
+                "entries": [
+                    {
+                        "params": entry.params,
+                        "question": entry.question,
+                        "embedding": entry.embedding.tolist() if entry.embedding is not None else None,
+                        "output": entry.output.model_dump(mode="json"),
+                        "latency": entry.latency,
+                        "created": entry.created,
+                    }
+                    for entry in self._entries.values()
+                ],
+            }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def load(self, path: Path) -> None:
+        """Replace the contents with a cache saved by save(); expired entries are skipped."""
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        now = time.time()
+        with self._lock:
+            self._entries.clear()
+            self.index_version = payload.get("index_version")
+            for item in payload.get("entries", []):
+                embedding = item.get("embedding")
+                entry = _Entry(
+                    item["params"],
+                    item["question"],
+                    np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+                    RAGToolOutput.model_validate(item["output"]),
+                    item["latency"],
+                    item["created"],
+                )
+                if not self._expired(entry, now):
+                    self._entries[self._key(entry.params, entry.question)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,70 @@
+import re
+from typing import Callable, List, Optional, Sequence
+
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.utils import get_tokenizer
+
+# a trimmed chunk shorter than this is dropped instead of passed on
+MIN_TRIMMED_TOKENS = 64
+
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def _count(tokenizer: Callable, text: str) -> int:
+    return len(tokenizer(text))
+
+
+def trim_to_sentences(text: str, budget_tokens: int, tokenizer: Optional[Callable] = None) -> str:
+    """Longest prefix of whole sentences (or lines) of text that fits in budget_tokens."""
+    tokenizer = tokenizer or get_tokenizer()
+
+    kept = ""
+    for match in _SENTENCE_BREAK_RE.finditer(text + "\n"):
+        candidate = text[:match.start()]
+        if _count(tokenizer, candidate) > budget_tokens:
+            break
+        kept = candidate
+    return kept.rstrip()
+
+
+def pack_nodes(
+    nodes: Sequence[NodeWithScore],
+    budget_tokens: Optional[int],
+    max_nodes: Optional[int] = None,
+    tokenizer: Optional[Callable] = None,
+) -> List[NodeWithScore]:
+    """
+    Greedily fill budget_tokens with the highest-scoring nodes, counting tokens
+    the way the synthesizer sees them (text plus LLM metadata). The first node
+    that does not fit is trimmed at a sentence boundary and packing stops there.
+    With no budget only max_nodes applies.
+    """
+    ranked = sorted(nodes, key=lambda n: n.score if n.score is not None else float("-inf"), reverse=True)
+    if max_nodes is not None:
+        ranked = ranked[:max_nodes]
+    if budget_tokens is None:
+        return ranked
+
+    tokenizer = tokenizer or get_tokenizer()
+    packed: List[NodeWithScore] = []
+    remaining = budget_tokens
+
+    for node_with_score in ranked:
+        node = node_with_score.node
+        tokens = _count(tokenizer, node.get_content(metadata_mode=MetadataMode.LLM))
+        if tokens <= remaining:
+            packed.append(node_with_score)
+            remaining -= tokens
+            continue
+
+        text = node.get_content()
+        overhead = tokens - _count(tokenizer, text)
+        if remaining - overhead >= MIN_TRIMMED_TOKENS:
+            trimmed = trim_to_sentences(text, remaining - overhead, tokenizer)
+            if _count(tokenizer, trimmed) >= MIN_TRIMMED_TOKENS:
+                trimmed_node = node.model_copy()
+                trimmed_node.set_content(trimmed)
+                packed.append(NodeWithScore(node=trimmed_node, score=node_with_score.score))
+        break
+
+    return packed
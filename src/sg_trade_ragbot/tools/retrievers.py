@@ -0,0 +1,132 @@
+from typing import Dict, List, Sequence
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from sg_trade_ragbot.parser.bm25 import BM25Index
+
+# retrieval modes selectable from rag_tool
+VECTOR = "vector"
+HYBRID = "hybrid"
+
+# standard constant from the reciprocal rank fusion paper, damps the head of each ranking
+RRF_K = 60
+
+# share of a parent's leaves that must be retrieved before the parent replaces them
+MERGE_RATIO = 0.5
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Fuse several rankings of ids into one score per id: sum of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses a vector retriever with a BM25 lexical ranking using reciprocal rank
+    fusion. Both sides contribute a candidate pool of candidate_k nodes and the
+    fused top similarity_top_k are returned.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        bm25: BM25Index,
+        docstore,
+        similarity_top_k: int,
+        candidate_k: int,
+        rrf_k: int = RRF_K,
+    ):
+        super().__init__()
+        self._vector_retriever = vector_retriever
+        self._bm25 = bm25
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._candidate_k = candidate_k
+        self._rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_results = self._vector_retriever.retrieve(query_bundle)
+        return self.fuse(query_bundle, vector_results)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # the vector side may need to embed the query; BM25 scoring is in-memory
+        vector_results = await self._vector_retriever.aretrieve(query_bundle)
+        return self.fuse(query_bundle, vector_results)
+
+    def fuse(self, query_bundle: QueryBundle, vector_results: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Fuse vector results retrieved elsewhere (e.g. in a batch) with the BM25 ranking."""
+        lexical_results = self._bm25.query(query_bundle.query_str, self._candidate_k)
+
+        nodes = {result.node.node_id: result.node for result in vector_results}
+        fused = reciprocal_rank_fusion(
+            [list(nodes), [node_id for node_id, _ in lexical_results]],
+            k=self._rrf_k,
+        )
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for node_id, score in ranked:
+            node = nodes.get(node_id) or self._docstore.get_node(node_id, raise_error=False)
+            if node is None:
+                continue
+            results.append(NodeWithScore(node=node, score=score))
+            if len(results) >= self._similarity_top_k:
+                break
+
+        return results
+
+
+class SmallToBigRetriever(BaseRetriever):
+    """
+    Retrieves on small leaf nodes and expands to their parent node (see
+    parser/hs_hierarchy.py) only when several leaves of the same parent match:
+    at least two, and at least merge_ratio of its children. The parent takes
+    the best score of the leaves it replaces. Nodes without a parent, as in a
+    flat index, pass through unchanged.
+    """
+
+    def __init__(self, base_retriever: BaseRetriever, docstore, merge_ratio: float = MERGE_RATIO):
+        super().__init__()
+        self.base_retriever = base_retriever
+        self._docstore = docstore
+        self._merge_ratio = merge_ratio
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.merge(self.base_retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.merge(await self.base_retriever.aretrieve(query_bundle))
+
+    def merge(self, results: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Replace groups of sibling leaves by their parent, keeping score order."""
+        by_parent: Dict[str, List[NodeWithScore]] = {}
+        for result in results:
+            parent = result.node.parent_node
+            if parent is not None:
+                by_parent.setdefault(parent.node_id, []).append(result)
+
+        replaced: Dict[str, NodeWithScore] = {}
+        for parent_id, leaves in by_parent.items():
+            if len(leaves) < 2:
+                continue
+            parent = self._docstore.get_node(parent_id, raise_error=False)
+            if parent is None or len(leaves) < self._merge_ratio * len(parent.child_nodes or []):
+                continue
+            merged = NodeWithScore(node=parent, score=max(leaf.score or 0.0 for leaf in leaves))
+            for leaf in leaves:
+                replaced[leaf.node.node_id] = merged
+
+        merged_results = []
+        seen = set()
+        for result in results:
+            result = replaced.get(result.node.node_id, result)
+            if result.node.node_id not in seen:
+                seen.add(result.node.node_id)
+                merged_results.append(result)
+
+        return sorted(merged_results, key=lambda r: r.score if r.score is not None else float("-inf"), reverse=True)
@@ -0,0 +1,184 @@
+import logging
+from pathlib import Path
+import re
+import threading
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+from config import PROCESSED_DATA_DIR
+from sg_trade_ragbot.parser.hs_codes import HS_CODE_INDEX_FILENAME, normalize_code, normalize_description
+from sg_trade_ragbot.parser.tariff_store import DUTY_KINDS, LEVELS, TARIFF_STORE_FILENAME, load_tariff_frame
+from sg_trade_ragbot.utils.pydantic_models.models import TariffLine, TariffQueryOutput
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# cap on lines returned to the agent, the total count is always exact
+MAX_TARIFF_QUERY_RESULTS = 50
+
+_TABLE = None
+# (path, size, mtime) of the file _TABLE was loaded from
+_TABLE_VERSION = None
+_TABLE_LOCK = threading.Lock()
+
+
+class TariffTable:
+    """
+    Vectorised filters over the tariff lines of the STCCED (see
+    parser/tariff_store.py for the columns). Every filter is a boolean mask
+    over whole columns, so a query scans the table once instead of going
+    through retrieval chunk by chunk.
+    """
+
+    def __init__(self, frame: "pd.DataFrame"):
+        self.frame = frame
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["TariffTable"]:
+        frame = load_tariff_frame(index_dir)
+        return cls(frame) if frame is not None else None
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def filter(
+        self,
+        code_prefix: Optional[str] = None,
+        chapter: Optional[str] = None,
+        level: Optional[str] = None,
+        keywords: Optional[Sequence[str]] = None,
+        match_all: bool = True,
+        customs_dutiable: Optional[bool] = None,
+        excise_dutiable: Optional[bool] = None,
+        min_customs_rate: Optional[float] = None,
+        min_excise_rate: Optional[float] = None,
+    ) -> "pd.DataFrame":
+        """
+        Rows matching every given filter, in code order:
+        - code_prefix / chapter: codes under a chapter, heading or subheading
+          ('85', '85.04', '8504.40'); chapter numbers may omit the leading zero.
+        - level: 'heading', 'subheading' or 'tariff_line'.
+        - keywords: words or phrases found in the description, all of them
+          (match_all) or any.
+        - *_dutiable: lines whose duty is (True) or is not (False) a non-zero rate or amount.
+        - min_*_rate: ad valorem rate of at least this many percent.
+        """
+        frame = self.frame
+        mask = frame["hs_code"].notna()
+
+        for prefix in (normalize_code(code_prefix or ""), normalize_code(chapter or "").zfill(2) if chapter else ""):
+            if prefix:
+                mask &= frame["hs_code"].str.startswith(prefix)
+
+        if level is not None:
+            if level not in LEVELS.values():
+                raise ValueError(f"level must be one of {sorted(LEVELS.values())}, got {level!r}")
+            mask &= frame["level"] == level
+
+        terms = [normalize_description(keyword) for keyword in keywords or [] if normalize_description(keyword)]
+        if terms:
+            matches = [frame["search_text"].str.contains(rf"\b{re.escape(term)}\b", regex=True) for term in terms]
+            combined = matches[0]
+            for match in matches[1:]:
+                combined = combined & match if match_all else combined | match
+            mask &= combined
+
+        for kind, dutiable, min_rate in (("customs", customs_dutiable, min_customs_rate),
+                                         ("excise", excise_dutiable, min_excise_rate)):
+            if dutiable is not None:
+                mask &= frame[f"{kind}_dutiable"] == dutiable
+            if min_rate is not None:
+                mask &= frame[f"{kind}_rate"] >= min_rate
+
+        return frame[mask]
+
+    @staticmethod
+    def to_lines(frame: "pd.DataFrame") -> List[TariffLine]:
+        fields = list(TariffLine.model_fields)
+        records = frame[fields].astype(object).where(frame[fields].notna(), None).to_dict("records")
+        return [TariffLine.model_validate(record) for record in records]
+
+
+def _table_version(index_dir: Path):
+    for name in (TARIFF_STORE_FILENAME, HS_CODE_INDEX_FILENAME):
+        path = Path(index_dir) / name
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        return name, stat.st_size, stat.st_mtime_ns
+    return None
+
+
+def _load_table() -> Optional[TariffTable]:
+    """
+    The tariff table persisted next to the index, loaded once and reloaded
+    when ingestion rewrites it. None if ingestion has not produced one.
+    """
+    global _TABLE, _TABLE_VERSION
+
+    version = _table_version(PROCESSED_DATA_DIR)
+    if version is None:
+        return None
+    if _TABLE is not None and version == _TABLE_VERSION:
+        return _TABLE
+
+    with _TABLE_LOCK:
+        if _TABLE is None or version != _TABLE_VERSION:
+            _TABLE = TariffTable.load(PROCESSED_DATA_DIR)
+            _TABLE_VERSION = version
+            logger.debug("Loaded %d tariff lines from %s", len(_TABLE) if _TABLE else 0, version[0])
+    return _TABLE
+
+
+def tariff_query(
+    chapter: Optional[str] = None,
+    code_prefix: Optional[str] = None,
+    keywords: Optional[List[str]] = None,
+    match_all: bool = True,
+    level: Optional[str] = None,
+    dutiable: Optional[str] = None,
+    duty_free: Optional[str] = None,
+    limit: int = MAX_TARIFF_QUERY_RESULTS,
+) -> str:
+    """
+    Filter the complete list of tariff lines of Singapore's customs tariff and
+    return every match as JSON: {"total": number of matches, "lines": [{hs_code,
+    description, unit, customs_duty, excise_duty}], "truncated": true if more
+    than limit matched}. Use it for listing and counting questions, e.g. "all
+    subheadings under chapter 85 with excise duty" or "which codes mention
+    lithium batteries", instead of rag_tool.
+
+    Args:
+        chapter: HS chapter number, e.g. "85".
+        code_prefix: heading or subheading the codes must start with, e.g. "85.04" or "8504.40".
+        keywords: words or phrases the description must contain.
+        match_all: whether the description must contain all keywords (true) or any of them (false).
+        level: "heading" (4 digits), "subheading" (6 digits) or "tariff_line" (8 digits).
+        dutiable: "customs" or "excise", only lines with a non-zero duty of that kind.
+        duty_free: "customs" or "excise", only lines without a duty of that kind.
+        limit: maximum number of lines to return.
+    """
+    try:
+        table = _load_table()
+        if table is None:
+            return "Tariff query error: no tariff table, run ingestion first"
+
+        flags = {}
+        for value, dutiable_flag in ((dutiable, True), (duty_free, False)):
+            if value is None:
+                continue
+            if value not in DUTY_KINDS:
+                return f"Tariff query error: duty kind must be one of {list(DUTY_KINDS)}, got {value!r}"
+            flags[f"{value}_dutiable"] = dutiable_flag
+
+        matches = table.filter(code_prefix=code_prefix, chapter=chapter, level=level, keywords=keywords,
+                               match_all=match_all, **flags)
+        limit = max(0, min(limit, MAX_TARIFF_QUERY_RESULTS))
+        output = TariffQueryOutput(total=len(matches), lines=TariffTable.to_lines(matches.head(limit)),
+                                   truncated=len(matches) > limit)
+        return output.model_dump_json(exclude_none=True)
+    except Exception as e:
+        logger.exception("tariff_query failed")
+        return f"Tariff query error: {e}"
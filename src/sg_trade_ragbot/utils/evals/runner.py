@@ -0,0 +1,433 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import importlib.util
+import inspect
+import logging
+from pathlib import Path
+import random
+import re
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import yaml
+from pydantic import BaseModel, Field
+
+from sg_trade_ragbot.utils.metrics.metrics import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# call_api calls in flight at once, over all providers
+DEFAULT_CONCURRENCY = 4
+# retries of a case after a 429, on top of the SDK clients' own retries
+DEFAULT_MAX_RETRIES = 5
+# backoff after the n-th 429 is BACKOFF_BASE_SECONDS * 2**(n-1) with jitter, capped
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+DEFAULT_OUTPUT = Path("eval_results.json")
+
+PYTHON_PROVIDER_PREFIX = "python:"
+_TEMPLATE_VAR = re.compile(r"{{\s*([A-Za-z_][A-Za-z0-9_]*)\s*}}")
+_RATE_LIMITED = re.compile(r"\b429\b|rate.?limit|too many requests", re.IGNORECASE)
+
+CallApi = Callable[[str, Dict[str, Any], Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class RateLimit(BaseModel):
+    requests_per_minute: Optional[float] = Field(None, gt=0)
+    tokens_per_minute: Optional[float] = Field(None, gt=0, description="Prompt plus completion tokens")
+
+
+class ProviderSpec(BaseModel):
+    id: str
+    label: str
+    config: Dict[str, Any] = Field(default_factory=dict)
+    rate_limit: RateLimit = Field(default_factory=RateLimit)
+
+
+class EvalCase(BaseModel):
+    id: str
+    description: Optional[str] = None
+    vars: Dict[str, Any] = Field(default_factory=dict)
+
+
+class EvalConfig(BaseModel):
+    path: Path
+    prompts: List[str]
+    providers: List[ProviderSpec]
+    tests: List[EvalCase]
+
+
+class TokenUsage(BaseModel):
+    prompt: int = 0
+    completion: int = 0
+    total: int = 0
+
+
+class CaseResult(BaseModel):
+    test_id: str
+    description: Optional[str] = None
+    provider: str
+    prompt: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    ground_truth: Optional[str] = None
+    latency_seconds: float = Field(..., description="Duration of the last call_api attempt")
+    wall_seconds: float = Field(..., description="Start to finish, including rate limit waits and retries")
+    attempts: int
+    token_usage: TokenUsage = Field(default_factory=TokenUsage)
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ProviderSummary(BaseModel):
+    cases: int
+    errors: int
+    retries: int
+    mean_latency_seconds: float
+    p50_latency_seconds: float
+    p95_latency_seconds: float
+    total_tokens: int
+
+
+class EvalReport(BaseModel):
+    config: str
+    started_at: str
+    wall_seconds: float
+    concurrency: int
+    providers: Dict[str, ProviderSummary] = Field(default_factory=dict)
+    results: List[CaseResult] = Field(default_factory=list)
+
+
+class TokenBucket:
+    """
+    Allowance of per_minute units refilled continuously. acquire waits, first
+    come first served, until the units are available; adjust settles the
+    difference once the real cost of a call is known and may leave the bucket
+    in debt, which later callers then wait out.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take amount units (at most the capacity, so one large call can still run). Returns the seconds waited."""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return waited
+                delay = (amount - self.level) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """Take amount more units (or give them back if negative) without waiting."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _ProviderLimiter:
+    """Request and token buckets of one provider, token reservations sized from the calls seen so far."""
+
+    def __init__(self, limit: RateLimit):
+        self.requests = TokenBucket(limit.requests_per_minute) if limit.requests_per_minute else None
+        self.tokens = TokenBucket(limit.tokens_per_minute) if limit.tokens_per_minute else None
+        self._calls = 0
+        self._tokens_used = 0
+
+    def _estimate(self, prompt: str) -> int:
+        # an agent call costs far more than its prompt (system prompt, tool output), so past calls are the better guess
+        if self._calls:
+            return max(1, self._tokens_used // self._calls)
+        return max(1, count_tokens(prompt))
+
+    async def acquire(self, prompt: str) -> int:
+        """Wait for a request slot and the estimated tokens, returns the tokens reserved."""
+        if self.requests is not None:
+            await self.requests.acquire()
+        reserved = 0
+        if self.tokens is not None:
+            reserved = self._estimate(prompt)
+            await self.tokens.acquire(reserved)
+        return reserved
+
+    def settle(self, reserved: int, used: int) -> None:
+        if used:
+            self._calls += 1
+            self._tokens_used += used
+        if self.tokens is not None:
+            self.tokens.adjust(used - reserved)
+
+
+def render_prompt(template: str, test_vars: Dict[str, Any]) -> str:
+    """Fill {{ name }} placeholders (the subset of promptfoo's nunjucks used by our configs)."""
+    def substitute(match: "re.Match") -> str:
+        name = match.group(1)
+        if name not in test_vars:
+            raise KeyError(f"Prompt uses {{{{{name}}}}} but the test case has no such var")
+        return str(test_vars[name])
+    return _TEMPLATE_VAR.sub(substitute, template)
+
+
+def _read_prompt(prompt: str, base_dir: Path) -> str:
+    if prompt.startswith("file://"):
+        return (base_dir / prompt[len("file://"):]).read_text(encoding="utf-8")
+    return prompt
+
+
+def load_eval_config(path: Path, default_rate_limit: Optional[RateLimit] = None) -> EvalConfig:
+    """
+    Read a promptfoo eval config: prompts, providers and tests (with
+    defaultTest vars merged in). A provider's rate limit is read from
+    config.rate_limit (requests_per_minute, tokens_per_minute), falling back to
+    default_rate_limit field by field.
+    """
+    path = Path(path)
+    raw = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    default_rate_limit = default_rate_limit or RateLimit()
+
+    prompts = [_read_prompt(prompt, path.parent) for prompt in raw.get("prompts") or []]
+
+    providers = []
+    for entry in raw.get("providers") or []:
+        if isinstance(entry, str):
+            entry = {"id": entry}
+        config = entry.get("config") or {}
+        limit = {**default_rate_limit.model_dump(exclude_none=True), **(config.get("rate_limit") or {})}
+        providers.append(ProviderSpec(id=entry["id"], label=entry.get("label") or entry["id"], config=config,
+                                      rate_limit=RateLimit(**limit)))
+
+    default_vars = (raw.get("defaultTest") or {}).get("vars") or {}
+    tests = []
+    for number, entry in enumerate(raw.get("tests") or [], start=1):
+        test_vars = {**default_vars, **(entry.get("vars") or {})}
+        tests.append(EvalCase(id=str(test_vars.get("id") or number),
+                              description=entry.get("description") or test_vars.get("description"),
+                              vars=test_vars))
+
+    return EvalConfig(path=path, prompts=prompts, providers=providers, tests=tests)
+
+
+def load_call_api(provider_id: str, base_dir: Path) -> CallApi:
+    """
+    The call_api function of a python:path/to/provider.py[:function] provider,
+    the path relative to the eval config like in promptfoo.
+    """
+    if not provider_id.startswith(PYTHON_PROVIDER_PREFIX):
+        raise ValueError(f"Only {PYTHON_PROVIDER_PREFIX} providers can be run natively, got {provider_id!r}")
+    target = provider_id[len(PYTHON_PROVIDER_PREFIX):]
+    file_name, _, function_name = target.partition(":")
+    file_path = (base_dir / file_name).resolve()
+
+    spec = importlib.util.spec_from_file_location(f"_eval_provider_{file_path.stem}_{abs(hash(file_path))}", file_path)
+    if spec is None:
+        raise ValueError(f"Cannot load provider {provider_id!r} from {file_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    function = getattr(module, function_name or "call_api")
+
+    if inspect.iscoroutinefunction(function):
+        return function
+
+    async def call_in_thread(prompt, options, context):
+        return await asyncio.to_thread(function, prompt, options, context)
+    return call_in_thread
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_rate_limited(error: Any) -> bool:
+    """429 exceptions from the OpenAI/Groq/httpx clients, or an error result mentioning a rate limit."""
+    if isinstance(error, BaseException) and _status_code(error) == 429:
+        return True
+    return bool(_RATE_LIMITED.search(str(error)))
+
+
+def _retry_after(error: Any) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int, error: Any) -> float:
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        return min(BACKOFF_MAX_SECONDS, retry_after)
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+def _token_usage(response: Dict[str, Any]) -> TokenUsage:
+    usage = response.get("tokenUsage") or {}
+    prompt, completion = int(usage.get("prompt") or 0), int(usage.get("completion") or 0)
+    return TokenUsage(prompt=prompt, completion=completion, total=int(usage.get("total") or prompt + completion))
+
+
+async def _run_case(
+    call_api: CallApi,
+    provider: ProviderSpec,
+    case: EvalCase,
+    template: str,
+    limiter: _ProviderLimiter,
+    semaphore: asyncio.Semaphore,
+    max_retries: int,
+) -> CaseResult:
+    start = time.perf_counter()
+    prompt = render_prompt(template, case.vars)
+    options = {"id": provider.id, "config": provider.config}
+    context = {"vars": case.vars, "prompt": prompt}
+
+    attempts = 0
+    while True:
+        attempts += 1
+        # wait for the rate limits outside the semaphore, a throttled provider must not hold slots of the others
+        reserved = await limiter.acquire(prompt)
+        async with semaphore:
+            call_start = time.perf_counter()
+            try:
+                response = await call_api(prompt, options, context)
+                error = response.get("error")
+            except Exception as e:
+                response, error = {}, e
+            latency = time.perf_counter() - call_start
+
+        usage = _token_usage(response)
+        limiter.settle(reserved, usage.total)
+        if error is None or not _is_rate_limited(error) or attempts > max_retries:
+            break
+        delay = _backoff_seconds(attempts, error)
+        logger.info("%s / %s rate limited (attempt %d), retrying in %.1fs", provider.label, case.id, attempts, delay)
+        await asyncio.sleep(delay)
+
+    if isinstance(error, BaseException):
+        error = f"{type(error).__name__}: {error}"
+    ground_truth = case.vars.get("ground_truth")
+    return CaseResult(
+        test_id=case.id,
+        description=case.description,
+        provider=provider.label,
+        prompt=prompt,
+        output=None if error is not None else response.get("output"),
+        error=None if error is None else str(error),
+        ground_truth=None if ground_truth is None else str(ground_truth),
+        latency_seconds=latency,
+        wall_seconds=time.perf_counter() - start,
+        attempts=attempts,
+        token_usage=usage,
+        metadata=response.get("metadata") or {},
+    )
+
+
+def _summarise(results: Sequence[CaseResult]) -> ProviderSummary:
+    latencies = np.asarray([result.latency_seconds for result in results] or [0.0])
+    return ProviderSummary(
+        cases=len(results),
+        errors=sum(result.error is not None for result in results),
+        retries=sum(result.attempts - 1 for result in results),
+        mean_latency_seconds=float(latencies.mean()),
+        p50_latency_seconds=float(np.percentile(latencies, 50)),
+        p95_latency_seconds=float(np.percentile(latencies, 95)),
+        total_tokens=sum(result.token_usage.total for result in results),
+    )
+
+
+async def run_eval(
+    config: EvalConfig,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    call_apis: Optional[Dict[str, CallApi]] = None,
+) -> EvalReport:
+    """
+    Run every test case against every provider and prompt concurrently, at most
+    concurrency calls in flight and each provider kept under its rate limit.
+    call_apis overrides the call_api used per provider label.
+    """
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    call_apis = call_apis or {}
+    # one module per provider file, its caches (agents, ingestion) are shared by the providers using it
+    loaded: Dict[str, CallApi] = {}
+
+    tasks = []
+    for provider in config.providers:
+        call_api = call_apis.get(provider.label)
+        if call_api is None:
+            if provider.id not in loaded:
+                loaded[provider.id] = load_call_api(provider.id, config.path.parent)
+            call_api = loaded[provider.id]
+        limiter = _ProviderLimiter(provider.rate_limit)
+        for case in config.tests:
+            for template in config.prompts:
+                tasks.append(_run_case(call_api, provider, case, template, limiter, semaphore, max_retries))
+
+    results = await asyncio.gather(*tasks)
+
+    return EvalReport(
+        config=str(config.path),
+        started_at=started_at,
+        wall_seconds=time.perf_counter() - start,
+        concurrency=concurrency,
+        providers={provider.label: _summarise([r for r in results if r.provider == provider.label])
+                   for provider in config.providers},
+        results=list(results),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sg_trade_ragbot.utils.evals.runner",
+        description="Run a promptfoo eval config's python providers concurrently, with per-provider rate limits.",
+    )
+    parser.add_argument("config", type=Path, help="Eval config, e.g. eval_configs/bare_config.yaml")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries of a case after a 429")
+    parser.add_argument("--rpm", type=float, help="Default requests per minute per provider")
+    parser.add_argument("--tpm", type=float, help="Default tokens per minute per provider")
+    parser.add_argument("--provider", action="append", dest="providers", metavar="LABEL",
+                        help="Only run the provider with this label (repeatable)")
+    args = parser.parse_args(argv)
+
+    config = load_eval_config(args.config, RateLimit(requests_per_minute=args.rpm, tokens_per_minute=args.tpm))
+    if args.providers:
+        config.providers = [provider for provider in config.providers if provider.label in args.providers]
+        if not config.providers:
+            parser.error(f"No provider labelled {args.providers} in {args.config}")
+
+    report = asyncio.run(run_eval(config, concurrency=args.concurrency, max_retries=args.max_retries))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(report.model_dump_json(indent=2), encoding="utf-8")
+    for label, summary in report.providers.items():
+        logger.info("%s: %d cases, %d errors, %d retries, p50 %.2fs, p95 %.2fs, %d tokens", label, summary.cases,
+                    summary.errors, summary.retries, summary.p50_latency_seconds, summary.p95_latency_seconds,
+                    summary.total_tokens)
+    logger.info("Wrote %d results to %s in %.1fs", len(report.results), args.output, report.wall_seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import asyncio
+import itertools
+
+from sg_trade_ragbot.utils.metrics.metrics import count_tokens
+
+# calls so far, for config.rate_limit_every
+_CALLS = itertools.count(1)
+
+
+async def call_api(prompt, options, context):
+    """
+    Offline stand-in for provider.call_api, for validating eval configs and the
+    eval runner without API keys. Answers with config.answer, else the test's
+    ground_truth, after config.latency_ms. With config.rate_limit_every = n
+    every n-th call fails with a 429 error like a rate limited provider.
+    """
+    config = options.get("config") or {}
+    test_vars = (context or {}).get("vars") or {}
+
+    await asyncio.sleep(config.get("latency_ms", 50) / 1000)
+
+    every = config.get("rate_limit_every")
+    if every and next(_CALLS) % every == 0:
+        return {"error": "429 Too Many Requests (stub rate limit)"}
+
+    answer = str(config.get("answer") or test_vars.get("ground_truth") or "")
+    prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(answer)
+    return {
+        "output": answer,
+        "retrievals": [],
+        "tokenUsage": {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "total": prompt_tokens + completion_tokens,
+        },
+        "metadata": {"model_name": config.get("model_name", "stub")},
+    }
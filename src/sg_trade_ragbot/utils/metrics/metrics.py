@@ -0,0 +1,302 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import itertools
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from llama_index.core.utils import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+# seconds; the prometheus client defaults extended for multi-second LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# finished spans kept in memory for inspection, oldest dropped first
+MAX_RECENT_SPANS = 1024
+
+STAGE_SECONDS = "ragbot_stage_duration_seconds"
+STAGE_ERRORS = "ragbot_stage_errors_total"
+TOKENS = "ragbot_tokens_total"
+
+_LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> _LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {list(self.labelnames)}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[_LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._label_values(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.setdefault(key, _HistogramValue(len(self.buckets)))
+            entry.buckets[position] += 1
+            entry.sum += value
+            entry.count += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+            return entry.count if entry else 0
+
+    def sum(self, **labels: Any) -> float:
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+            return entry.sum if entry else 0.0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(entry.buckets), entry.sum, entry.count) for key, entry in self._values.items())
+        for key, buckets, total, count in items:
+            for bound, cumulative in zip(self.buckets, itertools.accumulate(buckets)):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Span:
+    """One timed stage of a request. Attributes can be added while it runs with set()."""
+
+    __slots__ = ("name", "span_id", "parent_id", "attributes", "start", "duration", "error")
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": dict(self.attributes),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process store of counters, histograms and recently finished spans.
+    Metrics are created on first use by name and rendered together in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, max_spans: int = MAX_RECENT_SPANS):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._spans: "deque[Span]" = deque(maxlen=max_spans)
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs: Any):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def record_span(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def spans(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recently finished spans as dicts, oldest first, optionally only those called name."""
+        return [span.to_dict() for span in list(self._spans) if name is None or span.name == name]
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def write_prometheus(self, path: Path) -> Path:
+        """Write the text dump atomically, e.g. for node_exporter's textfile collector."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.render_prometheus(), encoding="utf-8")
+        tmp_path.replace(path)
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+        self._spans.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("ragbot_current_span", default=None)
+_SPAN_IDS = itertools.count(1)
+
+
+def _stage_metrics(registry: MetricsRegistry) -> Tuple[Histogram, Counter]:
+    seconds = registry.histogram(STAGE_SECONDS, "Wall time of each RAG/agent stage", ("stage",))
+    errors = registry.counter(STAGE_ERRORS, "Stages that raised, by exception type", ("stage", "error"))
+    return seconds, errors
+
+
+@contextmanager
+def span(name: str, registry: Optional[MetricsRegistry] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time the enclosed block as stage name: its duration goes into the
+    ragbot_stage_duration_seconds histogram, an exception escaping it bumps
+    ragbot_stage_errors_total, and the finished span (nested under the span
+    enclosing it, also across awaits) is kept in the registry and logged at
+    debug level.
+    """
+    registry = registry or REGISTRY
+    parent = _CURRENT_SPAN.get()
+    current = Span(name, next(_SPAN_IDS), parent.span_id if parent else None, attributes)
+    token = _CURRENT_SPAN.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _CURRENT_SPAN.reset(token)
+
+        seconds, errors = _stage_metrics(registry)
+        seconds.observe(current.duration, stage=name)
+        if current.error:
+            errors.inc(stage=name, error=current.error)
+        registry.record_span(current)
+        logger.debug("span %s id=%d parent=%s duration=%.4fs error=%s %s", name, current.span_id,
+                     current.parent_id, current.duration, current.error, current.attributes)
+
+
+def observe_stage(stage: str, seconds: float, error: Optional[str] = None,
+                  registry: Optional[MetricsRegistry] = None) -> None:
+    """
+    Record a stage timed by the caller, for work that cannot sit inside span(),
+    e.g. because it yields from an async generator.
+    """
+    seconds_metric, errors = _stage_metrics(registry or REGISTRY)
+    seconds_metric.observe(seconds, stage=stage)
+    if error:
+        errors.inc(stage=stage, error=error)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text according to the llama-index global tokenizer."""
+    return len(get_tokenizer()(text)) if text else 0
+
+
+def record_tokens(stage: str, kind: str, count: int, registry: Optional[MetricsRegistry] = None) -> None:
+    """Add count tokens of kind (input, prompt, completion) to stage's token counter."""
+    if count:
+        (registry or REGISTRY).counter(TOKENS, "Tokens sent to or produced by models, by stage",
+                                       ("stage", "kind")).inc(count, stage=stage, kind=kind)
+
+
+def render_prometheus(registry: Optional[MetricsRegistry] = None) -> str:
+    return (registry or REGISTRY).render_prometheus()
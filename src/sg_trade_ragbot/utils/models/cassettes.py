@@ -0,0 +1,210 @@
+import base64
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from config import CASSETTE_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# cassette modes
+RECORD = "record"            # replay recorded requests, send and record the rest
+REPLAY = "replay"            # replay only, unrecorded requests raise CassetteMissError
+PASSTHROUGH = "passthrough"  # no cassette, every request goes to the provider
+CASSETTE_MODES = (RECORD, REPLAY, PASSTHROUGH)
+
+CASSETTE_MODE_ENV = "RAGBOT_CASSETTE_MODE"
+CASSETTE_DIR_ENV = "RAGBOT_CASSETTE_DIR"
+
+# the stored body is already decoded, so these no longer describe it
+_DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request that was never recorded."""
+    pass
+
+
+def _canonical_body(content: bytes) -> Any:
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="backslashreplace")
+
+
+def _canonical_url(url: httpx.URL) -> str:
+    query = urlencode(sorted(parse_qsl(url.query.decode("ascii"), keep_blank_values=True)))
+    return f"{url.scheme}://{url.host}{':' + str(url.port) if url.port else ''}{url.path}" + (f"?{query}" if query else "")
+
+
+def request_key(request: httpx.Request) -> str:
+    """
+    Hash of method, URL and body of request. JSON bodies are hashed with sorted
+    keys and headers are left out, so API keys, SDK versions and retry counters
+    do not change the key.
+    """
+    canonical = json.dumps([request.method.upper(), _canonical_url(request.url), _canonical_body(request.content)],
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Directory of recorded HTTP exchanges, one JSON file per request key (see
+    request_key). A file per request keeps concurrent recorders from clobbering
+    each other and keeps diffs of a re-recorded cassette readable.
+    """
+
+    def __init__(self, directory: Path, mode: str = RECORD):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Cassette mode must be {RECORD!r} or {REPLAY!r}, got {mode!r}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.path(key)
+        entry = json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def save(self, key: str, request: httpx.Request, response: httpx.Response) -> Dict[str, Any]:
+        """
+        Store the exchange under key and return the stored form. Only 2xx
+        responses are stored: errors (rate limits, a bad key, server errors)
+        are passed on but a replay must not repeat them.
+        """
+        content = response.content
+        try:
+            body, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+
+        entry = {
+            "request": {"method": request.method, "url": _canonical_url(request.url),
+                        "body": _canonical_body(request.content)},
+            "response": {
+                "status_code": response.status_code,
+                "headers": [[name, value] for name, value in response.headers.items()
+                            if name.lower() not in _DROPPED_RESPONSE_HEADERS],
+                "body": body,
+                "encoding": encoding,
+            },
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        if not response.is_success:
+            return entry
+
+        # written atomically, a concurrent replay never sees half a file
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+        return entry
+
+    def miss(self, request: httpx.Request, key: str) -> CassetteMissError:
+        return CassetteMissError(f"No recording of {request.method} {request.url} ({key}) in {self.directory}; "
+                                 f"run with {CASSETTE_MODE_ENV}={RECORD} to record it")
+
+    def wrap(self, transport: httpx.BaseTransport) -> "CassetteTransport":
+        return CassetteTransport(self, transport)
+
+    def awrap(self, transport: httpx.AsyncBaseTransport) -> "AsyncCassetteTransport":
+        return AsyncCassetteTransport(self, transport)
+
+
+def _replayed_response(entry: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+    recorded = entry["response"]
+    body = recorded["body"]
+    content = base64.b64decode(body) if recorded.get("encoding") == "base64" else body.encode("utf-8")
+    return httpx.Response(recorded["status_code"], headers=recorded["headers"], content=content, request=request)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that answers from cassette and sends (and records) the rest through transport."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.BaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key = request_key(request)
+        entry = self.cassette.load(key)
+        if entry is None:
+            if self.cassette.mode == REPLAY:
+                raise self.cassette.miss(request, key)
+            response = self.transport.handle_request(request)
+            try:
+                # streamed responses are recorded whole, the caller then reads them from memory
+                response.read()
+            finally:
+                response.close()
+            entry = self.cassette.save(key, request, response)
+        return _replayed_response(entry, request)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of CassetteTransport."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = request_key(request)
+        entry = self.cassette.load(key)
+        if entry is None:
+            if self.cassette.mode == REPLAY:
+                raise self.cassette.miss(request, key)
+            response = await self.transport.handle_async_request(request)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            entry = self.cassette.save(key, request, response)
+        return _replayed_response(entry, request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def cassette_from_env() -> Optional[Cassette]:
+    """
+    Cassette configured by RAGBOT_CASSETTE_MODE (record, replay or passthrough,
+    the default) and RAGBOT_CASSETTE_DIR (default data/cassettes). None for
+    passthrough.
+    """
+    mode = os.getenv(CASSETTE_MODE_ENV, PASSTHROUGH).strip().lower() or PASSTHROUGH
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"{CASSETTE_MODE_ENV} must be one of {CASSETTE_MODES}, got {mode!r}")
+    if mode == PASSTHROUGH:
+        return None
+    directory = Path(os.getenv(CASSETTE_DIR_ENV) or CASSETTE_DATA_DIR)
+    logger.info("LLM and embedding requests use the %s cassette at %s", mode, directory)
+    return Cassette(directory, mode)
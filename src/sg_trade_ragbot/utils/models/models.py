@@ -1,13 +1,20 @@
-from llama_index.llms.groq import Groq
-from llama_index.llms.openai import OpenAI
-from llama_index.llms.ollama import Ollama
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+import weakref
 
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
+import httpx
+from pydantic import BaseModel, ConfigDict, Field
 
 from dotenv import load_dotenv
 
+from sg_trade_ragbot.utils.models.cassettes import Cassette, cassette_from_env
+
+# the LangChain / LlamaIndex backends and their SDKs take over a second to import,
+# so each one is imported inside the builder that needs it, on first use
+if TYPE_CHECKING:
+    from ollama import AsyncClient as OllamaAsyncClient, Client as OllamaClient
+
 
 load_dotenv()
 
@@ -26,29 +33,295 @@ REMOTE_JUDGE = "gpt-5"
 
 LOCAL_LLAMA3 = "llama3.1:latest"
 
+# llama-index's own Settings defaults, see configure_settings
+DEFAULT_SYNTHESIS_LLM = "gpt-3.5-turbo"
+DEFAULT_EMBED_MODEL = "text-embedding-ada-002"
+
+# models served by OpenAI, the rest of the remote models go to Groq
+OPENAI_MODELS = (REMOTE_OPENAI, DEFAULT_SYNTHESIS_LLM)
+
+# pseudo framework under which embedding clients are cached next to the llms
+EMBEDDING = "embedding"
+
+OLLAMA_BASE_URL = "http://localhost:11434"
+
+# context windows (tokens) of the models above, used to size the retrieved context
+CONTEXT_WINDOWS = {
+    REMOTE_LLAMA3: 131072,
+    REMOTE_QWEN: 131072,
+    REMOTE_GPT_OSS_SMALL: 131072,
+    REMOTE_GPT_OSS_LARGE: 131072,
+    REMOTE_OPENAI: 128000,
+    REMOTE_JUDGE: 400000,
+    LOCAL_LLAMA3: 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# share of the window given to retrieved chunks, the rest is prompt, question and answer
+CONTEXT_BUDGET_FRACTION = 0.5
+# cap for large windows, past this more chunks mostly add latency
+MAX_CONTEXT_TOKENS = 6000
+
+
+def get_context_window(name: str, default: int = DEFAULT_CONTEXT_WINDOW) -> int:
+    return CONTEXT_WINDOWS.get(name, default)
+
+
+def get_context_budget(name: str, context_window: Optional[int] = None) -> int:
+    """
+    Tokens of retrieved context to hand to the model, see CONTEXT_BUDGET_FRACTION.
+    context_window is used for models missing from CONTEXT_WINDOWS.
+    """
+    window = get_context_window(name, context_window or DEFAULT_CONTEXT_WINDOW)
+    return min(int(window * CONTEXT_BUDGET_FRACTION), MAX_CONTEXT_TOKENS)
+
+
+class ClientOptions(BaseModel):
+    """
+    Connection settings for the LLM clients. Part of the client registry key, so
+    clients with equal options share one instance and one HTTP pool.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    request_timeout: float = Field(default=60.0, gt=0, description="Seconds to wait for a whole response")
+    connect_timeout: float = Field(default=10.0, gt=0, description="Seconds to wait for a connection")
+    max_connections: int = Field(default=20, gt=0, description="Open connections per pool")
+    max_keepalive_connections: int = Field(default=10, ge=0, description="Idle connections kept for reuse")
+    keepalive_expiry: float = Field(default=30.0, ge=0, description="Seconds an idle connection is kept")
+    max_retries: int = Field(default=3, ge=0)
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.request_timeout, connect=self.connect_timeout)
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+
+DEFAULT_CLIENT_OPTIONS = ClientOptions()
+
+# (name, framework, local, options) -> llm client, see get_remote_llm / get_local_llm
+_LLM_CLIENTS: Dict[Tuple[str, str, bool, ClientOptions], object] = {}
+# options -> (httpx.Client, httpx.AsyncClient) shared by every remote client
+_HTTP_POOLS: Dict[ClientOptions, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+# options -> (ollama Client, AsyncClient) shared by every llama-index Ollama llm
+_OLLAMA_POOLS: Dict[ClientOptions, Tuple["OllamaClient", "OllamaAsyncClient"]] = {}
+_CLIENTS_LOCK = threading.RLock()
+# record/replay cassette wrapped around every pool, see use_cassette
+_CASSETTE: Optional[Cassette] = None
+_CASSETTE_LOADED = False
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The cassette in use, read from the environment on first call (see cassette_from_env)."""
+    global _CASSETTE, _CASSETTE_LOADED
+    if not _CASSETTE_LOADED:
+        with _CLIENTS_LOCK:
+            if not _CASSETTE_LOADED:
+                _CASSETTE = cassette_from_env()
+                _CASSETTE_LOADED = True
+    return _CASSETTE
+
+
+def use_cassette(cassette: Optional[Cassette]) -> None:
+    """
+    Record/replay every request of the clients built from now on through
+    cassette (None for passthrough). Cached clients and pools are dropped, so
+    callers must fetch their clients again.
+    """
+    global _CASSETTE, _CASSETTE_LOADED
+    with _CLIENTS_LOCK:
+        reset_llm_clients()
+        _CASSETTE = cassette
+        _CASSETTE_LOADED = True
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport that keeps one connection pool per event loop. An httpx
+    async pool only works on the loop it first ran on, while the cached clients
+    outlive loops: every asyncio.run of the eval provider or a CLI call starts a
+    new one. A loop's pool is dropped with the loop.
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self.factory = factory
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self.factory()
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def _transports(options: ClientOptions):
+    """(sync, async) httpx transports for a pool, wrapped in the cassette if one is in use."""
+    transport = httpx.HTTPTransport(limits=options.limits())
+    async_transport = _PerLoopTransport(lambda: httpx.AsyncHTTPTransport(limits=options.limits()))
+    cassette = get_cassette()
+    if cassette is not None:
+        return cassette.wrap(transport), cassette.awrap(async_transport)
+    return transport, async_transport
 
-def get_remote_llm(name: str, framework: str):
-    if name == REMOTE_OPENAI and framework == LANGCHAIN:
-        return ChatOpenAI(model=REMOTE_OPENAI)
-    if name == REMOTE_OPENAI and framework == LLAMAINDEX:
-        return OpenAI(REMOTE_OPENAI)
+
+def _http_pool(options: ClientOptions) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Keep-alive connection pools shared by all remote clients with these options.
+    Limits apply per host, so Groq and OpenAI clients can share one pool. The
+    async client can be used from any event loop, see _PerLoopTransport.
+    """
+    with _CLIENTS_LOCK:
+        pool = _HTTP_POOLS.get(options)
+        if pool is None:
+            transport, async_transport = _transports(options)
+            pool = (httpx.Client(timeout=options.timeout(), transport=transport),
+                    httpx.AsyncClient(timeout=options.timeout(), transport=async_transport))
+            _HTTP_POOLS[options] = pool
+        return pool
+
+
+def _ollama_pool(options: ClientOptions) -> Tuple["OllamaClient", "OllamaAsyncClient"]:
+    from ollama import AsyncClient as OllamaAsyncClient, Client as OllamaClient
+
+    with _CLIENTS_LOCK:
+        pool = _OLLAMA_POOLS.get(options)
+        if pool is None:
+            transport, async_transport = _transports(options)
+            pool = (OllamaClient(host=OLLAMA_BASE_URL, timeout=options.timeout(), transport=transport),
+                    OllamaAsyncClient(host=OLLAMA_BASE_URL, timeout=options.timeout(), transport=async_transport))
+            _OLLAMA_POOLS[options] = pool
+        return pool
+
+
+def _cached_client(name: str, framework: str, local: bool, options: ClientOptions, build):
+    key = (name, framework, local, options)
+
+    client = _LLM_CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        client = _LLM_CLIENTS.get(key)
+        if client is None:
+            client = build()
+            if client is not None:
+                _LLM_CLIENTS[key] = client
+        return client
+
+
+def reset_llm_clients() -> None:
+    """Drop the cached clients and close their shared connection pools."""
+    with _CLIENTS_LOCK:
+        pools = list(_HTTP_POOLS.values())
+        _LLM_CLIENTS.clear()
+        _HTTP_POOLS.clear()
+        _OLLAMA_POOLS.clear()
+    for sync_client, _ in pools:
+        # async clients are left to the garbage collector, closing them needs their event loop
+        sync_client.close()
+
+
+def _build_remote_llm(name: str, framework: str, options: ClientOptions):
+    http_client, async_http_client = _http_pool(options)
+    if name in OPENAI_MODELS and framework == LANGCHAIN:
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=name, http_client=http_client, http_async_client=async_http_client,
+                          timeout=options.request_timeout, max_retries=options.max_retries)
+    if name in OPENAI_MODELS and framework == LLAMAINDEX:
+        from llama_index.llms.openai import OpenAI
+        return OpenAI(name, http_client=http_client, async_http_client=async_http_client,
+                      timeout=options.request_timeout, max_retries=options.max_retries)
     if framework == LLAMAINDEX:
-        return Groq(name)
+        from llama_index.llms.groq import Groq
+        return Groq(name, http_client=http_client, async_http_client=async_http_client,
+                    timeout=options.request_timeout, max_retries=options.max_retries)
     elif framework == LANGCHAIN:
-        return ChatGroq(model=name)
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=name, http_client=http_client, http_async_client=async_http_client,
+                        request_timeout=options.request_timeout, max_retries=options.max_retries)
 
 
-# llama-3.1-8b is not "good enough" at the current state,
-# might be that
-# 1. Chunks are too big
-# 2. Too many similarity searches
-def get_local_llm(name: str, framework: str):
+def get_remote_llm(name: str, framework: str, options: Optional[ClientOptions] = None):
+    """
+    Client for a hosted model, memoised by (name, framework, options): repeated
+    calls return the same instance, and all remote clients with the same options
+    share one keep-alive HTTP pool instead of opening their own.
+    """
+    options = options or DEFAULT_CLIENT_OPTIONS
+    return _cached_client(name, framework, False, options, lambda: _build_remote_llm(name, framework, options))
+
+
+def _build_local_llm(name: str, framework: str, options: ClientOptions):
     if framework == LANGCHAIN:
+        from langchain_ollama import ChatOllama
+        # ChatOllama builds its own ollama clients, the pool is shared through the cached instance
+        transport, async_transport = _transports(options)
         return ChatOllama(
-            model=name
+            model=name,
+            base_url=OLLAMA_BASE_URL,
+            client_kwargs={"timeout": options.timeout()},
+            sync_client_kwargs={"transport": transport},
+            async_client_kwargs={"transport": async_transport},
         )
     if framework == LLAMAINDEX:
+        from llama_index.llms.ollama import Ollama
+        client, async_client = _ollama_pool(options)
         return Ollama(
             model=name,
-            request_timeout=60.0
+            base_url=OLLAMA_BASE_URL,
+            request_timeout=options.request_timeout,
+            client=client,
+            async_client=async_client,
+            # also sets num_ctx, so the context budget above matches the server
+            context_window=get_context_window(name)
         )
+
+
+# llama-3.1-8b is not "good enough" at the current state,
+# might be that
+# 1. Chunks are too big
+# 2. Too many similarity searches
+def get_local_llm(name: str, framework: str, options: Optional[ClientOptions] = None):
+    """Client for a model served by the local Ollama, memoised like get_remote_llm."""
+    options = options or DEFAULT_CLIENT_OPTIONS
+    return _cached_client(name, framework, True, options, lambda: _build_local_llm(name, framework, options))
+
+
+def _build_embed_model(name: str, options: ClientOptions):
+    from llama_index.embeddings.openai import OpenAIEmbedding
+    http_client, async_http_client = _http_pool(options)
+    return OpenAIEmbedding(model=name, http_client=http_client, async_http_client=async_http_client,
+                           timeout=options.request_timeout, max_retries=options.max_retries)
+
+
+def get_embed_model(name: str = DEFAULT_EMBED_MODEL, options: Optional[ClientOptions] = None):
+    """OpenAI embedding client on the shared remote pool, memoised like get_remote_llm."""
+    options = options or DEFAULT_CLIENT_OPTIONS
+    return _cached_client(name, EMBEDDING, False, options, lambda: _build_embed_model(name, options))
+
+
+def configure_settings(options: Optional[ClientOptions] = None) -> None:
+    """
+    Point llama-index's Settings.llm and Settings.embed_model (used by ingestion
+    and the RAG tool's synthesizer) at clients on the shared pools, so their
+    requests are pooled and go through the cassette like the agents' requests.
+    The models are llama-index's defaults, answers and indexes stay comparable.
+    """
+    from llama_index.core import Settings
+    Settings.llm = get_remote_llm(DEFAULT_SYNTHESIS_LLM, LLAMAINDEX, options)
+    Settings.embed_model = get_embed_model(options=options)
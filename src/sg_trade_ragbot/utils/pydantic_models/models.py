@@ -1,10 +1,12 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
 class RetrievalItem(BaseModel):
     id: str = Field(..., description="Node or document id for the retrieval")
     text: str = Field(..., description="Source excerpt or full content for the retrieval")
+    score: Optional[float] = Field(None, description="Retrieval score, set for retrieval-only results")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="Node metadata (file, page), set for retrieval-only results")
 
 
 class RAGToolOutput(BaseModel):
@@ -19,6 +21,39 @@ class RAGToolOutput(BaseModel):
         return cls.model_validate_json(raw)
 
 
+class AgentAnswer(BaseModel):
+    answer: str = Field(..., description="The agent's final message")
+    tool_outputs: List[RAGToolOutput] = Field(default_factory=list, description="Outputs of the agent's rag_tool calls, in call order")
+    prompt_tokens: int = Field(0, description="Prompt tokens of all agent LLM steps")
+    completion_tokens: int = Field(0, description="Completion tokens of all agent LLM steps")
+
+    def retrievals(self) -> List[RetrievalItem]:
+        """Retrievals of all tool calls, the first occurrence of each id kept."""
+        seen = set()
+        items = []
+        for output in self.tool_outputs:
+            for item in output.retrievals:
+                if item.id not in seen:
+                    seen.add(item.id)
+                    items.append(item)
+        return items
+
+
+class TariffLine(BaseModel):
+    hs_code: str = Field(..., description="HS code as digits only, e.g. 01041010 for 0104.10.10")
+    description: str = Field(..., description="Description of the goods as written in the tariff table")
+    unit: Optional[str] = Field(None, description="Unit of quantity")
+    customs_duty: Optional[str] = Field(None, description="Customs duty rate as written in the tariff table")
+    excise_duty: Optional[str] = Field(None, description="Excise duty rate as written in the tariff table")
+    source: Optional[str] = Field(None, description="Markdown file the row was extracted from")
+
+
+class TariffQueryOutput(BaseModel):
+    total: int = Field(..., description="Number of tariff lines matching the filters")
+    lines: List[TariffLine] = Field(default_factory=list, description="Matching lines in code order, at most the requested limit")
+    truncated: bool = Field(False, description="Whether more lines matched than were returned")
+
+
 class RAGToolError(Exception):
     """Raised for errors inside the RAG tool (internal API)."""
     pass
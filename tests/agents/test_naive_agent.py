@@ -1,9 +1,8 @@
 import pytest
-from pydantic import ValidationError
 
 from dotenv import load_dotenv
 
-from sg_trade_ragbot.agents.naive_agent import get_naive_agent
+from sg_trade_ragbot.agents.naive_agent import get_naive_agent, run_naive_agent
 from sg_trade_ragbot.utils.models.models import REMOTE_LLAMA3, REMOTE_QWEN, REMOTE_GPT_OSS_SMALL
 from sg_trade_ragbot.tools.RAGTool import rag_tool, get_tool_call_count, reset_tool_call_count
 from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
@@ -33,9 +32,9 @@ async def test_naive_agent_integration_call():
 
     naive_agent.dict()
 
-    response = None
+    result = None
     try:
-        response = await naive_agent.run(prompt)
+        result = await run_naive_agent(naive_agent, prompt)
     except Exception as e:
         # Always print the number of RAG tool invocations even if the run fails
         print("RAG tool calls during run (on exception):", get_tool_call_count())
@@ -44,21 +43,13 @@ async def test_naive_agent_integration_call():
         # If run completed or after exception, also print the count
         print("RAG tool calls (final):", get_tool_call_count())
 
-    assert response is not None, "Agent did not return a response"
+    assert result is not None, "Agent did not return a response"
 
     print("RAG tool calls during run:", get_tool_call_count())
+    print(result.answer)
 
-    assert response is not None, "Agent did not return a response"
-
-    # Prefer the agent's structured_response and pydantic conversion helper
-    print(response)
-
-    # Convert to the expected Pydantic model using the agent helper if available
-    try:
-        validated = RAGToolOutput.model_validate_json(str(response))
-
-        assert validated.retrievals is not None
-        assert validated.answer is not None
-    except ValidationError as e:
-        print(e.errors())
-        raise
+    # the RAGToolOutput is captured from the tool call events, the model only writes a short answer
+    assert result.answer
+    assert result.tool_outputs, "Agent did not call rag_tool"
+    assert all(isinstance(output, RAGToolOutput) for output in result.tool_outputs)
+    assert result.retrievals()
@@ -0,0 +1,81 @@
+import importlib
+
+import pytest
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+from sg_trade_ragbot.agents.naive_agent import build_naive_agent, run_naive_agent, stream_naive_agent
+from sg_trade_ragbot.benchmarks.stubs import stub_agent_llm
+from sg_trade_ragbot.parser.numpy_vector_store import new_storage_context
+from sg_trade_ragbot.tools.answer_cache import AnswerCache
+
+
+@pytest.fixture
+def RAGTool(tmp_path, monkeypatch):
+    module = importlib.import_module("sg_trade_ragbot.tools.RAGTool")
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8), raising=False)
+    monkeypatch.setattr(Settings, "_llm", MockLLM(max_tokens=5), raising=False)
+    monkeypatch.setattr(module, "PROCESSED_DATA_DIR", str(tmp_path), raising=False)
+    monkeypatch.setattr(module, "_INDEX", None)
+    monkeypatch.setattr(module, "_INDEX_VERSION", None)
+    monkeypatch.setattr(module, "_BM25", None)
+    monkeypatch.setattr(module, "_HS_INDEX", None)
+    monkeypatch.setattr(module, "_RETRIEVERS", {})
+    monkeypatch.setattr(module, "_QUERY_ENGINES", {})
+    monkeypatch.setattr(module, "_ANSWER_CACHE", AnswerCache())
+
+    index = VectorStoreIndex.from_documents([Document(text="Live sheep and goats."), Document(text="Solar panels.")],
+                                            storage_context=new_storage_context())
+    index.storage_context.persist(persist_dir=str(tmp_path))
+    return module
+
+
+@pytest.mark.asyncio
+async def test_streaming_agent_forwards_tool_deltas(RAGTool):
+    agent = build_naive_agent(stub_agent_llm(), streaming=True)
+
+    items = [item async for item in stream_naive_agent(agent, "live sheep")]
+    deltas, result = items[:-1], items[-1]
+
+    assert len(deltas) == 5
+    output, = result.tool_outputs
+    assert output.answer == "".join(deltas) == result.answer
+    assert output.retrievals
+
+
+@pytest.mark.parametrize("retrieval_only", [False, True])
+@pytest.mark.asyncio
+async def test_tool_output_is_captured_from_tool_events(RAGTool, retrieval_only):
+    agent = build_naive_agent(stub_agent_llm(), retrieval_only=retrieval_only)
+
+    result = await run_naive_agent(agent, "live sheep")
+
+    output, = result.tool_outputs
+    assert output.retrievals
+    assert [item.id for item in result.retrievals()] == [item.id for item in output.retrievals]
+    # the stub replies with the tool's answer only, never the JSON payload
+    assert result.answer == output.answer
+    assert result.prompt_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_tool_errors_are_not_captured(RAGTool, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("no index")
+    monkeypatch.setattr(RAGTool, "_load_index", broken)
+    agent = build_naive_agent(stub_agent_llm())
+
+    result = await run_naive_agent(agent, "live sheep")
+
+    assert result.tool_outputs == []
+    assert result.answer.startswith("RAG tool error:")
+
+
+@pytest.mark.asyncio
+async def test_streaming_tool_schema_hides_context(RAGTool):
+    agent = build_naive_agent(stub_agent_llm(), streaming=True)
+
+    rag, = agent.tools
+    assert rag.metadata.name == "rag_tool"
+    assert "ctx" not in rag.metadata.get_parameters_dict()["properties"]
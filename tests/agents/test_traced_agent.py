@@ -0,0 +1,28 @@
+import pytest
+from llama_index.core.tools import FunctionTool
+
+from sg_trade_ragbot.agents.naive_agent import TracedFunctionAgent
+from sg_trade_ragbot.benchmarks.stubs import stub_agent_llm
+from sg_trade_ragbot.utils.metrics import metrics
+
+
+def rag_tool(question: str) -> str:
+    """Answer a tariff question."""
+    return '{"answer": "0104.10.10"}'
+
+
+@pytest.mark.asyncio
+async def test_agent_steps_are_traced(monkeypatch):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    monkeypatch.setattr("sg_trade_ragbot.agents.naive_agent.REGISTRY", registry)
+    agent = TracedFunctionAgent(tools=[FunctionTool.from_defaults(fn=rag_tool)], llm=stub_agent_llm())
+
+    response = await agent.run("live sheep")
+
+    assert str(response) == "0104.10.10"
+    tool_step, answer_step = registry.spans("agent_step")
+    assert tool_step["attributes"]["tool_calls"] == ["rag_tool"]
+    assert answer_step["attributes"]["tool_calls"] == []
+    assert registry.get("ragbot_agent_tool_calls_total").value(tool="rag_tool") == 1
+    assert registry.get(metrics.TOKENS).value(stage="agent_step", kind="prompt") > 0
@@ -0,0 +1,24 @@
+import json
+
+from sg_trade_ragbot.benchmarks.ann import AnnBenchmarkConfig, main, run_ann_benchmark
+
+
+def test_recall_rises_with_probes_and_reaches_exact():
+    config = AnnBenchmarkConfig(rows=[2000], dim=16, queries=20, n_lists=16, n_probes=[1, 16])
+
+    report = run_ann_benchmark(config)
+
+    (result,) = report.results
+    assert result.rows == 2000 and result.n_lists == 16
+    one, every = result.probes
+    assert one.recall_at_k <= every.recall_at_k == 1.0
+    assert one.latency.p50_ms <= one.latency.max_ms
+
+
+def test_cli_writes_json_report(tmp_path):
+    output = tmp_path / "ann.json"
+
+    main(["--rows", "500", "--dim", "8", "--queries", "5", "--n-probes", "1", "2", "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert [probe["n_probe"] for probe in report["results"][0]["probes"]] == [1, 2]
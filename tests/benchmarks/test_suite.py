@@ -0,0 +1,59 @@
+import json
+
+from llama_index.core import Settings
+
+from sg_trade_ragbot.benchmarks.stubs import HashingEmbedding
+from sg_trade_ragbot.benchmarks.suite import STAGES, BenchmarkConfig, main, run_benchmarks
+from sg_trade_ragbot.benchmarks.synthetic import synthetic_questions, synthetic_tariff_markdown
+from sg_trade_ragbot.parser.hs_codes import extract_tariff_lines
+from sg_trade_ragbot.tools import RAGTool
+
+TINY = dict(chapters=2, headings_per_chapter=2, lines_per_heading=3, pdf_pages=1, queries=3, repeats=1)
+
+
+def test_hashing_embedding_is_deterministic_and_topical():
+    embed = HashingEmbedding(embed_dim=64)
+
+    sheep = embed.get_text_embedding("live sheep and goats")
+
+    assert sheep == HashingEmbedding(embed_dim=64).get_text_embedding("live sheep and goats")
+    assert len(sheep) == 64
+    assert embed.similarity(sheep, embed.get_query_embedding("sheep")) > \
+        embed.similarity(sheep, embed.get_query_embedding("solar panels"))
+
+
+def test_synthetic_markdown_parses_as_tariff_lines():
+    markdown = synthetic_tariff_markdown(chapters=2, headings_per_chapter=3, lines_per_heading=4, seed=1)
+
+    lines = extract_tariff_lines(markdown)
+
+    assert markdown == synthetic_tariff_markdown(chapters=2, headings_per_chapter=3, lines_per_heading=4, seed=1)
+    assert len([line for line in lines if len(line.hs_code) == 8]) == 2 * 3 * 4
+    assert len(synthetic_questions(markdown, 5)) == 5
+
+
+def test_run_benchmarks_reports_every_stage_and_restores_settings(tmp_path):
+    embed_model, llm, processed_dir = Settings._embed_model, Settings._llm, RAGTool.PROCESSED_DATA_DIR
+
+    report = run_benchmarks(BenchmarkConfig(**TINY), workdir=tmp_path)
+
+    assert set(report.stages) == set(STAGES)
+    for stage in report.stages.values():
+        assert stage.runs >= 1
+        assert stage.items >= stage.runs
+        assert stage.latency.p50_ms <= stage.latency.p99_ms <= stage.latency.max_ms
+        assert stage.peak_rss_mb > 0
+    assert report.stages["_rag_tool_helper"].runs == TINY["queries"]
+    assert (Settings._embed_model, Settings._llm, RAGTool.PROCESSED_DATA_DIR) == (embed_model, llm, processed_dir)
+    assert RAGTool._INDEX is None
+
+
+def test_cli_writes_json_report(tmp_path):
+    output = tmp_path / "report.json"
+
+    main(["--chapters", "1", "--queries", "2", "--repeats", "1",
+          "--stages", "_load_index", "_rag_tool_helper", "--workdir", str(tmp_path / "work"), "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert set(report["stages"]) == {"_load_index", "_rag_tool_helper"}
+    assert report["config"]["chapters"] == 1
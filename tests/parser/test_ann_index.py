@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from sg_trade_ragbot.benchmarks.synthetic import synthetic_embeddings
+from sg_trade_ragbot.parser.ann_index import IVFIndex, default_n_lists
+from sg_trade_ragbot.parser.numpy_vector_store import NumpyVectorStore
+
+
+def _store(rows=2000, dim=16, **kwargs):
+    matrix, queries = synthetic_embeddings(rows, dim, queries=20, spread=0.5, seed=1)
+    node_ids = [f"n{i}" for i in range(rows)]
+    return NumpyVectorStore(matrix=matrix, node_ids=node_ids, ref_doc_ids=node_ids, **kwargs), queries.tolist()
+
+
+def test_ivf_lists_partition_the_sorted_matrix():
+    matrix, _ = synthetic_embeddings(1000, 8, seed=2)
+
+    ivf, order = IVFIndex.build(matrix, n_lists=10)
+    sorted_matrix = matrix[order]
+
+    assert sorted(order.tolist()) == list(range(1000))
+    assert ivf.n_lists == 10 and ivf.n_rows == 1000
+    for i in range(ivf.n_lists):
+        rows = sorted_matrix[ivf.offsets[i]:ivf.offsets[i + 1]]
+        assert (np.argmax(rows @ ivf.centroids.T, axis=1) == i).all()
+    assert default_n_lists(10_000) == 400
+
+
+def test_ann_query_matches_exact_search_with_enough_probes():
+    store, queries = _store()
+    ivf = store.build_ann(n_lists=20)
+
+    for embedding in queries:
+        exact = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=5), exact=True)
+        assert store.ann_query(embedding, 5, n_probe=ivf.n_lists).ids == exact.ids
+
+    recall = np.mean([
+        len(set(store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=5)).ids)
+            & set(store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=5), exact=True).ids)) / 5
+        for embedding in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_ann_query_sees_added_and_deleted_rows():
+    store, queries = _store(rows=500)
+    store.build_ann(n_lists=10)
+    added = TextNode(id_="new", text="new", embedding=queries[0],
+                     relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id="new_doc")})
+
+    store.add([added])
+    assert store.query(VectorStoreQuery(query_embedding=queries[0], similarity_top_k=1)).ids == ["new"]
+
+    store.delete("new_doc")
+    assert "new" not in store.query(VectorStoreQuery(query_embedding=queries[0], similarity_top_k=5)).ids
+
+
+def test_small_stores_stay_exact_unless_lists_are_given():
+    store, _ = _store(rows=100)
+
+    assert store.build_ann() is None
+    assert store.build_ann(n_lists=4).n_lists == 4
+
+
+def test_ann_index_persists_and_reloads(tmp_path, monkeypatch):
+    store, queries = _store(ann=True, ann_lists=20, ann_probe=3)
+    store.persist(str(tmp_path / "default__vector_store.json"))
+    assert (tmp_path / "default__vector_store.ivf.npz").exists()
+
+    loaded = NumpyVectorStore.from_persist_dir(tmp_path)
+    assert loaded.ann and loaded.ann_lists == 20 and loaded.ann_probe == 3
+    assert loaded._ivf.n_lists == 20
+    query = VectorStoreQuery(query_embedding=queries[0], similarity_top_k=5)
+    assert loaded.query(query).ids == store.query(query).ids
+
+    monkeypatch.setenv("RAGBOT_ANN_PROBE", "7")
+    assert NumpyVectorStore.from_persist_dir(tmp_path).ann_probe == 7
+
+    # updates keep the trained lists, disabling ann removes the index file
+    loaded.add([TextNode(id_="new", text="new", embedding=queries[1])])
+    loaded.persist(str(tmp_path / "default__vector_store.json"))
+    reloaded = NumpyVectorStore.from_persist_dir(tmp_path)
+    assert reloaded._ivf.n_rows == 2001
+    np.testing.assert_array_equal(reloaded._ivf.centroids, store._ivf.centroids)
+
+    reloaded.ann = False
+    reloaded.persist(str(tmp_path / "default__vector_store.json"))
+    assert not (tmp_path / "default__vector_store.ivf.npz").exists()
+    assert not NumpyVectorStore.from_persist_dir(tmp_path).ann
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_ann_search_on_mmapped_store(tmp_path, dtype):
+    store, queries = _store(dtype=dtype, ann=True, ann_lists=10)
+    store.persist(str(tmp_path / "default__vector_store.json"))
+
+    loaded = NumpyVectorStore.from_persist_dir(tmp_path)
+    result = loaded.batch_query(queries[:3], similarity_top_k=4)
+
+    assert isinstance(loaded._matrix, np.memmap)
+    assert [len(r.ids) for r in result] == [4, 4, 4]
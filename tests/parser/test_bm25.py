@@ -0,0 +1,23 @@
+from sg_trade_ragbot.parser.bm25 import BM25Index, tokenize
+
+
+def test_tokenize_keeps_hs_codes_whole():
+    assert tokenize("Heading 0104.10.10: Live sheep, of the 01.04 kind") == [
+        "heading", "01041010", "live", "sheep", "0104", "kind"
+    ]
+
+
+def test_bm25_ranks_exact_terms_and_roundtrips(tmp_path):
+    bm25 = BM25Index.from_texts([
+        ("sheep", "0104.10.10 Live sheep, pure-bred breeding animals"),
+        ("goats", "0104.20.10 Live goats, pure-bred breeding animals"),
+        ("panels", "8541.43.00 Photovoltaic cells assembled in modules or made up into panels"),
+    ])
+
+    assert [node_id for node_id, _ in bm25.query("01041010", top_k=3)] == ["sheep"]
+    assert bm25.query("photovoltaic panels", top_k=1)[0][0] == "panels"
+    assert bm25.query("nothing matches", top_k=3) == []
+
+    path = tmp_path / "bm25.json"
+    bm25.save(path)
+    assert BM25Index.load(path).query("goats", top_k=1) == bm25.query("goats", top_k=1)
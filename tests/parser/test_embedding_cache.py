@@ -0,0 +1,62 @@
+from llama_index.core import MockEmbedding, Settings
+
+from sg_trade_ragbot.parser.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_FILENAME
+from sg_trade_ragbot.parser.ingestion import build_and_persist_index
+
+
+def test_embedding_cache_roundtrip_and_eviction(tmp_path):
+    """
+    Stored vectors should come back unchanged, and the cache should evict the
+    least recently used entries once it grows past max_entries.
+    """
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_entries=2)
+
+    key_a = EmbeddingCache.make_key("a", "model", "params")
+    key_b = EmbeddingCache.make_key("b", "model", "params")
+    key_c = EmbeddingCache.make_key("c", "model", "params")
+
+    cache.put_many({key_a: [0.1, 0.2], key_b: [0.3, 0.4]})
+    assert cache.get_many([key_a]) == {key_a: [0.1, 0.2]}
+
+    # a was touched most recently, so b is the one evicted
+    cache.put_many({key_c: [0.5, 0.6]})
+    assert len(cache) == 2
+    assert set(cache.get_many([key_a, key_b, key_c])) == {key_a, key_c}
+    assert cache.misses == 1
+
+    # key depends on model and chunking parameters too
+    assert EmbeddingCache.make_key("a", "other-model", "params") != key_a
+    assert EmbeddingCache.make_key("a", "model", "other-params") != key_a
+
+    cache.close()
+
+
+def test_build_and_persist_index_reuses_cached_embeddings(tmp_path, monkeypatch):
+    """
+    A second build over unchanged markdown should not call the embedding model.
+    """
+    embed_model = MockEmbedding(embed_dim=8)
+    monkeypatch.setattr(Settings, "_embed_model", embed_model, raising=False)
+
+    calls = []
+    original = MockEmbedding.get_text_embedding_batch
+
+    def counting_batch(self, texts, **kwargs):
+        calls.append(len(texts))
+        return original(self, texts, **kwargs)
+    monkeypatch.setattr(MockEmbedding, "get_text_embedding_batch", counting_batch)
+
+    md_dir = tmp_path / "mds"
+    md_dir.mkdir()
+    (md_dir / "doc.md").write_text("# Chapter 1\nLive animals\n\n# Chapter 2\nMeat", encoding="utf-8")
+
+    cache_dir = tmp_path / "cache"
+    first_out = tmp_path / "processed_first"
+    build_and_persist_index(md_dir, first_out, cache_dir=cache_dir)
+    assert sum(calls) > 0
+    assert (cache_dir / EMBEDDING_CACHE_FILENAME).exists()
+
+    calls.clear()
+    second_out = tmp_path / "processed_second"
+    build_and_persist_index(md_dir, second_out, cache_dir=cache_dir)
+    assert sum(calls) == 0
@@ -0,0 +1,52 @@
+from sg_trade_ragbot.parser.hs_codes import (
+    HSCodeIndex,
+    build_hs_code_index,
+    extract_tariff_lines,
+    format_code,
+    HS_CODE_INDEX_FILENAME,
+)
+
+SAMPLE_MD = """
+## Chapter 1 Live animals
+
+|HS Code|Description|Unit|Customs Duty|Excise Duty|
+|---|---|---|---|---|
+|**01.04**|Live sheep and goats.||||
+|0104.10|- Sheep:||||
+|0104.10.10|- - Pure-bred breeding animals|kg|Free|Free|
+|0104.10.90|- - Other|kg|Free|Free|
+|0105.11.10|- - - Breeding fowls|kg|Free|Free|
+
+Published 2022 by Singapore Customs.
+0201.10.00 Carcasses and half-carcasses of bovine animals
+"""
+
+
+def test_extract_tariff_lines_reads_table_and_text_rows():
+    lines = {line.hs_code: line for line in extract_tariff_lines(SAMPLE_MD, source="stcced.md")}
+
+    assert set(lines) == {"0104", "010410", "01041010", "01041090", "01051110", "02011000"}
+    assert lines["01041010"].description == "- - Pure-bred breeding animals"
+    assert lines["01041010"].unit == "kg"
+    assert lines["01041010"].customs_duty == "Free"
+    assert lines["02011000"].description.startswith("Carcasses")
+    assert lines["0104"].source == "stcced.md"
+
+
+def test_hs_code_index_exact_prefix_and_description(tmp_path):
+    md_dir = tmp_path / "intermediate"
+    md_dir.mkdir()
+    (md_dir / "stcced.md").write_text(SAMPLE_MD, encoding="utf-8")
+
+    path = build_hs_code_index(md_dir, tmp_path / "processed")
+    assert path.name == HS_CODE_INDEX_FILENAME
+
+    index = HSCodeIndex.load(path)
+    assert index.exact("0104.10.10").unit == "kg"
+    assert [format_code(line.hs_code) for line in index.prefix("0104.10")] == [
+        "0104.10", "0104.10.10", "0104.10.90"
+    ]
+    assert len(index.prefix("01")) == 5
+    assert len(index.prefix("01", limit=2)) == 2
+    assert index.prefix("99") == []
+    assert [line.hs_code for line in index.by_description("Pure-bred breeding animals")] == ["01041010"]
@@ -0,0 +1,88 @@
+from llama_index.core import Document
+from llama_index.core.schema import NodeRelationship
+
+from sg_trade_ragbot.parser.hs_hierarchy import HSHierarchyNodeParser, is_leaf, last_block_start, split_hs_blocks
+
+TARIFF_MD = """Front matter
+
+## SECTION I
+LIVE ANIMALS; ANIMAL PRODUCTS
+
+### Chapter 1
+Live animals
+
+| 01.01 | Live horses, asses, mules and hinnies. | | |
+|0101.21.00|- - Pure-bred breeding animals|u|Free|
+|0101.29.00|- - Other|u|Free|
+| 01.04 | Live sheep and goats. | | |
+|0104.10.10|- - Pure-bred breeding animals|u|Free|
+|0104.10.90|- - Other|u|Free|
+
+### Chapter 2
+Meat and edible meat offal
+"""
+
+
+def _words(text):
+    return text.split()
+
+
+def test_split_hs_blocks_tracks_section_chapter_and_heading():
+    blocks = split_hs_blocks(TARIFF_MD)
+
+    metadata = [block.metadata for block in blocks]
+    assert metadata[0] == {}
+    assert metadata[1] == {"hs_section": "I"}
+    assert metadata[2] == {"hs_section": "I", "hs_chapter": "01"}
+    assert metadata[3] == {"hs_section": "I", "hs_chapter": "01", "hs_heading": "0101",
+                           "hs_heading_title": "Live horses, asses, mules and hinnies."}
+    assert metadata[4]["hs_heading"] == "0104"
+    assert metadata[5] == {"hs_section": "I", "hs_chapter": "02"}
+    assert any("0104.10.10" in line for line in blocks[4].lines)
+    assert not any("0104" in line for line in blocks[3].lines)
+
+
+def test_split_at_last_block_start_matches_whole_text():
+    start, context = last_block_start(TARIFF_MD)
+    assert TARIFF_MD[start:].startswith("### Chapter 2")
+
+    def blocks(text, context=None):
+        return [(block.metadata, block.lines) for block in split_hs_blocks(text, context)]
+    assert blocks(TARIFF_MD[:start]) + blocks(TARIFF_MD[start:], context) == blocks(TARIFF_MD)
+
+    # text without a marker continues its context
+    continued = blocks("|0101.29.00|- - Other|u|Free|", {"hs_section": "I", "hs_chapter": "01", "hs_heading": "0101"})
+    assert continued == [({"hs_section": "I", "hs_chapter": "01", "hs_heading": "0101"},
+                          ["|0101.29.00|- - Other|u|Free|"])]
+    assert last_block_start("|0101.29.00|- - Other|u|Free|\n") == (0, {})
+
+
+def test_parser_links_small_leaves_to_heading_parents():
+    parser = HSHierarchyNodeParser(leaf_chunk_size=12, parent_chunk_size=200, tokenizer=_words)
+
+    nodes = parser.get_nodes_from_documents([Document(text=TARIFF_MD, metadata={"file_name": "stcced.md"})])
+
+    parents = [node for node in nodes if not is_leaf(node)]
+    leaves = [node for node in nodes if is_leaf(node)]
+    assert parents and leaves
+    for parent in parents:
+        children = parent.relationships[NodeRelationship.CHILD]
+        assert len(children) >= 2
+        child_leaves = [leaf for leaf in leaves if leaf.parent_node and leaf.parent_node.node_id == parent.node_id]
+        assert {leaf.node_id for leaf in child_leaves} == {child.node_id for child in children}
+        # leaves never cross the heading boundary of their parent
+        assert all(leaf.metadata["hs_heading"] == parent.metadata["hs_heading"] for leaf in child_leaves)
+
+    sheep = [leaf for leaf in leaves if "0104.10.10" in leaf.get_content()]
+    assert sheep[0].metadata["hs_subheading"] == "010410"
+    assert sheep[0].metadata["file_name"] == "stcced.md"
+    assert all(len(leaf.get_content().split()) <= 12 for leaf in leaves)
+
+
+def test_small_blocks_are_emitted_as_leaves_only():
+    parser = HSHierarchyNodeParser(tokenizer=_words)
+
+    nodes = parser.get_nodes_from_documents([Document(text=TARIFF_MD)])
+
+    assert all(is_leaf(node) for node in nodes)
+    assert len(nodes) == len(split_hs_blocks(TARIFF_MD))
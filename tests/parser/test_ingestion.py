@@ -1,5 +1,15 @@
-from sg_trade_ragbot.parser.ingestion import build_and_persist_index, pdf_to_markdown
-from llama_index.core import StorageContext, load_index_from_storage, VectorStoreIndex
+import json
+from pathlib import Path
+
+import pymupdf
+import pytest
+
+from sg_trade_ragbot.parser import ingestion
+from sg_trade_ragbot.parser.ingestion import build_and_persist_index, pdf_to_markdown, pdfs_to_markdown, stream_ingest
+from sg_trade_ragbot.parser.hs_hierarchy import HSHierarchyNodeParser
+from sg_trade_ragbot.parser.numpy_vector_store import storage_context_from_persist_dir
+from llama_index.core import MockEmbedding, Settings, load_index_from_storage, VectorStoreIndex
+from llama_index.core.schema import Document, NodeRelationship
 
 
 def test_build_and_persist_index_success(tmp_path):
@@ -25,7 +35,7 @@ def test_build_and_persist_index_success(tmp_path):
     entries = list(processed_dir.iterdir())
     assert len(entries) > 0, "Persisted index directory is empty"
 
-    storage_context = StorageContext.from_defaults(persist_dir=str(processed_dir))
+    storage_context = storage_context_from_persist_dir(processed_dir)
     loaded = load_index_from_storage(storage_context, index_id=f"{md_dir.stem}_index")
 
     # basic sanity checks for the loaded index
@@ -70,38 +80,261 @@ def test_pdf_to_markdown_skips_when_marker_present(tmp_path):
     assert marker_file.stat().st_mtime == marker_mtime_before
 
 
-def test_build_and_persist_index_skips_when_marker_present(tmp_path):
+@pytest.fixture
+def mock_embed_model(monkeypatch):
+    """Route index builds through an offline MockEmbedding and count embedded texts."""
+    embed_model = MockEmbedding(embed_dim=8)
+    monkeypatch.setattr(Settings, "_embed_model", embed_model, raising=False)
+
+    embedded = []
+    original = MockEmbedding.get_text_embedding_batch
+
+    def counting_batch(self, texts, **kwargs):
+        embedded.extend(texts)
+        return original(self, texts, **kwargs)
+    monkeypatch.setattr(MockEmbedding, "get_text_embedding_batch", counting_batch)
+
+    return embedded
+
+
+def test_build_and_persist_index_rebuilds_legacy_marker(tmp_path, mock_embed_model):
     """
-    Ensure build_and_persist_index skips building/persisting the index when a
-    marker file exists in the output directory. Verify skip by asserting the
-    marker mtime and directory entries are unchanged.
+    A legacy marker without a manifest (from before per-file manifests) should
+    not skip the build: the index is rebuilt once with a manifest and every
+    sidecar index, after which runs are incremental.
     """
+    md_dir = tmp_path / "mds"
+    md_dir.mkdir()
+    (md_dir / "a.md").write_text("|0104.10.10|- - Pure-bred breeding sheep|u|Free|Free|", encoding="utf-8")
+
+    processed_dir = tmp_path / "processed"
+    processed_dir.mkdir()
+    (processed_dir / f"{md_dir.stem}_index.ingested").write_text("Ingested: test\n", encoding="utf-8")
 
-    # prepare a markdown directory with one markdown file
+    build_and_persist_index(md_dir, processed_dir)
+
+    for name in (f"{md_dir.stem}_index.manifest.json", "bm25.json", "hs_codes.json"):
+        assert (processed_dir / name).exists(), name
+    assert mock_embed_model
+
+    mock_embed_model.clear()
+    build_and_persist_index(md_dir, processed_dir)
+    assert mock_embed_model == []
+
+
+def test_build_and_persist_index_is_incremental(tmp_path, mock_embed_model):
+    """
+    With a manifest present, adding or deleting one markdown file should only
+    touch that file's nodes in the persisted index.
+    """
     md_dir = tmp_path / "mds"
-    md_dir.mkdir(parents=True, exist_ok=True)
-    md_file = md_dir / "doc.md"
-    md_file.write_text("# title\n\ncontent", encoding="utf-8")
+    md_dir.mkdir()
+    (md_dir / "a.md").write_text("# Chapter 1\nLive animals", encoding="utf-8")
 
-    # prepare the processed/index output dir and pre-create the marker file
     processed_dir = tmp_path / "processed"
-    processed_dir.mkdir(parents=True, exist_ok=True)
+    build_and_persist_index(md_dir, processed_dir)
+    assert (processed_dir / f"{md_dir.stem}_index.manifest.json").exists()
+    assert (processed_dir / "bm25.json").exists()
 
-    index_id = f"{md_dir.stem}_index"
-    marker_file = processed_dir / f"{index_id}.ingested"
-    marker_file.write_text("Ingested: test\n", encoding="utf-8")
+    # unchanged tree: nothing is re-embedded or re-persisted
+    mock_embed_model.clear()
+    build_and_persist_index(md_dir, processed_dir)
+    assert mock_embed_model == []
 
-    # snapshot directory listing and marker mtime before running
-    entries_before = sorted(p.name for p in processed_dir.iterdir())
-    marker_mtime_before = marker_file.stat().st_mtime
+    # one new file: only its chunks are embedded
+    (md_dir / "b.md").write_text("# Chapter 2\nMeat and edible offal", encoding="utf-8")
+    build_and_persist_index(md_dir, processed_dir)
+    assert mock_embed_model and all("Meat" in text for text in mock_embed_model)
 
-    # call the function under test
-    result = build_and_persist_index(md_dir, processed_dir)
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    loaded = load_index_from_storage(storage_context, index_id=f"{md_dir.stem}_index")
+    sources = {Path(info.metadata["file_path"]).name for info in loaded.ref_doc_info.values()}
+    assert sources == {"a.md", "b.md"}
 
-    # assertions: function should return the processed_dir and should not have
-    # modified the marker or created new files
-    assert result == processed_dir
-    assert marker_file.exists()
-    assert marker_file.stat().st_mtime == marker_mtime_before
-    entries_after = sorted(p.name for p in processed_dir.iterdir())
-    assert entries_after == entries_before
+    # deleted file: its nodes leave the index
+    (md_dir / "a.md").unlink()
+    build_and_persist_index(md_dir, processed_dir)
+
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    loaded = load_index_from_storage(storage_context, index_id=f"{md_dir.stem}_index")
+    sources = {Path(info.metadata["file_path"]).name for info in loaded.ref_doc_info.values()}
+    assert sources == {"b.md"}
+
+
+def test_build_and_persist_index_adds_ann_index(tmp_path, mock_embed_model):
+    md_dir = tmp_path / "mds"
+    md_dir.mkdir()
+    (md_dir / "a.md").write_text("# Chapter 1\nLive animals\n\n# Chapter 2\nMeat and edible offal", encoding="utf-8")
+    processed_dir = tmp_path / "processed"
+
+    build_and_persist_index(md_dir, processed_dir)
+    assert not (processed_dir / "default__vector_store.ivf.npz").exists()
+
+    # unchanged markdown, but the persisted index gains the IVF lists
+    mock_embed_model.clear()
+    build_and_persist_index(md_dir, processed_dir, ann=True, ann_lists=2, ann_probe=1)
+    assert mock_embed_model == []
+    assert (processed_dir / "default__vector_store.ivf.npz").exists()
+
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    assert storage_context.vector_store.ann_probe == 1
+    loaded = load_index_from_storage(storage_context, index_id=f"{md_dir.stem}_index")
+    assert loaded.as_retriever(similarity_top_k=1).retrieve("meat")
+
+
+def test_build_and_persist_index_embeds_leaves_and_stores_parents(tmp_path, mock_embed_model, monkeypatch):
+    monkeypatch.setattr(ingestion, "HSHierarchyNodeParser",
+                        lambda: HSHierarchyNodeParser(leaf_chunk_size=16, tokenizer=str.split))
+    rows = "\n".join(f"|0104.10.{i:02d}|- - Sheep variety {i}|u|Free|" for i in range(12))
+    md_dir = tmp_path / "mds"
+    md_dir.mkdir()
+    (md_dir / "ch01.md").write_text(f"### Chapter 1\n| 01.04 | Live sheep and goats. |\n{rows}\n", encoding="utf-8")
+
+    processed_dir = tmp_path / "processed"
+    build_and_persist_index(md_dir, processed_dir)
+
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    nodes = list(storage_context.docstore.docs.values())
+    parents = [node for node in nodes if NodeRelationship.CHILD in node.relationships]
+    assert len(parents) == 1
+    assert len(storage_context.vector_store) == len(nodes) - 1
+    assert len(mock_embed_model) == len(nodes) - 1
+    assert not any(parents[0].get_content() in text for text in mock_embed_model)
+
+    # removing the file drops its parents from the docstore too
+    (md_dir / "ch01.md").unlink()
+    build_and_persist_index(md_dir, processed_dir)
+    assert storage_context_from_persist_dir(processed_dir).docstore.docs == {}
+
+
+def _write_pdf(path, page_texts):
+    doc = pymupdf.open()
+    for text in page_texts:
+        page = doc.new_page()
+        page.insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_pdf_to_markdown_only_converts_changed_pdfs(tmp_path, monkeypatch):
+    """
+    The per-PDF manifest should skip unchanged PDFs and reconvert edited ones.
+    """
+    converted = []
+    original = ingestion._convert_page_range
+
+    def recording_convert(pdf_path, pages):
+        converted.append(Path(pdf_path).name)
+        return original(pdf_path, pages)
+    monkeypatch.setattr(ingestion, "_convert_page_range", recording_convert)
+
+    out_dir = tmp_path / "intermediate"
+    first = tmp_path / "first.pdf"
+    second = tmp_path / "second.pdf"
+    _write_pdf(first, ["Chapter 1 Live animals"])
+    _write_pdf(second, ["Chapter 2 Meat"])
+
+    pdf_to_markdown(first, out_dir, workers=1)
+    pdf_to_markdown(second, out_dir, workers=1)
+    assert converted == ["first.pdf", "second.pdf"]
+
+    converted.clear()
+    pdf_to_markdown(first, out_dir, workers=1)
+    _write_pdf(second, ["Chapter 2 Meat and edible offal"])
+    pdf_to_markdown(second, out_dir, workers=1)
+    assert converted == ["second.pdf"]
+
+
+def test_pdfs_to_markdown_sharded_matches_serial(tmp_path):
+    """
+    Converting in page shards across a process pool should stitch pages back in
+    order and record each page's offset in the sidecar.
+    """
+    pdf_path = tmp_path / "book.pdf"
+    _write_pdf(pdf_path, [f"Page {n} heading 01.0{n}" for n in range(1, 6)])
+
+    serial_md = pdf_to_markdown(pdf_path, tmp_path / "serial", workers=1, pages_per_shard=100)
+    sharded_md = pdfs_to_markdown([pdf_path], tmp_path / "sharded", workers=2, pages_per_shard=2)[0]
+
+    text = sharded_md.read_text(encoding="utf-8")
+    assert text == serial_md.read_text(encoding="utf-8")
+
+    pages = json.loads(sharded_md.with_suffix(".pages.json").read_text(encoding="utf-8"))
+    assert [p["page"] for p in pages] == [1, 2, 3, 4, 5]
+    for page in pages:
+        assert text[page["offset"]:].startswith(f"Page {page['page']}")
+
+
+def test_stream_ingest_builds_index_and_manifests(tmp_path, mock_embed_model):
+    """
+    The streaming path should produce a loadable index with page numbers and
+    leave manifests behind that the incremental path treats as up to date.
+    """
+    pdf_path = tmp_path / "book.pdf"
+    _write_pdf(pdf_path, [f"# Chapter {n}\nGoods of heading 0{n}.01" for n in range(1, 5)])
+
+    md_dir = tmp_path / "intermediate"
+    processed_dir = tmp_path / "processed"
+    stream_ingest([pdf_path], md_dir, processed_dir, workers=2, pages_per_shard=1, embed_batch_size=2)
+
+    assert (md_dir / "book.md").exists()
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    loaded = load_index_from_storage(storage_context, index_id=f"{md_dir.stem}_index")
+    pages = {info.metadata["page_number"] for info in loaded.ref_doc_info.values()}
+    assert pages == {1, 2, 3, 4}
+
+    mock_embed_model.clear()
+    build_and_persist_index(md_dir, processed_dir)
+    assert mock_embed_model == []
+
+
+def test_stream_ingest_carries_hierarchy_across_pages(tmp_path, mock_embed_model):
+    pdf_path = tmp_path / "book.pdf"
+    _write_pdf(pdf_path, ["Section I", "Chapter 1", "01.01 Live horses", "0101.29.00 Other horses"])
+    md_dir = tmp_path / "intermediate"
+    stream_ingest([pdf_path], md_dir, tmp_path / "processed", workers=1, pages_per_shard=1)
+
+    nodes = list(storage_context_from_persist_dir(tmp_path / "processed").docstore.docs.values())
+    continued = [node for node in nodes if "0101.29.00" in node.get_content()]
+    assert continued
+    for node in continued:
+        assert {k: node.metadata.get(k) for k in ("hs_section", "hs_chapter", "hs_heading")} == {
+            "hs_section": "I", "hs_chapter": "01", "hs_heading": "0101"}
+
+    # the same chunks, metadata and page numbers as parsing the whole file
+    def chunks(nodes):
+        return sorted((node.get_content(), node.metadata["page_number"],
+                       sorted((k, v) for k, v in node.metadata.items() if k.startswith("hs_")))
+                      for node in nodes)
+    whole, _ = ingestion._parse_markdown([md_dir / "book.md"])
+    assert chunks(nodes) == chunks(whole)
+
+
+@pytest.mark.parametrize("chunking", ["hs_hierarchy", "flat"])
+def test_build_and_persist_index_keeps_page_numbers(tmp_path, mock_embed_model, chunking):
+    pdf_path = tmp_path / "book.pdf"
+    _write_pdf(pdf_path, [f"# Chapter {n}\nGoods of heading 0{n}.01" for n in range(1, 5)])
+    md_dir = tmp_path / "intermediate"
+    pdfs_to_markdown([pdf_path], md_dir, workers=1)
+
+    processed_dir = tmp_path / "processed"
+    build_and_persist_index(md_dir, processed_dir, chunking=chunking)
+
+    storage_context = storage_context_from_persist_dir(processed_dir)
+    nodes = list(storage_context.docstore.docs.values())
+    assert nodes
+    for node in nodes:
+        first_chapter = int(node.get_content().split("Chapter ", 1)[1][0])
+        assert node.metadata["page_number"] == first_chapter
+    # page numbers do not change what is embedded
+    assert not any("page_number" in text for text in mock_embed_model)
+
+
+@pytest.mark.parametrize("chunking", ["hs_hierarchy", "flat"])
+def test_parse_pipeline_does_not_cache_nodes(chunking):
+    # stream_ingest runs one pipeline over every page, its nodes must not pile up in a cache
+    pipeline = ingestion._build_pipeline(chunking)
+    for n in range(5):
+        pipeline.run(documents=[Document(text=f"# Chapter {n}\nGoods of heading 0{n}.01")])
+
+    assert pipeline.cache.cache.get_all(collection=pipeline.cache.collection) == {}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from llama_index.core import MockEmbedding, VectorStoreIndex, load_index_from_storage
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from sg_trade_ragbot.parser.numpy_vector_store import (
+    NumpyVectorStore,
+    new_storage_context,
+    storage_context_from_persist_dir,
+)
+
+
+def _node(node_id, embedding, ref_doc_id="doc"):
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=embedding,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)},
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_query_persist_and_mmap_reload(tmp_path, dtype):
+    store = NumpyVectorStore(dtype=dtype)
+    store.add([
+        _node("x", [1.0, 0.0, 0.0], "doc_a"),
+        _node("y", [0.0, 1.0, 0.0], "doc_a"),
+        _node("xy", [1.0, 1.0, 0.0], "doc_b"),
+    ])
+
+    result = store.query(VectorStoreQuery(query_embedding=[2.0, 0.1, 0.0], similarity_top_k=2))
+    assert result.ids == ["x", "xy"]
+    assert result.similarities[0] == pytest.approx(1.0, abs=1e-2)
+
+    store.persist(str(tmp_path / "default__vector_store.json"))
+    loaded = NumpyVectorStore.from_persist_dir(tmp_path)
+    assert isinstance(loaded._matrix, np.memmap)
+    assert loaded.dtype == dtype
+
+    loaded.delete("doc_a")
+    result = loaded.query(VectorStoreQuery(query_embedding=[1.0, 0.0, 0.0], similarity_top_k=3))
+    assert result.ids == ["xy"]
+
+    loaded.add([_node("z", [0.0, 0.0, 1.0], "doc_c")])
+    loaded.persist(str(tmp_path / "default__vector_store.json"))
+    assert len(NumpyVectorStore.from_persist_dir(tmp_path)) == 2
+
+
+def test_index_roundtrip_through_storage_context(tmp_path):
+    nodes = [TextNode(id_=f"n{i}", text=f"tariff line {i}") for i in range(5)]
+    index = VectorStoreIndex(nodes, storage_context=new_storage_context(), embed_model=MockEmbedding(embed_dim=4))
+    index.set_index_id("test_index")
+    index.storage_context.persist(persist_dir=str(tmp_path))
+
+    assert NumpyVectorStore.exists(tmp_path)
+    assert not (tmp_path / "default__vector_store.json").exists()
+
+    loaded = load_index_from_storage(storage_context_from_persist_dir(tmp_path), index_id="test_index",
+                                     embed_model=MockEmbedding(embed_dim=4))
+    results = loaded.as_retriever(similarity_top_k=2).retrieve("tariff")
+    assert len(results) == 2
+    assert all(result.node.get_content().startswith("tariff line") for result in results)
+
+
+def test_batch_query_matches_single_queries():
+    store = NumpyVectorStore()
+    store.add([
+        _node("x", [1.0, 0.0, 0.0]),
+        _node("y", [0.0, 1.0, 0.0]),
+        _node("xy", [1.0, 1.0, 0.0], "doc_b"),
+    ])
+    store.delete("doc_b")
+    queries = [[1.0, 0.2, 0.0], [0.0, 1.0, 0.3]]
+
+    batch = store.batch_query(queries, similarity_top_k=2)
+
+    for embedding, result in zip(queries, batch):
+        single = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=2))
+        assert result.ids == single.ids
+        assert result.similarities == pytest.approx(single.similarities)
+    assert "xy" not in batch[0].ids
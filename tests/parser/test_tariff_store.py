@@ -0,0 +1,76 @@
+import logging
+
+import pytest
+
+from sg_trade_ragbot.parser.hs_codes import build_hs_code_index
+from sg_trade_ragbot.parser.tariff_store import (
+    TARIFF_STORE_FILENAME,
+    build_tariff_store,
+    load_tariff_frame,
+    parse_duty,
+    tariff_frame,
+)
+from sg_trade_ragbot.utils.pydantic_models.models import TariffLine
+
+MARKDOWN = """
+| HS Code | Description | Unit | Customs Duty | Excise Duty |
+|---|---|---|---|---|
+| 01.04 | Sheep and goats. | | | |
+|0104.10.10|- - Pure-bred breeding|u|Free|Free|
+|2203.00.10|- Stout and porter|l|5%|$88.00/l|
+|8507.60.10|- - Lithium-ion batteries for vehicles|u|0%|$0.30/kg|
+"""
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Free", (0.0, 0.0)),
+    ("0%", (0.0, 0.0)),
+    ("5%", (5.0, None)),
+    ("$88.00/l", (None, 88.0)),
+    ("$1,200.50 per tonne", (None, 1200.5)),
+    ("10% or $0.30/kg", (10.0, 0.3)),
+    ("", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_duty(text, expected):
+    assert parse_duty(text) == expected
+
+
+def test_tariff_frame_columns():
+    frame = tariff_frame([TariffLine(hs_code="85076010", description="- - Lithium-ion batteries", excise_duty="$0.30/kg"),
+                          TariffLine(hs_code="0104", description="Sheep and goats.")])
+
+    assert list(frame["code"]) == ["01.04", "8507.60.10"]
+    assert list(frame["level"]) == ["heading", "tariff_line"]
+    assert list(frame["chapter"]) == ["01", "85"]
+    assert list(frame["excise_dutiable"]) == [False, True]
+    assert frame["search_text"].iloc[1] == "lithium ion batteries"
+
+
+def test_store_falls_back_to_hs_codes_json(tmp_path, monkeypatch, caplog):
+    md_dir = tmp_path / "md"
+    md_dir.mkdir()
+    (md_dir / "tariff.md").write_text(MARKDOWN)
+    build_hs_code_index(md_dir, tmp_path)
+
+    def no_engine(*args, **kwargs):
+        raise ImportError("Unable to find a usable engine")
+    monkeypatch.setattr("pandas.DataFrame.to_parquet", no_engine)
+
+    with caplog.at_level(logging.WARNING, logger="sg_trade_ragbot.parser.tariff_store"):
+        assert build_tariff_store(tmp_path) is None
+    assert "install pyarrow" in caplog.text
+    assert not (tmp_path / TARIFF_STORE_FILENAME).exists()
+    assert list(load_tariff_frame(tmp_path)["hs_code"]) == ["0104", "01041010", "22030010", "85076010"]
+    assert load_tariff_frame(tmp_path / "missing") is None
+
+
+def test_parquet_round_trip(tmp_path):
+    md_dir = tmp_path / "md"
+    md_dir.mkdir()
+    (md_dir / "tariff.md").write_text(MARKDOWN)
+    build_hs_code_index(md_dir, tmp_path)
+
+    assert build_tariff_store(tmp_path) == tmp_path / TARIFF_STORE_FILENAME
+    frame = load_tariff_frame(tmp_path)
+    assert list(frame["excise_specific"].fillna(-1)) == [-1, 0.0, 88.0, 0.3]
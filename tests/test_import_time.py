@@ -0,0 +1,64 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ENTRY_POINTS = (
+    "sg_trade_ragbot.agents.naive_agent",
+    "sg_trade_ragbot.tools.RAGTool",
+    "sg_trade_ragbot.utils.evals.provider",
+)
+
+# provider backends and their SDKs, imported by utils/models only when a client is built
+LAZY_MODULES = (
+    "langchain_core.tools",
+    "langchain_groq",
+    "langchain_openai",
+    "langchain_ollama",
+    "llama_index.llms.groq",
+    "llama_index.llms.openai",
+    "llama_index.llms.ollama",
+    "pymupdf4llm",
+    # only loaded by the tariff query tool on first use
+    "pandas",
+)
+
+# most of an entry point's import time is llama_index.core, so it is budgeted
+# relative to that, measured in the same process: machine speed and load cancel out
+BASELINE_MODULE = "llama_index.core"
+IMPORT_TIME_BUDGET_RATIO = 1.5
+# opt-in absolute budget in seconds, for runs on a known quiet machine
+IMPORT_TIME_BUDGET_SECONDS = os.environ.get("IMPORT_TIME_BUDGET_SECONDS")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def _import_times(module):
+    """Cumulative import time in seconds of every module imported by `import module`."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    # first run compiles bytecode, only the second one is timed
+    subprocess.run(command, env=env, capture_output=True, check=True)
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_imports_no_provider_backend(module):
+    times = _import_times(module)
+
+    assert module in times
+    assert [name for name in LAZY_MODULES if name in times] == []
+    assert BASELINE_MODULE in times
+    assert times[module] < IMPORT_TIME_BUDGET_RATIO * times[BASELINE_MODULE], (
+        f"{module} took {times[module]:.2f}s to import, {BASELINE_MODULE} {times[BASELINE_MODULE]:.2f}s")
+    if IMPORT_TIME_BUDGET_SECONDS:
+        assert times[module] < float(IMPORT_TIME_BUDGET_SECONDS), f"{module} took {times[module]:.2f}s to import"
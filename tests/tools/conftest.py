@@ -0,0 +1,61 @@
+import importlib
+
+import pytest
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+from sg_trade_ragbot.parser.numpy_vector_store import new_storage_context
+from sg_trade_ragbot.tools.answer_cache import AnswerCache
+from sg_trade_ragbot.utils.metrics import metrics
+
+DOCUMENTS = ["Live sheep and goats.", "Solar panels."]
+
+
+@pytest.fixture
+def embed_model():
+    return MockEmbedding(embed_dim=8)
+
+
+@pytest.fixture
+def rag_tool_module(tmp_path, monkeypatch, embed_model):
+    """
+    The RAGTool module with mock models, PROCESSED_DATA_DIR at tmp_path and
+    its module-level indexes and caches reset. Nothing is persisted yet.
+    """
+    module = importlib.import_module("sg_trade_ragbot.tools.RAGTool")
+    monkeypatch.setattr(Settings, "_embed_model", embed_model, raising=False)
+    monkeypatch.setattr(Settings, "_llm", MockLLM(max_tokens=5), raising=False)
+    monkeypatch.setattr(module, "PROCESSED_DATA_DIR", str(tmp_path), raising=False)
+    for name in ("_INDEX", "_INDEX_VERSION", "_BM25", "_HS_INDEX", "_HS_INDEX_VERSION"):
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(module, "_RETRIEVERS", {})
+    monkeypatch.setattr(module, "_QUERY_ENGINES", {})
+    monkeypatch.setattr(module, "_CONTEXT_BUDGETS", {})
+    monkeypatch.setattr(module, "_ANSWER_CACHE", AnswerCache())
+    return module
+
+
+@pytest.fixture
+def persist_index(tmp_path, rag_tool_module):
+    """Persist an index over the given texts or Documents where rag_tool_module loads it from."""
+    def persist(documents):
+        documents = [d if isinstance(d, Document) else Document(text=d) for d in documents]
+        index = VectorStoreIndex.from_documents(documents, storage_context=new_storage_context())
+        index.storage_context.persist(persist_dir=str(tmp_path))
+        return index
+    return persist
+
+
+@pytest.fixture
+def RAGTool(rag_tool_module, persist_index):
+    persist_index(DOCUMENTS)
+    return rag_tool_module
+
+
+@pytest.fixture
+def metrics_registry(monkeypatch, rag_tool_module):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    monkeypatch.setattr(rag_tool_module, "REGISTRY", registry)
+    return registry
@@ -0,0 +1,80 @@
+import importlib
+import time
+
+import pytest
+
+from sg_trade_ragbot.tools.answer_cache import AnswerCache
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput, RetrievalItem
+
+PARAMS = "top_k=3;mode=hybrid"
+
+
+def _output(answer):
+    return RAGToolOutput(answer=answer, retrievals=[RetrievalItem(id="n1", text="Live sheep")])
+
+
+def test_exact_and_semantic_hits_with_stats():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(PARAMS, "HS code for live sheep?", [1.0, 0.0], _output("0104.10"), latency=2.0)
+
+    assert cache.get_exact(PARAMS, "  hs code for LIVE sheep ") is not None
+    assert cache.get_exact("top_k=1;mode=vector", "HS code for live sheep?") is None
+
+    assert cache.get_similar(PARAMS, [0.99, 0.05]).answer == "0104.10"
+    assert cache.get_similar(PARAMS, [0.0, 1.0]) is None
+
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["saved_seconds"] == pytest.approx(4.0)
+
+
+def test_lru_ttl_and_index_version_invalidation(monkeypatch):
+    cache = AnswerCache(max_entries=2, ttl_seconds=10)
+    cache.sync_index_version("v1")
+    cache.put(PARAMS, "a", None, _output("a"), latency=1.0)
+    cache.put(PARAMS, "b", None, _output("b"), latency=1.0)
+    cache.get_exact(PARAMS, "a")
+    cache.put(PARAMS, "c", None, _output("c"), latency=1.0)
+
+    # b was least recently used
+    assert cache.get_exact(PARAMS, "b") is None
+    assert cache.get_exact(PARAMS, "a") is not None
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get_exact(PARAMS, "a") is None
+
+    cache.put(PARAMS, "d", None, _output("d"), latency=1.0)
+    cache.sync_index_version("v2")
+    assert len(cache) == 0
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    cache = AnswerCache()
+    cache.sync_index_version("v1")
+    cache.put(PARAMS, "live sheep", [0.6, 0.8], _output("0104.10"), latency=1.5)
+    cache.save(tmp_path / "answer_cache.json")
+
+    restored = AnswerCache()
+    restored.load(tmp_path / "answer_cache.json")
+    assert restored.index_version == "v1"
+    assert restored.get_similar(PARAMS, [0.6, 0.8]).answer == "0104.10"
+
+
+def test_rag_tool_helper_serves_cached_answers(monkeypatch):
+    RAGTool = importlib.import_module("sg_trade_ragbot.tools.RAGTool")
+    cache = AnswerCache()
+    monkeypatch.setattr(RAGTool, "_ANSWER_CACHE", cache)
+    monkeypatch.setattr(RAGTool, "_load_index", lambda: object())
+    monkeypatch.setattr(RAGTool, "_INDEX_VERSION", "v1")
+
+    cache.sync_index_version("v1")
+    cache.put("top_k=3;mode=hybrid", "Solar panels?", None, _output("8541.43"), latency=3.0)
+
+    output = RAGTool._rag_tool_helper("solar panels", top_k=3, use_hs_lookup=False)
+
+    assert output.answer == "8541.43"
+    assert RAGTool.get_answer_cache_stats()["exact_hits"] == 1
+    assert RAGTool.get_answer_cache_stats()["saved_seconds"] == pytest.approx(3.0)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import time
+
+import pytest
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+
+LLM_LATENCY = 0.2
+
+
+class _Response:
+    def __init__(self, answer):
+        self.answer = answer
+        self.source_nodes = []
+
+    def __str__(self):
+        return self.answer
+
+
+class _EmptyRetriever:
+    def retrieve(self, query_bundle):
+        return []
+
+
+class _SlowAsyncEngine:
+    """Stands in for a RetrieverQueryEngine whose LLM call takes LLM_LATENCY seconds."""
+
+    async def asynthesize(self, query_bundle, nodes):
+        await asyncio.sleep(LLM_LATENCY)
+        return _Response(f"answer to {query_bundle.query_str}")
+
+    def synthesize(self, query_bundle, nodes):
+        raise AssertionError("the async path must not call the blocking synthesize()")
+
+
+@pytest.fixture
+def RAGTool(rag_tool_module, monkeypatch):
+    monkeypatch.setattr(rag_tool_module, "_load_index", lambda: object())
+    monkeypatch.setattr(rag_tool_module, "_get_retriever", lambda top_k, retrieval_mode: _EmptyRetriever())
+    monkeypatch.setattr(rag_tool_module, "_get_query_engine",
+                        lambda top_k, retrieval_mode, streaming=False: _SlowAsyncEngine())
+    return rag_tool_module
+
+
+@pytest.mark.asyncio
+async def test_arag_tool_returns_rag_tool_json(RAGTool):
+    payload = await RAGTool.arag_tool("Live sheep?")
+
+    output = RAGToolOutput.model_validate_json(payload)
+    assert output.answer == "answer to Live sheep?"
+    assert json.loads(payload)["retrievals"] == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_overlap(RAGTool):
+    questions = [f"question {i}" for i in range(8)]
+
+    start = time.perf_counter()
+    outputs = await asyncio.gather(*(RAGTool._arag_tool_helper(q, use_hs_lookup=False) for q in questions))
+    elapsed = time.perf_counter() - start
+
+    assert [o.answer for o in outputs] == [f"answer to {q}" for q in questions]
+    # serialised calls would take len(questions) * LLM_LATENCY
+    assert elapsed < 3 * LLM_LATENCY
+
+
+@pytest.mark.asyncio
+async def test_blocking_loads_run_off_the_event_loop(RAGTool, monkeypatch):
+    def slow(result):
+        def load(*args, **kwargs):
+            time.sleep(LLM_LATENCY)
+            return result
+        return load
+    monkeypatch.setattr(RAGTool, "_hs_code_fast_path", slow(None))
+    monkeypatch.setattr(RAGTool, "_load_index", slow(object()))
+    # resolving the engine checks the index version on disk (and may reload it)
+    monkeypatch.setattr(RAGTool, "_get_query_engine", slow(_SlowAsyncEngine()))
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    output = await RAGTool._arag_tool_helper("Live sheep?")
+    ticker.cancel()
+
+    assert output.answer == "answer to Live sheep?"
+    # a blocked loop would only tick during synthesis, not while the HS code and
+    # vector indexes and the query engine load
+    assert ticks > 40
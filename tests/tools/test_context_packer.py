@@ -0,0 +1,46 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from sg_trade_ragbot.tools.context_packer import MIN_TRIMMED_TOKENS, pack_nodes, trim_to_sentences
+
+
+def _words(n):
+    # one token per word with the whitespace tokenizer below
+    return " ".join(["tok"] * n)
+
+
+def _tokenizer(text):
+    return text.split()
+
+
+def _scored(node_id, text, score):
+    return NodeWithScore(node=TextNode(id_=node_id, text=text), score=score)
+
+
+def test_trim_to_sentences_keeps_whole_sentences():
+    text = f"{_words(5)}. {_words(5)}. {_words(5)}."
+
+    assert trim_to_sentences(text, 12, _tokenizer) == f"{_words(5)}. {_words(5)}."
+    assert trim_to_sentences(text, 3, _tokenizer) == ""
+
+
+def test_pack_nodes_fills_budget_by_score_and_trims_last():
+    sentence = _words(MIN_TRIMMED_TOKENS) + "."
+    nodes = [
+        _scored("low", _words(50), 0.1),
+        _scored("best", _words(100), 0.9),
+        _scored("second", " ".join([sentence] * 3), 0.5),
+    ]
+
+    packed = pack_nodes(nodes, budget_tokens=100 + 2 * MIN_TRIMMED_TOKENS + 10, tokenizer=_tokenizer)
+
+    assert [n.node.node_id for n in packed] == ["best", "second"]
+    assert packed[1].node.get_content() == " ".join([sentence] * 2)
+    # the retrieved node itself is left untouched
+    assert nodes[2].node.get_content() == " ".join([sentence] * 3)
+
+
+def test_pack_nodes_drops_tiny_remainders_and_honours_max_nodes():
+    nodes = [_scored(str(i), _words(40), 1.0 - i / 10) for i in range(5)]
+
+    assert [n.node.node_id for n in pack_nodes(nodes, 100, tokenizer=_tokenizer)] == ["0", "1"]
+    assert [n.node.node_id for n in pack_nodes(nodes, None, max_nodes=3)] == ["0", "1", "2"]
@@ -0,0 +1,72 @@
+import importlib
+import os
+
+import pytest
+
+from sg_trade_ragbot.parser.hs_codes import HS_CODE_INDEX_FILENAME, HSCodeIndex
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput, TariffLine
+
+
+@pytest.fixture
+def RAGTool(monkeypatch, tmp_path):
+    module = importlib.import_module("sg_trade_ragbot.tools.RAGTool")
+    monkeypatch.setattr(module, "PROCESSED_DATA_DIR", str(tmp_path), raising=False)
+    monkeypatch.setattr(module, "_HS_INDEX_VERSION", None)
+
+    hs_index = HSCodeIndex([
+        TariffLine(hs_code="0104", description="Live sheep and goats."),
+        TariffLine(hs_code="01041010", description="- - Pure-bred breeding animals",
+                   unit="kg", customs_duty="Free", excise_duty="Free"),
+        TariffLine(hs_code="01041090", description="- - Other", unit="kg"),
+    ])
+    monkeypatch.setattr(module, "_HS_INDEX", hs_index, raising=False)
+
+    # the vector path must never be reached for these lookups
+    def fail_load_index():
+        raise AssertionError("vector index should not be loaded for HS code lookups")
+    monkeypatch.setattr(module, "_load_index", fail_load_index)
+
+    return module
+
+
+@pytest.mark.parametrize("question", ["0104.10.10", "HS code 01041010?", " 0104.10.10 "])
+def test_exact_code_lookup_skips_retrieval(RAGTool, question):
+    output = RAGTool._rag_tool_helper(question)
+
+    assert isinstance(output, RAGToolOutput)
+    assert [item.id for item in output.retrievals] == ["hs:0104.10.10"]
+    assert "Pure-bred breeding animals" in output.answer
+    assert "customs duty: Free" in output.answer
+
+
+def test_prefix_and_description_lookup(RAGTool):
+    heading = RAGTool._rag_tool_helper("01.04")
+    assert [item.id for item in heading.retrievals] == ["hs:01.04", "hs:0104.10.10", "hs:0104.10.90"]
+
+    by_description = RAGTool._rag_tool_helper("Pure-bred breeding animals")
+    assert [item.id for item in by_description.retrievals] == ["hs:0104.10.10"]
+
+
+def test_non_lookup_question_falls_through(RAGTool):
+    assert RAGTool._hs_code_fast_path("Is a solar IoT sensor under 8541 or 9025?") is None
+
+
+@pytest.mark.parametrize("question", ["2023", "01", "0104", "2023?"])
+def test_bare_short_numbers_are_not_codes(RAGTool, question):
+    assert RAGTool._hs_code_fast_path(question) is None
+
+
+@pytest.mark.parametrize("question", ["heading 0104", "HS 0104", "chapter 01", "01.04"])
+def test_short_codes_with_context_are_looked_up(RAGTool, question):
+    assert RAGTool._hs_code_fast_path(question).retrievals[0].id == "hs:01.04"
+
+
+def test_rebuilt_hs_index_is_reloaded(RAGTool, tmp_path):
+    path = tmp_path / HS_CODE_INDEX_FILENAME
+    HSCodeIndex([TariffLine(hs_code="01041010", description="- - Pure-bred breeding animals")]).save(path)
+    assert "Pure-bred" in RAGTool._hs_code_fast_path("0104.10.10").answer
+
+    # ingestion rewrites hs_codes.json; the next lookup serves the new table without touching the vector index
+    HSCodeIndex([TariffLine(hs_code="01041010", description="- - Breeding sheep, rebuilt")]).save(path)
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    assert "rebuilt" in RAGTool._hs_code_fast_path("0104.10.10").answer
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from llama_index.core import Settings
+from llama_index.core.llms import LLMMetadata, MockLLM
+
+from sg_trade_ragbot.tools.retrievers import HYBRID, VECTOR
+
+
+class _WindowLLM(MockLLM):
+    """A local model not in CONTEXT_WINDOWS, configured with its own context window."""
+    model: str = "local-model"
+    context_window: int = 4096
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, model_name=self.model)
+
+
+@pytest.fixture
+def RAGTool(rag_tool_module):
+    return rag_tool_module
+
+
+def test_query_engine_is_reused_per_configuration(RAGTool, persist_index):
+    persist_index(["Live sheep and goats.", "Solar panels."])
+
+    engine = RAGTool._get_query_engine(3, VECTOR)
+
+    assert RAGTool._get_query_engine(3, VECTOR) is engine
+    assert RAGTool._get_query_engine(2, VECTOR) is not engine
+    assert RAGTool._get_query_engine(3, VECTOR, response_mode="compact") is not engine
+    assert RAGTool._get_query_engine(3, VECTOR, llm=MockLLM()) is not engine
+
+
+def test_concurrent_first_calls_load_index_once(RAGTool, persist_index, monkeypatch):
+    persist_index(["Live sheep and goats."])
+
+    loads = []
+    original = RAGTool.load_index_from_storage
+
+    def counting_load(storage_context):
+        loads.append(storage_context)
+        return original(storage_context)
+    monkeypatch.setattr(RAGTool, "load_index_from_storage", counting_load)
+
+    barrier = threading.Barrier(8)
+    indexes = []
+
+    def worker():
+        barrier.wait()
+        indexes.append(RAGTool._load_index())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(index is indexes[0] for index in indexes)
+
+
+def test_index_change_reloads_and_drops_engines(RAGTool, persist_index):
+    persist_index(["Live sheep and goats."])
+    index = RAGTool._load_index()
+    engine = RAGTool._get_query_engine(3, VECTOR)
+
+    persist_index(["Live sheep and goats.", "Solar panels."])
+
+    assert RAGTool._load_index() is not index
+    assert RAGTool._get_query_engine(3, VECTOR) is not engine
+
+
+def test_warmup_builds_engines(RAGTool, persist_index):
+    persist_index(["Live sheep and goats."])
+
+    RAGTool.warmup(top_ks=(1, 3), retrieval_modes=(VECTOR, HYBRID))
+
+    assert RAGTool._INDEX is not None
+    assert len(RAGTool._QUERY_ENGINES) == 4
+
+
+def _window_llm(context_window):
+    llm = _WindowLLM()
+    llm.context_window = context_window
+    return llm
+
+
+def test_context_budget_is_cached_per_model_and_window(RAGTool, monkeypatch):
+    monkeypatch.setattr(Settings, "_llm", _window_llm(2048), raising=False)
+    small = RAGTool._context_budget()
+    monkeypatch.setattr(Settings, "_llm", _window_llm(8192), raising=False)
+    large = RAGTool._context_budget()
+
+    assert small < large
+    assert set(RAGTool._CONTEXT_BUDGETS) == {("local-model", 2048), ("local-model", 8192)}
+    assert RAGTool._context_budget(100) == 100
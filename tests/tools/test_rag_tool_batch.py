@@ -0,0 +1,84 @@
+import pytest
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+
+from sg_trade_ragbot.parser.bm25 import build_bm25_index
+from sg_trade_ragbot.tools.retrievers import HYBRID, VECTOR
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolError, RAGToolOutput
+
+
+class _CountingEmbedding(MockEmbedding):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        object.__setattr__(self, "queries", [])
+        object.__setattr__(self, "texts", [])
+
+    def _get_query_embedding(self, query):
+        self.queries.append(query)
+        return super()._get_query_embedding(query)
+
+    def _get_text_embeddings(self, texts):
+        self.texts.extend(texts)
+        return super()._get_text_embeddings(texts)
+
+
+@pytest.fixture
+def embed_model():
+    return _CountingEmbedding(embed_dim=8)
+
+
+@pytest.fixture
+def RAGTool(rag_tool_module, persist_index, embed_model, tmp_path):
+    index = persist_index(["0104.10.10 Live sheep, pure-bred breeding animals",
+                           "8541.43.00 Photovoltaic cells assembled in modules",
+                           "9025.19.19 Thermometers and other sensors"])
+    build_bm25_index(index.docstore, tmp_path)
+
+    embed_model.queries.clear()
+    embed_model.texts.clear()
+    return rag_tool_module
+
+
+@pytest.mark.parametrize("retrieval_mode", [VECTOR, HYBRID])
+def test_batch_returns_outputs_in_order_with_query_embeddings(RAGTool, retrieval_mode):
+    questions = ["live sheep", "solar panels", "thermometer"]
+    RAGTool.reset_tool_call_count()
+
+    outputs = RAGTool.rag_tool_batch(questions, top_k=2, retrieval_mode=retrieval_mode)
+
+    assert len(outputs) == 3
+    assert all(isinstance(output, RAGToolOutput) for output in outputs)
+    assert all(len(output.retrievals) == 2 for output in outputs)
+    # asymmetric models embed queries and documents differently
+    assert sorted(Settings.embed_model.queries) == sorted(questions)
+    assert Settings.embed_model.texts == []
+    assert RAGTool.get_tool_call_count() == 3
+
+
+def test_batch_reports_per_item_errors(RAGTool, monkeypatch):
+    engine = RAGTool._get_query_engine(3 * RAGTool.CONTEXT_CANDIDATES_PER_RESULT, HYBRID)
+    synthesize = engine.synthesize
+
+    def flaky_synthesize(query_bundle, nodes, **kwargs):
+        if query_bundle.query_str == "bad":
+            raise RuntimeError("synthesis failed")
+        return synthesize(query_bundle, nodes, **kwargs)
+    monkeypatch.setattr(engine, "synthesize", flaky_synthesize)
+
+    outputs = RAGTool.rag_tool_batch(["live sheep", "bad", "solar panels"])
+
+    assert isinstance(outputs[0], RAGToolOutput)
+    assert isinstance(outputs[1], RAGToolError)
+    assert "synthesis failed" in str(outputs[1])
+    assert isinstance(outputs[2], RAGToolOutput)
+
+
+def test_batch_serves_cached_answers_without_embedding(RAGTool):
+    RAGTool.rag_tool_batch(["live sheep"])
+    Settings.embed_model.queries.clear()
+
+    outputs = RAGTool.rag_tool_batch(["Live sheep?"])
+
+    assert isinstance(outputs[0], RAGToolOutput)
+    assert Settings.embed_model.queries == []
+    assert RAGTool.get_answer_cache_stats()["exact_hits"] == 1
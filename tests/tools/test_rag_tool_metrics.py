@@ -0,0 +1,38 @@
+import pytest
+
+from sg_trade_ragbot.tools.retrievers import VECTOR
+from sg_trade_ragbot.utils.metrics import metrics
+
+
+@pytest.fixture
+def RAGTool(RAGTool, metrics_registry):
+    return RAGTool
+
+
+def test_rag_tool_call_is_traced_per_stage(RAGTool):
+    RAGTool._rag_tool_helper("live sheep", top_k=1, use_hs_lookup=False, retrieval_mode=VECTOR)
+
+    registry = metrics.REGISTRY
+    request, = registry.spans("rag_tool")
+    assert request["attributes"]["source"] == "index"
+    for stage in ("embed", "retrieve", "pack", "synthesize", "convert"):
+        stage_span, = registry.spans(stage)
+        assert stage_span["parent_id"] == request["span_id"]
+        assert registry.get(metrics.STAGE_SECONDS).count(stage=stage) == 1
+
+    tokens = registry.get(metrics.TOKENS)
+    assert tokens.value(stage="embed", kind="input") > 0
+    assert tokens.value(stage="synthesize", kind="completion") == 5
+    assert registry.get("ragbot_tool_calls_total").value() == 1
+    assert 'ragbot_stage_duration_seconds_count{stage="synthesize"} 1' in registry.render_prometheus()
+
+
+def test_failed_call_counts_the_error(RAGTool, monkeypatch):
+    def broken(top_k, retrieval_mode, streaming=False):
+        raise RuntimeError("no engine")
+    monkeypatch.setattr(RAGTool, "_get_query_engine", broken)
+
+    with pytest.raises(RAGTool.RAGToolError):
+        RAGTool._rag_tool_helper("live sheep", use_hs_lookup=False, retrieval_mode=VECTOR)
+
+    assert metrics.REGISTRY.get(metrics.STAGE_ERRORS).value(stage="rag_tool", error="RuntimeError") == 1
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from llama_index.core import Document
+
+from sg_trade_ragbot.tools.retrievers import VECTOR
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+
+
+@pytest.fixture
+def RAGTool(rag_tool_module, persist_index, monkeypatch):
+    def no_synthesis(*args, **kwargs):
+        raise AssertionError("retrieval-only calls must not build a response synthesizer")
+    monkeypatch.setattr(rag_tool_module, "get_response_synthesizer", no_synthesis)
+
+    persist_index([Document(text="0104.10.10 Live sheep", metadata={"file_name": "ch01.md", "page_number": 3}),
+                   Document(text="8541.43.00 Photovoltaic modules",
+                            metadata={"file_name": "ch85.md", "page_number": 7})])
+    return rag_tool_module
+
+
+def test_helper_returns_scored_retrievals_without_synthesis(RAGTool):
+    output = RAGTool._rag_tool_helper("live sheep", top_k=2, use_hs_lookup=False,
+                                      retrieval_mode=VECTOR, retrieval_only=True)
+
+    assert output.answer == ""
+    assert len(output.retrievals) == 2
+    assert all(item.score is not None for item in output.retrievals)
+    assert {item.metadata["file_name"] for item in output.retrievals} == {"ch01.md", "ch85.md"}
+
+
+@pytest.mark.asyncio
+async def test_async_tool_json_includes_scores(RAGTool):
+    payload = await RAGTool.arag_tool("solar panels", top_k=1, retrieval_mode=VECTOR, retrieval_only=True)
+
+    retrieval = json.loads(payload)["retrievals"][0]
+    assert set(retrieval) == {"id", "text", "score", "metadata"}
+
+
+def test_batch_retrieval_only(RAGTool):
+    outputs = RAGTool.rag_tool_batch(["live sheep", "solar panels"], top_k=1,
+                                     retrieval_mode=VECTOR, retrieval_only=True)
+
+    assert all(isinstance(output, RAGToolOutput) and output.answer == "" for output in outputs)
+    assert all(len(output.retrievals) == 1 for output in outputs)
+
+
+def test_synthesised_json_omits_empty_details():
+    output = RAGToolOutput.model_validate({"answer": "0104.10", "retrievals": [{"id": "n1", "text": "Live sheep"}]})
+
+    assert json.loads(output.model_dump_json(exclude_none=True))["retrievals"] == [{"id": "n1", "text": "Live sheep"}]
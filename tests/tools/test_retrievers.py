@@ -0,0 +1,79 @@
+import pytest
+from llama_index.core import MockEmbedding, VectorStoreIndex
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import NodeRelationship, NodeWithScore, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from sg_trade_ragbot.parser.bm25 import BM25Index
+from sg_trade_ragbot.tools.retrievers import HybridRetriever, SmallToBigRetriever, reciprocal_rank_fusion
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    scores = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert max(scores, key=scores.get) == "b"
+    assert set(scores) == {"a", "b", "c", "d"}
+
+
+def _hybrid_retriever():
+    nodes = [
+        TextNode(id_="panels", text="8541.43.00 Photovoltaic cells assembled in modules"),
+        TextNode(id_="sensors", text="9025.19.19 Thermometers and other sensors"),
+        TextNode(id_="sheep", text="0104.10.10 Live sheep, pure-bred breeding animals"),
+    ]
+    index = VectorStoreIndex(nodes, embed_model=MockEmbedding(embed_dim=8))
+    bm25 = BM25Index.from_texts((node.node_id, node.get_content()) for node in nodes)
+
+    return HybridRetriever(
+        VectorIndexRetriever(index=index, similarity_top_k=3),
+        bm25,
+        index.docstore,
+        similarity_top_k=2,
+        candidate_k=3,
+    )
+
+
+def test_hybrid_retriever_surfaces_lexical_matches():
+    """
+    MockEmbedding gives every text the same vector, so only the BM25 side can
+    put the node with the exact code first.
+    """
+    results = _hybrid_retriever().retrieve("0104.10.10")
+
+    assert len(results) == 2
+    assert results[0].node.node_id == "sheep"
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retriever_async_matches_sync():
+    retriever = _hybrid_retriever()
+
+    results = await retriever.aretrieve("0104.10.10")
+
+    assert [r.node.node_id for r in results] == [r.node.node_id for r in retriever.retrieve("0104.10.10")]
+
+
+def test_small_to_big_merges_only_when_enough_siblings_match():
+    parent = TextNode(id_="heading", text="01.04 Live sheep and goats")
+    other = TextNode(id_="other_heading", text="01.01 Live horses")
+    leaves = {}
+    for owner, names in ((parent, ["s1", "s2", "s3"]), (other, ["h1", "h2", "h3", "h4", "h5"])):
+        for name in names:
+            leaf = TextNode(id_=name, text=name)
+            leaf.relationships[NodeRelationship.PARENT] = owner.as_related_node_info()
+            owner.relationships.setdefault(NodeRelationship.CHILD, []).append(leaf.as_related_node_info())
+            leaves[name] = leaf
+    docstore = SimpleDocumentStore()
+    docstore.add_documents([parent, other, *leaves.values()])
+
+    retriever = SmallToBigRetriever(base_retriever=None, docstore=docstore)
+    merged = retriever.merge([
+        NodeWithScore(node=leaves["h1"], score=0.95),
+        NodeWithScore(node=leaves["s1"], score=0.9),
+        NodeWithScore(node=leaves["s2"], score=0.8),
+        NodeWithScore(node=leaves["h2"], score=0.7),
+    ])
+
+    # 2 of 3 sheep leaves expand to the heading; 2 of 5 horse leaves stay small
+    assert [r.node.node_id for r in merged] == ["h1", "heading", "h2"]
+    assert merged[1].score == 0.9
@@ -0,0 +1,55 @@
+import pytest
+
+from sg_trade_ragbot.tools.retrievers import VECTOR
+from sg_trade_ragbot.utils.metrics import metrics
+from sg_trade_ragbot.utils.pydantic_models.models import RAGToolOutput
+
+
+@pytest.fixture
+def RAGTool(RAGTool, metrics_registry):
+    return RAGTool
+
+
+async def _collect(stream):
+    items = [item async for item in stream]
+    return items[:-1], items[-1]
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_deltas_then_output(RAGTool):
+    deltas, output = await _collect(RAGTool.astream_rag_tool("live sheep", top_k=1, retrieval_mode=VECTOR,
+                                                             use_hs_lookup=False))
+
+    assert isinstance(output, RAGToolOutput)
+    assert len(deltas) == 5
+    assert "".join(deltas) == output.answer
+    assert output.retrievals
+
+    seconds = metrics.REGISTRY.get(metrics.STAGE_SECONDS)
+    for stage in ("first_token", "synthesize", "rag_tool"):
+        assert seconds.count(stage=stage) == 1
+    assert seconds.sum(stage="first_token") <= seconds.sum(stage="rag_tool")
+    assert metrics.REGISTRY.get(metrics.TOKENS).value(stage="synthesize", kind="completion") == 5
+
+
+@pytest.mark.asyncio
+async def test_cached_answer_arrives_as_one_delta(RAGTool):
+    _, first = await _collect(RAGTool.astream_rag_tool("live sheep", top_k=1, retrieval_mode=VECTOR,
+                                                       use_hs_lookup=False))
+    deltas, second = await _collect(RAGTool.astream_rag_tool("live sheep", top_k=1, retrieval_mode=VECTOR,
+                                                             use_hs_lookup=False))
+
+    assert deltas == [first.answer]
+    assert second == first
+
+
+@pytest.mark.asyncio
+async def test_stream_wraps_errors(RAGTool, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("no engine")
+    monkeypatch.setattr(RAGTool, "_get_query_engine", broken)
+
+    with pytest.raises(RAGTool.RAGToolError):
+        await _collect(RAGTool.astream_rag_tool("live sheep", use_hs_lookup=False, retrieval_mode=VECTOR))
+
+    assert metrics.REGISTRY.get(metrics.STAGE_ERRORS).value(stage="rag_tool", error="RuntimeError") == 1
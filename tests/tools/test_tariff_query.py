@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from sg_trade_ragbot.agents.naive_agent import build_naive_agent
+from sg_trade_ragbot.benchmarks.stubs import stub_agent_llm
+from sg_trade_ragbot.benchmarks.synthetic import synthetic_tariff_markdown
+from sg_trade_ragbot.parser.hs_codes import build_hs_code_index
+from sg_trade_ragbot.parser.tariff_store import load_tariff_frame
+from sg_trade_ragbot.tools import tariff_query as module
+from sg_trade_ragbot.tools.tariff_query import TariffTable, tariff_query
+
+MARKDOWN = """
+| HS Code | Description | Unit | Customs Duty | Excise Duty |
+|---|---|---|---|---|
+| 22.03 | Beer made from malt. | | | |
+|2203.00.10|- Stout and porter|l|Free|$60.00/l|
+|2203.00.90|- Other beer|l|Free|$60.00/l|
+| 85.07 | Electric accumulators. | | | |
+|8507.60.10|- - Lithium-ion batteries for vehicles|u|Free|Free|
+|8507.60.90|- - Other lithium-ion batteries|u|Free|Free|
+|8703.80.10|- - Electric motor cars|u|Free|20%|
+"""
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    md_dir = tmp_path / "md"
+    md_dir.mkdir()
+    (md_dir / "tariff.md").write_text(MARKDOWN)
+    build_hs_code_index(md_dir, tmp_path)
+    monkeypatch.setattr(module, "PROCESSED_DATA_DIR", tmp_path)
+    monkeypatch.setattr(module, "_TABLE", None)
+    monkeypatch.setattr(module, "_TABLE_VERSION", None)
+    return tmp_path
+
+
+def codes(frame):
+    return list(frame["code"])
+
+
+def test_filters(index_dir):
+    table = TariffTable.load(index_dir)
+
+    assert codes(table.filter(chapter="85")) == ["85.07", "8507.60.10", "8507.60.90"]
+    assert codes(table.filter(code_prefix="8507.60", level="tariff_line")) == ["8507.60.10", "8507.60.90"]
+    assert codes(table.filter(excise_dutiable=True)) == ["2203.00.10", "2203.00.90", "8703.80.10"]
+    assert codes(table.filter(min_excise_rate=10)) == ["8703.80.10"]
+    assert codes(table.filter(keywords=["lithium-ion", "vehicles"])) == ["8507.60.10"]
+    assert codes(table.filter(keywords=["stout", "vehicles"], match_all=False)) == ["2203.00.10", "8507.60.10"]
+    # whole words only, "batter" does not match "batteries"
+    assert codes(table.filter(keywords=["batter"])) == []
+    with pytest.raises(ValueError):
+        table.filter(level="section")
+
+
+def test_tool_returns_exact_total_and_truncates(index_dir):
+    result = json.loads(tariff_query(dutiable="excise", limit=2))
+
+    assert result["total"] == 3 and result["truncated"] is True
+    assert [line["hs_code"] for line in result["lines"]] == ["22030010", "22030090"]
+    assert result["lines"][0]["excise_duty"] == "$60.00/l"
+
+
+def test_tool_errors_are_strings(index_dir, tmp_path, monkeypatch):
+    assert tariff_query(dutiable="vat").startswith("Tariff query error:")
+    monkeypatch.setattr(module, "PROCESSED_DATA_DIR", tmp_path / "empty")
+    assert tariff_query(chapter="85").startswith("Tariff query error:")
+
+
+def test_table_reloads_after_ingestion(index_dir):
+    assert json.loads(tariff_query(chapter="01"))["total"] == 0
+
+    (index_dir / "md" / "tariff.md").write_text(synthetic_tariff_markdown(chapters=2, headings_per_chapter=2,
+                                                                         lines_per_heading=2))
+    build_hs_code_index(index_dir / "md", index_dir)
+
+    assert json.loads(tariff_query(chapter="1"))["total"] == len(load_tariff_frame(index_dir).query("chapter == '01'"))
+
+
+def test_agent_gets_the_tool_on_request():
+    assert [tool.metadata.name for tool in build_naive_agent(stub_agent_llm()).tools] == ["rag_tool"]
+
+    agent = build_naive_agent(stub_agent_llm(), with_tariff_query=True)
+
+    assert [tool.metadata.name for tool in agent.tools] == ["rag_tool", "tariff_query"]
+    assert "tariff_query" in agent.system_prompt
+    assert "dutiable" in agent.tools[1].metadata.get_parameters_dict()["properties"]
@@ -0,0 +1,158 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from typing import Optional
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sg_trade_ragbot.agents import naive_agent
+from sg_trade_ragbot.utils.evals import provider
+from sg_trade_ragbot.utils.models import models
+from sg_trade_ragbot.utils.models.models import ClientOptions, reset_llm_clients
+from sg_trade_ragbot.utils.pydantic_models.models import AgentAnswer, RAGToolOutput, RetrievalItem
+
+RESPONSE = AgentAnswer(answer="0104.10.10", tool_outputs=[
+    RAGToolOutput(answer="Live sheep: 0104.10.10", retrievals=[RetrievalItem(id="n1", text="0104.10.10 Sheep")]),
+    RAGToolOutput(answer="Sheep", retrievals=[RetrievalItem(id="n1", text="0104.10.10 Sheep"),
+                                              RetrievalItem(id="n2", text="0104.20 Goats")]),
+], prompt_tokens=120, completion_tokens=8)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_provider():
+    provider.reset_cache()
+    yield
+    provider.reset_cache()
+
+
+@pytest.mark.asyncio
+async def test_call_api_builds_agents_and_ingests_once_per_process():
+    def make_agent(model_name, local, streaming=False):
+        return MagicMock()
+
+    with patch.object(provider, "ingestion") as mock_ingestion, \
+         patch.object(provider, "RAGTool") as mock_rag_tool, \
+         patch.object(provider, "configure_settings") as mock_configure, \
+         patch.object(provider, "run_naive_agent", AsyncMock(return_value=RESPONSE)), \
+         patch.object(provider, "get_naive_agent", side_effect=make_agent) as mock_get_agent:
+        options = {"config": {"model_name": "gpt-4o", "local": False}}
+        results = await asyncio.gather(*(provider.call_api(f"q{i}", options, None) for i in range(5)))
+        other = await provider.call_api("q", {"config": {"model_name": "llama3.1:latest", "local": True}}, None)
+
+    assert mock_ingestion.run.call_count == 1
+    assert mock_rag_tool.warmup.call_count == 1
+    assert mock_configure.call_count == 1
+    assert [call.args for call in mock_get_agent.call_args_list] == [("gpt-4o", False), ("llama3.1:latest", True)]
+    assert [call.kwargs for call in mock_get_agent.call_args_list] == [{"streaming": False}] * 2
+
+    assert all(result["output"] == "0104.10.10" for result in results)
+    assert [item["id"] for item in results[0]["retrievals"]] == ["n1", "n2"]
+    assert results[0]["metadata"]["tool_calls"] == 2
+    assert results[0]["tokenUsage"] == {"prompt": 120, "completion": 8, "total": 128}
+    metadata = [result["metadata"] for result in results]
+    assert [m["agent_cached"] for m in metadata].count(False) == 1
+    assert all(m["inference_seconds"] >= 0 and m["setup_seconds"] >= 0 for m in metadata)
+    assert other["metadata"]["agent_cached"] is False
+    assert other["metadata"]["ingestion_seconds"] == 0.0
+
+
+def _chunk(delta, finish_reason=None):
+    return {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI chat completions endpoint. Streamed (agent) requests get a
+    rag_tool call, then the final answer once the tool result is in; plain
+    requests (the tool's synthesizer) get a completion.
+    """
+    protocol_version = "HTTP/1.1"
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if not body.get("stream"):
+            content_type = "application/json"
+            payload = json.dumps({
+                "id": "c", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Live sheep: 0104.10.10"}}],
+            })
+        else:
+            content_type = "text/event-stream"
+            if body["messages"][-1]["role"] == "tool":
+                chunks = [_chunk({"role": "assistant", "content": "0104.10.10"}), _chunk({}, "stop")]
+            else:
+                call = {"index": 0, "id": "call_1", "type": "function",
+                        "function": {"name": "rag_tool", "arguments": json.dumps({"question": "live sheep"})}}
+                chunks = [_chunk({"role": "assistant", "tool_calls": [call]}), _chunk({}, "tool_calls")]
+            payload = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+        payload = payload.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def openai_server(monkeypatch):
+    _ChatCompletionsHandler.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_BASE", f"http://127.0.0.1:{server.server_port}/v1")
+    # a retry would paper over a request failing on a dead event loop
+    monkeypatch.setattr(models, "DEFAULT_CLIENT_OPTIONS", ClientOptions(max_retries=0))
+    reset_llm_clients()
+    _ChatCompletionsHandler.port = server.server_port
+    yield _ChatCompletionsHandler
+    reset_llm_clients()
+    server.shutdown()
+    server.server_close()
+
+
+def _synthesizing_rag_tool(question: str, top_k: int = 5, retrieval_mode: str = "hybrid",
+                           retrieval_only: bool = False, context_budget: Optional[int] = None) -> str:
+    """Answer a tariff question."""
+    raise AssertionError("agents call the async variant")
+
+
+async def _asynthesizing_rag_tool(question: str, top_k: int = 5, retrieval_mode: str = "hybrid",
+                                  retrieval_only: bool = False, context_budget: Optional[int] = None) -> str:
+    # like the real tool's synthesizer: a plain completion through the shared pool to another host than
+    # the agent's (e.g. a Groq agent and OpenAI synthesis), so its idle connection outlives the call
+    _, async_http_client = models._http_pool(models.DEFAULT_CLIENT_OPTIONS)
+    response = await async_http_client.post(f"http://localhost:{_ChatCompletionsHandler.port}/v1/chat/completions",
+                                            json={"model": "gpt-3.5-turbo", "messages": [
+                                                {"role": "user", "content": question}]})
+    answer = response.json()["choices"][0]["message"]["content"]
+    return RAGToolOutput(answer=answer, retrievals=[RetrievalItem(id="n1", text="0104.10.10 Sheep")]).model_dump_json()
+
+
+def test_cached_agent_answers_across_event_loops(openai_server, monkeypatch):
+    # promptfoo runs every call_api in a fresh event loop, the cached agent and pooled clients must survive that
+    monkeypatch.setattr(naive_agent, "rag_tool", _synthesizing_rag_tool)
+    monkeypatch.setattr(naive_agent, "arag_tool", _asynthesizing_rag_tool)
+    options = {"config": {"model_name": "gpt-4o", "local": False}}
+    with patch.object(provider, "ingestion"), patch.object(provider, "RAGTool"), \
+         patch.object(provider, "configure_settings"):
+        first = asyncio.run(provider.call_api("live sheep?", options, None))
+        second = asyncio.run(provider.call_api("live sheep?", options, None))
+
+    for result in (first, second):
+        assert "error" not in result
+        assert result["output"] == "0104.10.10"
+        assert [item["id"] for item in result["retrievals"]] == ["n1"]
+    assert second["metadata"]["agent_cached"] is True
+    # agent step, synthesis, agent step per call
+    assert openai_server.requests == 6
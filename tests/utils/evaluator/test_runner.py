@@ -0,0 +1,112 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from sg_trade_ragbot.utils.evals import runner
+from sg_trade_ragbot.utils.evals.runner import RateLimit, TokenBucket, load_eval_config, run_eval
+
+EVAL_CONFIGS = Path(runner.__file__).parent / "eval_configs"
+
+
+def test_load_eval_config_merges_rate_limits_and_default_vars(tmp_path):
+    (tmp_path / "prompt.txt").write_text("Classify: {{ query }}")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("""
+prompts:
+  - file://prompt.txt
+providers:
+  - id: python:provider.py
+    label: limited
+    config:
+      rate_limit:
+        tokens_per_minute: 1000
+  - python:other.py
+defaultTest:
+  vars:
+    ground_truth: "0104.10.10"
+tests:
+  - vars:
+      query: live sheep
+""")
+
+    config = load_eval_config(config_path, RateLimit(requests_per_minute=30))
+
+    assert config.prompts == ["Classify: {{ query }}"]
+    limited, other = config.providers
+    assert limited.rate_limit == RateLimit(requests_per_minute=30, tokens_per_minute=1000)
+    assert other.label == "python:other.py" and other.rate_limit == RateLimit(requests_per_minute=30)
+    case, = config.tests
+    assert case.id == "1" and case.vars == {"query": "live sheep", "ground_truth": "0104.10.10"}
+    assert runner.render_prompt(config.prompts[0], case.vars) == "Classify: live sheep"
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=6000)  # 100 per second
+    assert await bucket.acquire(6000) == 0.0
+
+    start = time.perf_counter()
+    await bucket.acquire(10)
+    assert time.perf_counter() - start >= 0.09
+
+    bucket.adjust(-50)
+    assert await bucket.acquire(50) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_stub_config_runs_offline_with_retries():
+    report = await run_eval(load_eval_config(EVAL_CONFIGS / "stub_config.yaml"), concurrency=4)
+
+    assert len(report.results) == 4
+    assert all(result.error is None and result.output == result.ground_truth for result in report.results)
+    assert report.providers["Stub: rate limited"].retries == 1
+    assert all(result.token_usage.total > 0 for result in report.results)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_429_exceptions(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "BACKOFF_BASE_SECONDS", 0.01)
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("prompts: ['{{query}}']\nproviders:\n  - id: python:unused.py\n    label: mock\ntests:\n"
+                           + "".join(f"  - vars: {{query: q{i}}}\n" for i in range(8)))
+
+    class RateLimitError(Exception):
+        status_code = 429
+
+    in_flight, peak, failed = 0, 0, set()
+
+    async def call_api(prompt, options, context):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if prompt not in failed:
+            failed.add(prompt)
+            raise RateLimitError("slow down")
+        return {"output": prompt.upper(), "tokenUsage": {"prompt": 3, "completion": 1}}
+
+    report = await run_eval(load_eval_config(config_path), concurrency=2, call_apis={"mock": call_api})
+
+    assert peak == 2
+    assert [result.output for result in report.results] == [f"Q{i}" for i in range(8)]
+    assert all(result.attempts == 2 and result.token_usage.total == 4 for result in report.results)
+    assert report.providers["mock"].total_tokens == 32
+
+
+@pytest.mark.asyncio
+async def test_non_rate_limit_errors_are_not_retried(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("prompts: ['{{query}}']\nproviders:\n  - id: python:unused.py\n    label: mock\n"
+                           "tests:\n  - vars: {query: q}\n")
+
+    async def call_api(prompt, options, context):
+        return {"error": "validation failed"}
+
+    report = await run_eval(load_eval_config(config_path), call_apis={"mock": call_api})
+
+    result, = report.results
+    assert (result.error, result.attempts, result.output) == ("validation failed", 1, None)
+    assert report.providers["mock"].errors == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from sg_trade_ragbot.utils.metrics.metrics import STAGE_ERRORS, STAGE_SECONDS, MetricsRegistry, record_tokens, span
+
+
+def test_span_records_histogram_errors_and_nesting():
+    registry = MetricsRegistry()
+
+    with span("rag_tool", registry=registry, top_k=3):
+        with span("retrieve", registry=registry) as inner:
+            inner.set(nodes=4)
+    with pytest.raises(KeyError):
+        with span("retrieve", registry=registry):
+            raise KeyError("missing node")
+
+    seconds = registry.get(STAGE_SECONDS)
+    assert seconds.count(stage="retrieve") == 2
+    assert seconds.count(stage="rag_tool") == 1
+    assert registry.get(STAGE_ERRORS).value(stage="retrieve", error="KeyError") == 1
+
+    outer, = registry.spans("rag_tool")
+    first, second = registry.spans("retrieve")
+    assert first["parent_id"] == outer["span_id"]
+    assert first["attributes"] == {"nodes": 4}
+    assert second["parent_id"] is None and second["error"] == "KeyError"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_spans_keep_their_own_parents():
+    registry = MetricsRegistry()
+
+    async def request(name):
+        with span(name, registry=registry):
+            await asyncio.sleep(0.01)
+            with span("synthesize", registry=registry):
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(request("a"), request("b"))
+
+    parents = {s["span_id"]: s["name"] for s in registry.spans() if s["name"] in ("a", "b")}
+    assert sorted(parents[s["parent_id"]] for s in registry.spans("synthesize")) == ["a", "b"]
+
+
+def test_prometheus_text_dump(tmp_path):
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="embed")
+    histogram.observe(0.5, stage="embed")
+    record_tokens("synthesize", "prompt", 120, registry=registry)
+    registry.counter("errors_total", "Errors", ("stage",)).inc(stage='say "hi"\n')
+
+    text = registry.render_prometheus()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="embed",le="1"} 2' in text
+    assert 'latency_seconds_bucket{stage="embed",le="+Inf"} 2' in text
+    assert 'latency_seconds_sum{stage="embed"} 0.55' in text
+    assert 'latency_seconds_count{stage="embed"} 2' in text
+    assert 'ragbot_tokens_total{stage="synthesize",kind="prompt"} 120' in text
+    assert 'errors_total{stage="say \\"hi\\"\\n"} 1' in text
+    assert registry.write_prometheus(tmp_path / "ragbot.prom").read_text() == text
+
+
+def test_metric_names_are_unique_per_type():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "Calls", ("stage",))
+
+    assert registry.counter("calls_total", "Calls", ("stage",)) is registry.get("calls_total")
+    with pytest.raises(ValueError):
+        registry.histogram("calls_total", "Calls", ("stage",))
+    with pytest.raises(ValueError):
+        registry.get("calls_total").inc(tool="rag_tool")
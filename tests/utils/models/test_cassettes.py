@@ -0,0 +1,100 @@
+import json
+
+import httpx
+import pytest
+
+from sg_trade_ragbot.utils.models import models
+from sg_trade_ragbot.utils.models.cassettes import (
+    CASSETTE_DIR_ENV,
+    CASSETTE_MODE_ENV,
+    RECORD,
+    REPLAY,
+    Cassette,
+    CassetteMissError,
+    cassette_from_env,
+    request_key,
+)
+
+URL = "https://api.openai.com/v1/embeddings"
+
+
+def embeddings_response(request):
+    body = json.loads(request.content)
+    data = [{"object": "embedding", "index": i, "embedding": [0.5, 0.25]} for i, _ in enumerate(body["input"])]
+    return httpx.Response(200, json={"object": "list", "data": data, "model": body["model"],
+                                     "usage": {"prompt_tokens": 1, "total_tokens": 1}})
+
+
+def test_request_key_ignores_headers_and_json_key_order():
+    first = httpx.Request("POST", URL, content=b'{"model": "m", "input": ["a"]}', headers={"authorization": "k1"})
+    second = httpx.Request("POST", URL, content=b'{"input": ["a"], "model": "m"}', headers={"authorization": "k2"})
+    other = httpx.Request("POST", URL, content=b'{"input": ["b"], "model": "m"}')
+
+    assert request_key(first) == request_key(second) != request_key(other)
+
+
+def test_record_then_replay_without_network(tmp_path):
+    calls = []
+
+    def live(request):
+        calls.append(request)
+        return embeddings_response(request)
+
+    with httpx.Client(transport=Cassette(tmp_path, RECORD).wrap(httpx.MockTransport(live))) as client:
+        recorded = client.post(URL, json={"model": "m", "input": ["live sheep"]}).json()
+        assert client.post(URL, json={"input": ["live sheep"], "model": "m"}).json() == recorded
+    assert len(calls) == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    replay = Cassette(tmp_path, REPLAY)
+    with httpx.Client(transport=replay.wrap(httpx.MockTransport(lambda request: pytest.fail("sent")))) as client:
+        assert client.post(URL, json={"model": "m", "input": ["live sheep"]}).json() == recorded
+        with pytest.raises(CassetteMissError):
+            client.post(URL, json={"model": "m", "input": ["solar panels"]})
+    assert (replay.hits, replay.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_async_transport_and_errors_are_not_recorded(tmp_path):
+    statuses = iter([429, 401, 403, 400, 503, 200])
+
+    async def live(request):
+        return httpx.Response(next(statuses), text="data: hello\n\n")
+
+    cassette = Cassette(tmp_path, RECORD)
+    async with httpx.AsyncClient(transport=cassette.awrap(httpx.MockTransport(live))) as client:
+        for status in (429, 401, 403, 400, 503, 200):
+            assert (await client.get("https://api.groq.com/v1/stream")).status_code == status
+        assert (await client.get("https://api.groq.com/v1/stream")).text == "data: hello\n\n"
+    assert cassette.hits == 1
+
+
+def test_mode_from_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv(CASSETTE_MODE_ENV, raising=False)
+    assert cassette_from_env() is None
+
+    monkeypatch.setenv(CASSETTE_MODE_ENV, "replay")
+    monkeypatch.setenv(CASSETTE_DIR_ENV, str(tmp_path))
+    cassette = cassette_from_env()
+    assert (cassette.mode, cassette.directory) == (REPLAY, tmp_path)
+
+    monkeypatch.setenv(CASSETTE_MODE_ENV, "rewind")
+    with pytest.raises(ValueError):
+        cassette_from_env()
+
+
+def test_embed_model_replays_through_shared_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(httpx.HTTPTransport, "handle_request", lambda self, request: embeddings_response(request))
+    try:
+        models.use_cassette(Cassette(tmp_path, RECORD))
+        recorded = models.get_embed_model().get_query_embedding("live sheep")
+
+        def offline(self, request):
+            raise AssertionError("request sent in replay mode")
+        monkeypatch.setattr(httpx.HTTPTransport, "handle_request", offline)
+        models.use_cassette(Cassette(tmp_path, REPLAY))
+
+        assert models.get_embed_model().get_query_embedding("live sheep") == recorded == [0.5, 0.25]
+    finally:
+        models.use_cassette(None)
@@ -0,0 +1,106 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+import pytest
+
+from sg_trade_ragbot.utils.models import models
+from sg_trade_ragbot.utils.models.models import (
+    LANGCHAIN,
+    LLAMAINDEX,
+    LOCAL_LLAMA3,
+    REMOTE_LLAMA3,
+    REMOTE_OPENAI,
+    ClientOptions,
+    get_local_llm,
+    get_remote_llm,
+    reset_llm_clients,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    # clients are only constructed here, no request is sent
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    reset_llm_clients()
+    yield
+    reset_llm_clients()
+
+
+def test_clients_are_memoised_per_name_framework_and_options():
+    llm = get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX)
+
+    assert get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX) is llm
+    assert get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX, ClientOptions()) is llm
+    assert get_remote_llm(REMOTE_LLAMA3, LANGCHAIN) is not llm
+    assert get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX, ClientOptions(request_timeout=5)) is not llm
+    assert get_local_llm(LOCAL_LLAMA3, LLAMAINDEX) is get_local_llm(LOCAL_LLAMA3, LLAMAINDEX)
+
+
+def test_remote_clients_share_one_http_pool():
+    groq = get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX)
+    openai = get_remote_llm(REMOTE_OPENAI, LLAMAINDEX)
+    chat_openai = get_remote_llm(REMOTE_OPENAI, LANGCHAIN)
+
+    http_client, async_http_client = models._http_pool(models.DEFAULT_CLIENT_OPTIONS)
+    assert groq._get_client()._client is http_client
+    assert openai._get_client()._client is http_client
+    assert openai._get_aclient()._client is async_http_client
+    assert chat_openai.root_client._client is http_client
+
+
+def test_options_set_timeouts_and_limits():
+    options = ClientOptions(request_timeout=5, connect_timeout=1, max_connections=4)
+
+    llm = get_local_llm(LOCAL_LLAMA3, LLAMAINDEX, options)
+    http_client, _ = models._http_pool(options)
+
+    assert llm.request_timeout == 5
+    assert llm.client is get_local_llm("other-model", LLAMAINDEX, options).client
+    assert http_client.timeout.read == 5 and http_client.timeout.connect == 1
+    assert http_client._transport._pool._max_connections == 4
+
+
+def test_reset_closes_pools():
+    get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX)
+    http_client, _ = models._http_pool(models.DEFAULT_CLIENT_OPTIONS)
+
+    reset_llm_clients()
+
+    assert http_client.is_closed
+    assert get_remote_llm(REMOTE_LLAMA3, LLAMAINDEX)._get_client()._client is not http_client
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_cached_async_client_works_across_event_loops(local_server):
+    # every asyncio.run (one per eval provider call) has its own loop
+    async_http_client = get_remote_llm(REMOTE_OPENAI, LLAMAINDEX)._get_aclient()._client
+
+    async def fetch():
+        return (await async_http_client.get(local_server)).text
+
+    assert asyncio.run(fetch()) == "ok"
+    assert asyncio.run(fetch()) == "ok"
+    assert get_remote_llm(REMOTE_OPENAI, LLAMAINDEX)._get_aclient()._client is async_http_client